@@ -0,0 +1,112 @@
+"""Index of the protected allowlist checked before indicators are blocked.
+
+settings.ALLOWLIST_FILE holds one entry per line: an IP address or CIDR
+network, or a domain. A domain entry protects the domain and its subdomains,
+and also rejects blocks of its parent domains, since blocking a domain blocks
+everything below it in the DNS and proxy exports.
+
+Checks are independent of the allowlist size except for a binary search:
+networks are reduced to disjoint address ranges searched with bisect, and
+domains are looked up label by label in hash sets.
+"""
+import bisect
+import ipaddress
+from urllib.parse import urlsplit
+
+
+def parse_entry(entry):
+    """Return ('network', ip_network) or ('domain', name) for an allowlist entry, or None"""
+    entry = entry.strip().lower().rstrip('.')
+    if not entry:
+        return None
+    try:
+        return 'network', ipaddress.ip_network(entry, strict=False)
+    except ValueError:
+        pass
+    labels = entry.split('.')
+    if len(labels) < 2 or not all(labels) or any(c in entry for c in '/:@ '):
+        return None
+    return 'domain', entry
+
+
+def _parent_domains(domain):
+    """Yield the proper parent domains of a domain, nearest first"""
+    labels = domain.split('.')
+    for i in range(1, len(labels)):
+        yield '.'.join(labels[i:])
+
+
+class AllowlistIndex:
+    def __init__(self, entries):
+        ranges = {4: [], 6: []}
+        self.domains = {}  # Allowlisted domain -> entry
+        self.ancestors = {}  # Parent of an allowlisted domain -> entry
+        for entry in entries:
+            parsed = parse_entry(entry)
+            if parsed is None:
+                continue
+            kind, value = parsed
+            if kind == 'network':
+                ranges[value.version].append(
+                    (int(value.network_address), int(value.broadcast_address), entry)
+                )
+            else:
+                self.domains.setdefault(value, entry)
+                for parent in _parent_domains(value):
+                    self.ancestors.setdefault(parent, entry)
+
+        # CIDR networks are either nested or disjoint, so keeping only the
+        # outermost ones leaves disjoint ranges that bisect can search
+        self._starts, self._ranges = {}, {}
+        for version, items in ranges.items():
+            items.sort(key=lambda item: (item[0], -item[1]))
+            disjoint = []
+            for item in items:
+                if disjoint and item[0] <= disjoint[-1][1]:
+                    continue
+                disjoint.append(item)
+            self._ranges[version] = disjoint
+            self._starts[version] = [item[0] for item in disjoint]
+
+    def match_ip(self, value):
+        """Return the entry covering an IP address, or None"""
+        try:
+            address = ipaddress.ip_address(value)
+        except ValueError:
+            return None
+        number = int(address)
+        i = bisect.bisect_right(self._starts[address.version], number) - 1
+        if i >= 0:
+            start, end, entry = self._ranges[address.version][i]
+            if start <= number <= end:
+                return entry
+        return None
+
+    def match_domain(self, domain, include_ancestors=True):
+        """Return the entry protecting a domain, or None"""
+        domain = domain.lower().rstrip('.')
+        if domain in self.domains:
+            return self.domains[domain]
+        for parent in _parent_domains(domain):
+            if parent in self.domains:
+                return self.domains[parent]
+        if include_ancestors:
+            return self.ancestors.get(domain)
+        return None
+
+    def match(self, indicator_type, indicator):
+        """Return the allowlist entry an indicator conflicts with, or None"""
+        if indicator_type == 'ip':
+            return self.match_ip(indicator)
+        if indicator_type == 'domain':
+            return self.match_domain(indicator)
+        if indicator_type == 'url':
+            try:
+                host = urlsplit(indicator).hostname
+            except ValueError:
+                return None
+            if not host:
+                return None
+            # A URL only blocks itself, so allowlisted subdomains of its host are unaffected
+            return self.match_ip(host) or self.match_domain(host, include_ancestors=False)
+        return None
@@ -16,6 +16,8 @@ class APIKeyViewSet(viewsets.ModelViewSet):
     permission_classes = [permissions.IsAuthenticated, IsAdminUser]
     
     def get_queryset(self):
+        if getattr(self, 'swagger_fake_view', False):
+            return APIKey.objects.none()  # Schema generation, no request user
         return APIKey.objects.filter(user=self.request.user)
     
     @swagger_auto_schema(
@@ -36,7 +38,9 @@ class APIKeyViewSet(viewsets.ModelViewSet):
                 key=key,
                 name=serializer.validated_data['name'],
                 user=request.user,
-                read_only=serializer.validated_data.get('read_only', True)
+                read_only=serializer.validated_data.get('read_only', True),
+                rate_limit=serializer.validated_data.get('rate_limit'),
+                rate_limit_burst=serializer.validated_data.get('rate_limit_burst')
             )
             
             # Ensure the user has the necessary permissions
@@ -0,0 +1,55 @@
+import inspect
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.utils.decorators import classonlymethod
+from rest_framework.views import APIView
+
+
+class AsyncAPIView(APIView):
+    """APIView whose HTTP handlers are coroutines.
+
+    Authentication, permission and throttling checks run through the normal DRF
+    machinery on Django's sync thread, the handler itself is awaited on the
+    event loop, and the response is rendered on a worker thread. Under ASGI this
+    lets a handful of processes keep thousands of slow feed consumers open.
+    Under WSGI Django runs the view through async_to_sync, so it keeps working.
+    """
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        if not iscoroutinefunction(view):
+            markcoroutinefunction(view)
+        return view
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+
+            # Get the appropriate handler method
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(),
+                                  self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+
+            response = handler(request, *args, **kwargs)
+            if inspect.isawaitable(response):
+                response = await response
+
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+
+        # Render large JSON bodies off the event loop without tying up the
+        # single thread Django reserves for sync code
+        if hasattr(self.response, 'render') and not getattr(self.response, 'is_rendered', True):
+            await sync_to_async(self.response.render, thread_sensitive=False)()
+        return self.response
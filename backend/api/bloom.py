@@ -0,0 +1,211 @@
+"""Bloom filter feed of the blocklists for edge devices.
+
+A filter answers "maybe blocked" or "definitely not blocked" for an indicator
+in a few hundred kilobytes per hundred thousand entries, so agents that
+cannot hold the full lists check the filter first and only confirm
+positives with /api/lookup/.
+
+Filters are built once per list version and false-positive rate into
+settings.BLOOM_FILTER_DIR. When the changes since the previous filter are
+BLOCKs only and fit in its spare capacity, the new filter is the previous one
+with the new entries added, read from the events journal; otherwise (removals
+cannot be undone in a Bloom filter) it is rebuilt from the list.
+
+File layout (little-endian header, then the bit array):
+
+    magic     8s  b'BLBLOOM2'
+    version   Q   list version the filter was built from
+    bits      Q   number of bits, m
+    hashes    I   number of hash functions, k
+    count     Q   number of entries added
+    capacity  Q   number of entries the filter was sized for
+    fp_rate   d   false-positive rate at capacity
+    bit array ceil(m / 8) bytes; bit i is (byte[i // 8] >> (i % 8)) & 1
+
+Bit positions: d = BLAKE2b-128 of the entry's UTF-8 bytes, h1 and h2 are the
+little-endian uint64 halves of d, and the k positions are (h1 + i * h2) mod m
+for i in 0..k-1. clients/bloom_client.py is a reference implementation.
+
+URL filters hold the url_matching keys of the entries (host and path, no
+scheme) instead of the URLs, so a client checks a URL the way /api/lookup/
+does: canonicalize it and probe each key of url_matching.candidate_keys().
+Format 1 (b'BLBLOOM1') held the URLs themselves.
+"""
+import glob
+import hashlib
+import math
+import os
+import struct
+
+from django.conf import settings
+
+from . import events, services, url_matching
+from .exports import file_lock
+
+FORMAT = 2
+MAGIC = b'BLBLOOM2'
+HEADER = struct.Struct('<8sQQIQQd')
+
+# Spare capacity left for incremental adds
+HEADROOM = 1.25
+MIN_CAPACITY = 1024
+
+# Filters kept on disk per type and rate
+KEEP_VERSIONS = 2
+
+
+def bit_positions(entry, bits, hashes):
+    digest = hashlib.blake2b(entry.encode('utf-8'), digest_size=16).digest()
+    h1 = int.from_bytes(digest[:8], 'little')
+    h2 = int.from_bytes(digest[8:], 'little')
+    return [(h1 + i * h2) % bits for i in range(hashes)]
+
+
+class BloomFilter:
+    def __init__(self, bits, hashes, capacity, fp_rate, count=0, data=None):
+        self.bits = bits
+        self.hashes = hashes
+        self.capacity = capacity
+        self.fp_rate = fp_rate
+        self.count = count
+        self.data = bytearray(data) if data is not None else bytearray((bits + 7) // 8)
+
+    @classmethod
+    def for_capacity(cls, capacity, fp_rate):
+        """Create an empty filter with the optimal size for capacity entries"""
+        capacity = max(capacity, 1)
+        bits = math.ceil(-capacity * math.log(fp_rate) / math.log(2) ** 2)
+        hashes = max(1, round(bits / capacity * math.log(2)))
+        return cls(bits, hashes, capacity, fp_rate)
+
+    def add(self, entry):
+        data = self.data
+        for position in bit_positions(entry, self.bits, self.hashes):
+            data[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, entry):
+        data = self.data
+        return all(
+            data[position >> 3] & (1 << (position & 7))
+            for position in bit_positions(entry, self.bits, self.hashes)
+        )
+
+    def to_bytes(self, version):
+        header = HEADER.pack(MAGIC, version, self.bits, self.hashes,
+                             self.count, self.capacity, self.fp_rate)
+        return header + bytes(self.data)
+
+    @classmethod
+    def from_bytes(cls, data):
+        """Return (filter, version) parsed from a serialized filter"""
+        magic, version, bits, hashes, count, capacity, fp_rate = HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise ValueError("Not a blocklist Bloom filter")
+        bloom = cls(bits, hashes, capacity, fp_rate, count, data[HEADER.size:])
+        return bloom, version
+
+
+def filter_key(entry, indicator_type):
+    """Return the string added to the filter for a list entry"""
+    if indicator_type == 'url':
+        return url_matching.match_key(entry) or entry
+    return entry
+
+
+def filter_path(indicator_type, fp_rate, version):
+    return os.path.join(settings.BLOOM_FILTER_DIR,
+                        f"{indicator_type}-v{FORMAT}-{fp_rate:g}-{version}.bloom")
+
+
+def _published(indicator_type, fp_rate):
+    """Return {version: path} of the filters on disk for a type and rate"""
+    prefix = os.path.join(settings.BLOOM_FILTER_DIR, f"{indicator_type}-v{FORMAT}-{fp_rate:g}-")
+    result = {}
+    for path in glob.glob(f"{prefix}*.bloom"):
+        try:
+            result[int(path[len(prefix):-len('.bloom')])] = path
+        except ValueError:
+            pass
+    return result
+
+
+def _added_since(indicator_type, after, until):
+    """Return entries BLOCKed between two list versions, or None if any were UNBLOCKed"""
+    added = []
+    while after < until:
+        batch = events.read_events(after)
+        if not batch:
+            return None  # Journal does not reach the current version
+        for event in batch:
+            if event['id'] > until:
+                return added
+            if event['indicator_type'] == indicator_type:
+                if event['action'] != 'BLOCK':
+                    return None
+                added.extend(event['indicators'])
+        after = batch[-1]['id']
+    return added
+
+
+def _extend_previous(indicator_type, fp_rate, version):
+    """Build the filter for version from the newest older one, or return None"""
+    older = [v for v in _published(indicator_type, fp_rate) if v < version]
+    if not older:
+        return None
+    previous = max(older)
+    try:
+        added = _added_since(indicator_type, previous, version)
+    except events.InvalidEventId:
+        return None  # Journal was reset
+    if added is None:
+        return None
+    with open(filter_path(indicator_type, fp_rate, previous), 'rb') as f:
+        bloom, _ = BloomFilter.from_bytes(f.read())
+    if bloom.count + len(added) > bloom.capacity:
+        return None
+    for entry in added:
+        bloom.add(filter_key(entry, indicator_type))
+    return bloom
+
+
+def _build(indicator_type, entries, fp_rate):
+    bloom = BloomFilter.for_capacity(max(MIN_CAPACITY, int(len(entries) * HEADROOM)), fp_rate)
+    for entry in entries:
+        bloom.add(filter_key(entry, indicator_type))
+    return bloom
+
+
+def _write(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def get_filter(indicator_type, fp_rate):
+    """Return (path, version) of the filter for the current list version"""
+    version = services.get_list_version(indicator_type)
+    path = filter_path(indicator_type, fp_rate, version)
+    if os.path.exists(path):
+        return path, version
+
+    os.makedirs(settings.BLOOM_FILTER_DIR, exist_ok=True)
+    with file_lock(os.path.join(settings.BLOOM_FILTER_DIR, f".{indicator_type}-v{FORMAT}-{fp_rate:g}.lock")):
+        version = services.get_list_version(indicator_type)
+        path = filter_path(indicator_type, fp_rate, version)
+        if os.path.exists(path):
+            return path, version
+
+        bloom = _extend_previous(indicator_type, fp_rate, version)
+        if bloom is None:
+            version, entries = services.read_blocklist_snapshot(indicator_type)
+            path = filter_path(indicator_type, fp_rate, version)
+            bloom = _build(indicator_type, entries, fp_rate)
+        _write(path, bloom.to_bytes(version))
+
+        # Keep the previous filter for requests that already resolved its path
+        published = _published(indicator_type, fp_rate)
+        for old_version in sorted(published)[:-KEEP_VERSIONS]:
+            os.remove(published[old_version])
+    return path, version
@@ -0,0 +1,188 @@
+import json
+import time
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+from drf_yasg import openapi
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework import status
+from rest_framework.renderers import BaseRenderer
+from rest_framework.response import Response
+
+from . import events
+from .async_views import AsyncAPIView
+from .renderers import FastJSONRenderer
+
+after_param = openapi.Parameter(
+    'after',
+    openapi.IN_QUERY,
+    description="Return events after this event ID (defaults to the Last-Event-ID header, then to the current head)",
+    type=openapi.TYPE_INTEGER
+)
+
+timeout_param = openapi.Parameter(
+    'timeout',
+    openapi.IN_QUERY,
+    description=f"Seconds to wait for a change before returning an empty list (max {settings.EVENTS_LONG_POLL_TIMEOUT})",
+    type=openapi.TYPE_NUMBER
+)
+
+events_response_schema = openapi.Schema(
+    type=openapi.TYPE_OBJECT,
+    properties={
+        'events': openapi.Schema(
+            type=openapi.TYPE_ARRAY,
+            items=openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    'id': openapi.Schema(type=openapi.TYPE_INTEGER),
+                    'time': openapi.Schema(type=openapi.TYPE_STRING, format=openapi.FORMAT_DATETIME),
+                    'action': openapi.Schema(type=openapi.TYPE_STRING, enum=['BLOCK', 'UNBLOCK']),
+                    'indicator_type': openapi.Schema(type=openapi.TYPE_STRING),
+                    'indicators': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_STRING)),
+                }
+            )
+        ),
+        'last_event_id': openapi.Schema(type=openapi.TYPE_INTEGER),
+    }
+)
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Lets clients negotiate text/event-stream; only error bodies go through it"""
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return json.dumps(data).encode('utf-8')
+
+
+def get_requested_event_id(request):
+    """Return the event ID to resume after, or None to start at the head"""
+    value = request.headers.get('Last-Event-ID') or request.query_params.get('after')
+    if value in (None, ''):
+        return None
+    event_id = int(value)
+    if event_id < 0:
+        raise ValueError(value)
+    return event_id
+
+
+def format_sse(event):
+    """Format a journal event as a Server-Sent Events message"""
+    data = json.dumps(event, separators=(',', ':'))
+    return f"id: {event['id']}\nevent: {event['action'].lower()}\ndata: {data}\n\n"
+
+
+class EventsView(AsyncAPIView):
+    """Long-poll for BLOCK/UNBLOCK changes (no authentication, like the raw feeds)"""
+    permission_classes = []
+    throttle_scope = 'events'
+
+    @swagger_auto_schema(
+        operation_description="Wait for blocklist changes after an event ID (long-poll)",
+        manual_parameters=[after_param, timeout_param],
+        responses={200: events_response_schema, 400: "Bad Request"}
+    )
+    async def get(self, request):
+        try:
+            after = get_requested_event_id(request)
+            timeout = float(request.query_params.get('timeout', settings.EVENTS_LONG_POLL_TIMEOUT))
+        except ValueError:
+            return Response({'error': 'after and timeout must be non-negative numbers'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        timeout = max(0.0, min(timeout, settings.EVENTS_LONG_POLL_TIMEOUT))
+        if after is None:
+            after = events.current_event_id()
+
+        try:
+            result = await events.notifier.events_after(after)
+            if not result and timeout:
+                await events.notifier.wait(after, timeout)
+                result = await events.notifier.events_after(after)
+        except events.InvalidEventId as e:
+            return Response({
+                'error': f'{e}; reload the raw feed and resume from last_event_id',
+                'last_event_id': events.current_event_id(),
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({
+            'events': result,
+            'last_event_id': result[-1]['id'] if result else after,
+        })
+
+
+class EventStreamView(AsyncAPIView):
+    """Server-Sent Events stream of BLOCK/UNBLOCK changes"""
+    permission_classes = []
+    throttle_scope = 'events'
+    renderer_classes = [FastJSONRenderer, EventStreamRenderer]
+
+    @swagger_auto_schema(
+        operation_description="Stream blocklist changes as Server-Sent Events. Reconnecting clients "
+                              "send Last-Event-ID to receive the changes they missed.",
+        manual_parameters=[after_param],
+        responses={200: "text/event-stream of block and unblock events", 400: "Bad Request"}
+    )
+    async def get(self, request):
+        try:
+            after = get_requested_event_id(request)
+            if after is not None:
+                # Validate the ID before committing to a 200 stream
+                await events.notifier.events_after(after, limit=1)
+        except (ValueError, events.InvalidEventId):
+            return Response({
+                'error': 'Unknown event ID; reload the raw feed and reconnect without Last-Event-ID',
+                'last_event_id': events.current_event_id(),
+            }, status=status.HTTP_400_BAD_REQUEST)
+        if after is None:
+            after = events.current_event_id()
+
+        # Async iterators are buffered completely under WSGI, so fall back to
+        # a blocking generator there
+        if isinstance(request._request, ASGIRequest):
+            stream = self._stream_async(after)
+        else:
+            stream = self._stream_sync(after)
+        response = StreamingHttpResponse(stream, content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    def _preamble(self, after):
+        # The id-only message sets the client's Last-Event-ID even if no
+        # change arrives before it disconnects
+        return f"retry: 3000\nid: {after}\n\n"
+
+    async def _stream_async(self, after):
+        yield self._preamble(after)
+        deadline = time.monotonic() + settings.EVENTS_STREAM_MAX_DURATION
+        while time.monotonic() < deadline:
+            result = await events.notifier.events_after(after)
+            for event in result:
+                yield format_sse(event)
+                after = event['id']
+            if result:
+                continue
+            remaining = deadline - time.monotonic()
+            if not await events.notifier.wait(after, min(settings.EVENTS_HEARTBEAT_INTERVAL, remaining)):
+                yield ': keepalive\n\n'
+
+    def _stream_sync(self, after):
+        yield self._preamble(after)
+        deadline = time.monotonic() + settings.EVENTS_STREAM_MAX_DURATION
+        last_output = time.monotonic()
+        while time.monotonic() < deadline:
+            result = events.read_events(after)
+            for event in result:
+                yield format_sse(event)
+                after = event['id']
+            if result:
+                last_output = time.monotonic()
+                continue
+            if time.monotonic() - last_output >= settings.EVENTS_HEARTBEAT_INTERVAL:
+                yield ': keepalive\n\n'
+                last_output = time.monotonic()
+            time.sleep(settings.EVENTS_POLL_INTERVAL)
@@ -0,0 +1,185 @@
+"""Change journal for blocklist subscribers.
+
+Every committed BLOCK/UNBLOCK is appended as one JSON line to
+settings.EVENTS_FILE. The byte offset just past an event's line is its event
+ID: IDs increase monotonically, are shared by all worker processes, and a
+reconnecting client resumes by seeking straight to the ID it last saw.
+"""
+import asyncio
+import collections
+import json
+import os
+import time
+
+from django.conf import settings
+from django.utils import timezone
+
+
+class InvalidEventId(ValueError):
+    """Raised when an event ID does not point at an event boundary"""
+
+
+def append_event(action, indicator_type, indicators):
+    """Append a change event to the journal and return its event ID.
+
+    Callers must hold services.mutation_lock() so IDs are assigned in order.
+    """
+    record = {
+        'time': timezone.now().isoformat(),
+        'action': action,
+        'indicator_type': indicator_type,
+        'indicators': list(indicators),
+    }
+    line = json.dumps(record, separators=(',', ':')).encode('utf-8') + b'\n'
+    with open(settings.EVENTS_FILE, 'ab') as f:
+        f.write(line)
+        return f.tell()
+
+
+def current_event_id():
+    """Return the ID of the most recent event (0 when there are none)"""
+    try:
+        return os.stat(settings.EVENTS_FILE).st_size
+    except FileNotFoundError:
+        return 0
+
+
+def _parse_lines(data, start):
+    """Parse complete journal lines from data read at offset start"""
+    result = []
+    offset = start
+    for line in data.splitlines(keepends=True):
+        if not line.endswith(b'\n'):
+            break  # Partially written line, picked up on the next read
+        offset += len(line)
+        event = json.loads(line)
+        event['id'] = offset
+        result.append(event)
+    return result
+
+
+def read_events(after, limit=None):
+    """Read events recorded after the given event ID from the journal"""
+    limit = limit or settings.EVENTS_BUFFER_SIZE
+    try:
+        with open(settings.EVENTS_FILE, 'rb') as f:
+            size = f.seek(0, os.SEEK_END)
+            if after > size:
+                raise InvalidEventId(f"Event {after} does not exist")
+            if after:
+                f.seek(after - 1)
+                if f.read(1) != b'\n':
+                    raise InvalidEventId(f"Event {after} does not exist")
+            f.seek(after)
+            result = []
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                after += len(line)
+                event = json.loads(line)
+                event['id'] = after
+                result.append(event)
+                if len(result) >= limit:
+                    break
+            return result
+    except FileNotFoundError:
+        return []
+
+
+class ChangeNotifier:
+    """Per-process fan-out of journal changes to waiting connections.
+
+    A single watcher task polls the journal size and reads new events once,
+    keeping the most recent ones in memory. Any number of idle subscribers
+    wait on a shared asyncio.Event, so a change costs one stat per poll
+    interval and one read per process regardless of how many clients wait.
+    """
+
+    def __init__(self):
+        self._loop = None
+
+    def _reset(self, loop):
+        self._loop = loop
+        self._changed = asyncio.Event()
+        self._waiters = 0
+        self._watcher = None
+        self._size = current_event_id()
+        self._recent = collections.deque(maxlen=settings.EVENTS_BUFFER_SIZE)
+
+    def _ensure_loop(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Under WSGI every async view call runs on a fresh event loop
+            self._reset(loop)
+
+    async def _watch(self):
+        while self._waiters:
+            await asyncio.sleep(settings.EVENTS_POLL_INTERVAL)
+            size = current_event_id()
+            if size == self._size:
+                continue
+            if size > self._size:
+                start = self._size
+                new_events = await asyncio.to_thread(self._read_new, start, size)
+                for event in new_events:
+                    self._recent.append((start, event))
+                    start = event['id']
+                self._size = start
+            else:
+                # Journal was truncated or replaced; forget what we had
+                self._size = size
+                self._recent.clear()
+            changed, self._changed = self._changed, asyncio.Event()
+            changed.set()
+        self._watcher = None
+
+    def _read_new(self, start, end):
+        with open(settings.EVENTS_FILE, 'rb') as f:
+            f.seek(start)
+            return _parse_lines(f.read(end - start), start)
+
+    def _buffered_events(self, after):
+        """Return buffered events after the given ID, or None if not buffered"""
+        if not self._recent or not self._recent[0][0] <= after <= self._size:
+            return None
+        boundaries = {self._recent[0][0]}
+        boundaries.update(event['id'] for _, event in self._recent)
+        if after not in boundaries:
+            return None  # Not an event boundary; let read_events() reject it
+        return [event for _, event in self._recent if event['id'] > after]
+
+    async def events_after(self, after, limit=None):
+        """Return events after the given ID, from memory when possible"""
+        self._ensure_loop()
+        limit = limit or settings.EVENTS_BUFFER_SIZE
+        buffered = self._buffered_events(after)
+        if buffered is None:
+            return await asyncio.to_thread(read_events, after, limit)
+        # The buffer is only complete up to what the watcher has seen
+        if len(buffered) < limit and current_event_id() > self._size:
+            start = buffered[-1]['id'] if buffered else after
+            buffered += await asyncio.to_thread(read_events, start, limit - len(buffered))
+        return buffered[:limit]
+
+    async def wait(self, after, timeout):
+        """Wait until there are events after the given ID or the timeout passes"""
+        self._ensure_loop()
+        deadline = time.monotonic() + timeout
+        self._waiters += 1
+        if self._watcher is None:
+            self._watcher = asyncio.ensure_future(self._watch())
+        try:
+            while self._size <= after:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                try:
+                    await asyncio.wait_for(self._changed.wait(), remaining)
+                except asyncio.TimeoutError:
+                    return False
+            return True
+        finally:
+            self._waiters -= 1
+
+
+notifier = ChangeNotifier()
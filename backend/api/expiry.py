@@ -0,0 +1,140 @@
+"""Indicator expiry (TTL).
+
+Blocks made with an expiry time are recorded in settings.EXPIRY_FILE, a
+journal of JSON lines written under services.mutation_lock():
+
+    {"indicator_type": "ip", "indicators": ["1.2.3.4"], "expires_at": 1760000000.0}
+    {"indicator_type": "ip", "indicators": ["1.2.3.4"], "expires_at": null}
+
+The second form cancels a pending expiry (the indicator was unblocked, or
+blocked again without an expiry). Blocking a listed indicator again with an
+expiry appends a new record, which replaces its pending expiry. The
+expiry sweeper (manage.py expire_indicators) replays the journal into an
+ExpiryScheduler, a min-heap of (expires_at, indicator) with lazy
+invalidation, tails it for new records, and unblocks everything that is due
+in one batch per sweep.
+"""
+import heapq
+import json
+import os
+
+from django.conf import settings
+
+
+def _append(indicator_type, indicators, expires_at):
+    record = {
+        'indicator_type': indicator_type,
+        'indicators': list(indicators),
+        'expires_at': expires_at,
+    }
+    with open(settings.EXPIRY_FILE, 'a') as f:
+        f.write(json.dumps(record, separators=(',', ':')) + '\n')
+
+
+def schedule(indicator_type, indicators, expires_at):
+    """Record that indicators expire at the given Unix time"""
+    _append(indicator_type, indicators, float(expires_at))
+
+
+def cancel(indicator_type, indicators):
+    """Record that indicators no longer expire (unblocked, or blocked again without an expiry)"""
+    _append(indicator_type, indicators, None)
+
+
+class ExpiryScheduler:
+    """Pending expirations ordered by time, kept in sync with the journal.
+
+    Callers hold services.mutation_lock() around refresh(), pop_due() and
+    compact() so the journal cannot change underneath them.
+    """
+
+    def __init__(self):
+        self._reset()
+
+    def _reset(self):
+        self._heap = []
+        self._pending = {}  # (indicator_type, indicator) -> expires_at
+        self._entries = 0  # Indicator entries in the journal, live or dead
+        self._identity = None
+        self._offset = 0
+
+    def __len__(self):
+        return len(self._pending)
+
+    def refresh(self):
+        """Apply records appended to the journal since the last refresh"""
+        try:
+            stat = os.stat(settings.EXPIRY_FILE)
+        except FileNotFoundError:
+            self._reset()
+            return
+        if stat.st_ino != self._identity or stat.st_size < self._offset:
+            # Journal was compacted by someone else or replaced; replay it
+            self._reset()
+            self._identity = stat.st_ino
+        if stat.st_size == self._offset:
+            return
+
+        with open(settings.EXPIRY_FILE, 'rb') as f:
+            f.seek(self._offset)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break  # Partially written line, picked up next time
+                self._offset += len(line)
+                self._apply(json.loads(line))
+
+    def _apply(self, record):
+        self._entries += len(record['indicators'])
+        indicator_type = record['indicator_type']
+        expires_at = record['expires_at']
+        for indicator in record['indicators']:
+            key = (indicator_type, indicator)
+            if expires_at is None:
+                self._pending.pop(key, None)
+            else:
+                self._pending[key] = expires_at
+                heapq.heappush(self._heap, (expires_at, indicator_type, indicator))
+
+    def expires_at(self, indicator_type, indicator):
+        """Return the pending expiry time of an indicator, or None"""
+        return self._pending.get((indicator_type, indicator))
+
+    def next_due(self):
+        """Return the earliest pending expiry time, or None if there is none"""
+        heap = self._heap
+        # Drop entries that were cancelled or rescheduled
+        while heap and self._pending.get((heap[0][1], heap[0][2])) != heap[0][0]:
+            heapq.heappop(heap)
+        return heap[0][0] if heap else None
+
+    def pop_due(self, now):
+        """Remove and return {indicator_type: [indicators]} due at or before now"""
+        due = {}
+        while True:
+            expires_at = self.next_due()
+            if expires_at is None or expires_at > now:
+                return due
+            _, indicator_type, indicator = heapq.heappop(self._heap)
+            del self._pending[(indicator_type, indicator)]
+            due.setdefault(indicator_type, []).append(indicator)
+
+    def compact(self, min_entries=1000):
+        """Rewrite the journal with only pending expirations once it is mostly dead records"""
+        if self._entries < min_entries or self._entries < 2 * len(self._pending):
+            return False
+
+        groups = {}
+        for (indicator_type, indicator), expires_at in self._pending.items():
+            groups.setdefault((indicator_type, expires_at), []).append(indicator)
+        tmp_path = f"{settings.EXPIRY_FILE}.tmp"
+        with open(tmp_path, 'w') as f:
+            for (indicator_type, expires_at), indicators in sorted(groups.items(), key=lambda item: item[0][1]):
+                record = {'indicator_type': indicator_type, 'indicators': indicators, 'expires_at': expires_at}
+                f.write(json.dumps(record, separators=(',', ':')) + '\n')
+        os.replace(tmp_path, settings.EXPIRY_FILE)
+
+        stat = os.stat(settings.EXPIRY_FILE)
+        self._identity, self._offset, self._entries = stat.st_ino, stat.st_size, len(self._pending)
+        self._heap = [(expires_at, t, i) for (t, i), expires_at in self._pending.items()]
+        heapq.heapify(self._heap)
+        return True
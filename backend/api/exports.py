@@ -0,0 +1,282 @@
+"""Firewall, DNS and proxy export formats of the blocklists.
+
+Each export is rendered once per list version into settings.EXPORTS_DIR and
+served from that file, so consumers polling an unchanged list cost a stat (or
+a 304 Not Modified) instead of a full conversion, and every worker process
+shares the rendered result.
+"""
+import asyncio
+import glob
+import os
+import re
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, StreamingHttpResponse
+
+from . import services, url_matching
+
+try:
+    import fcntl
+except ImportError:  # Windows development checkouts have no flock
+    fcntl = None
+
+FILE_CHUNK_SIZE = 64 * 1024
+
+# Elements per nftables "add element" statement
+NFT_CHUNK_SIZE = 1000
+
+# Exports kept on disk per type and format
+KEEP_VERSIONS = 2
+
+# Part of export file names and ETags; bumped whenever the output of a
+# format changes, so files rendered by an older release are not served
+REVISION = 2
+
+
+def set_name(indicator_type):
+    return f"blocklist-{indicator_type}"
+
+
+def render_plain(indicator_type, version, entries):
+    """The list itself, one entry per line"""
+    for entry in entries:
+        yield f"{entry}\n"
+
+
+def render_ipset(indicator_type, version, entries):
+    """ipset restore file; load with `ipset restore -exist < file`"""
+    name = set_name(indicator_type)
+    yield f"# Blocklist Platform {indicator_type} blocklist, version {version}\n"
+    yield f"create {name} hash:ip family inet maxelem {max(65536, len(entries))} -exist\n"
+    yield f"flush {name}\n"
+    for entry in entries:
+        yield f"add {name} {entry} -exist\n"
+
+
+def render_nftables(indicator_type, version, entries):
+    """nft script that atomically replaces the set contents; load with `nft -f file`"""
+    name = set_name(indicator_type).replace('-', '_')
+    yield f"# Blocklist Platform {indicator_type} blocklist, version {version}\n"
+    yield "add table inet blocklist\n"
+    yield f"add set inet blocklist {name} {{ type ipv4_addr; }}\n"
+    yield f"flush set inet blocklist {name}\n"
+    for i in range(0, len(entries), NFT_CHUNK_SIZE):
+        yield f"add element inet blocklist {name} {{ {', '.join(entries[i:i + NFT_CHUNK_SIZE])} }}\n"
+
+
+def render_rpz(indicator_type, version, entries):
+    """DNS Response Policy Zone answering NXDOMAIN for each domain and its subdomains"""
+    # SOA serials are 32-bit; versions only grow, so wrap-around is the only reset
+    serial = version % 2 ** 32
+    yield "$TTL 300\n"
+    yield f"@ IN SOA localhost. hostmaster.localhost. ( {serial} 3600 600 86400 300 )\n"
+    yield "@ IN NS localhost.\n"
+    for entry in entries:
+        yield f"{entry} CNAME .\n"
+        yield f"*.{entry} CNAME .\n"
+
+
+def _parent_domains(domain):
+    parts = domain.split('.')
+    return ('.'.join(parts[i:]) for i in range(1, len(parts) - 1))
+
+
+def _ere_escape(value):
+    """Escape a string for a POSIX extended regular expression"""
+    return re.sub(r'([.\[\]()*+?{}|^$\\])', r'\\\1', value)
+
+
+def render_squid(indicator_type, version, entries):
+    """Squid ACL file: dstdomain for domains, url_regex for URLs"""
+    yield f"# Blocklist Platform {indicator_type} blocklist, version {version}\n"
+    if indicator_type == 'domain':
+        # ".example.com" also matches subdomains, and Squid rejects entries
+        # already covered by a listed parent domain
+        listed = set(entries)
+        for entry in entries:
+            if not any(parent in listed for parent in _parent_domains(entry)):
+                yield f".{entry}\n"
+    else:
+        for entry in entries:
+            yield f"{_url_regex(entry)}\n"
+
+
+def _url_regex(entry):
+    """Regex matching the URLs a URL entry blocks, as /api/lookup/ does:
+    either scheme, and the path and everything below it segment by segment
+    (http://evil.com/a blocks /a, /a/ and /a/b but not /ab); an entry with a
+    query blocks only that path and query"""
+    key = url_matching.match_key(entry)
+    if key is None:
+        return f"^{_ere_escape(entry)}"
+    if '?' in key:
+        path, query = key.split('?', 1)
+        return f"^https?://{_ere_escape(path)}/?\\?{_ere_escape(query)}$"
+    return f"^https?://{_ere_escape(key)}(/|\\?|$)"
+
+
+def render_edl(indicator_type, version, entries):
+    """Palo Alto Networks External Dynamic List"""
+    for entry in entries:
+        if indicator_type == 'url':
+            entry = _edl_url(entry)
+        yield f"{entry}\n"
+
+
+def _edl_url(entry):
+    """EDL URL entry for a blocked URL: its match key, which has no scheme.
+
+    PAN-OS matches entries as prefixes on token boundaries, so evil.com/a
+    blocks /a, /a/b and /a?x=1 but not /ab, like /api/lookup/ (it also blocks
+    /a.php, since '.' ends a token there). A host alone gets a trailing slash,
+    or evil.com would also block evil.com.au.
+    """
+    key = url_matching.match_key(entry)
+    if key is None:
+        return entry.split('://', 1)[-1]
+    return key if '/' in key or '?' in key else f"{key}/"
+
+
+FORMATS = {
+    'ipset': {'types': ('ip',), 'render': render_ipset},
+    'nftables': {'types': ('ip',), 'render': render_nftables},
+    'rpz': {'types': ('domain',), 'render': render_rpz},
+    'squid': {'types': ('domain', 'url'), 'render': render_squid},
+    'edl': {'types': ('ip', 'domain', 'url'), 'render': render_edl},
+}
+
+
+def formats_for(indicator_type):
+    return [name for name, spec in FORMATS.items() if indicator_type in spec['types']]
+
+
+def export_path(indicator_type, export_format, version):
+    return os.path.join(settings.EXPORTS_DIR, f"{indicator_type}-{export_format}-r{REVISION}-{version}.txt")
+
+
+@contextmanager
+def file_lock(path):
+    """Exclusive lock across processes, so only one renders a given file at a time"""
+    with open(path, 'a') as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _write_export(path, lines):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8', newline='\n') as f:
+        f.writelines(lines)
+    os.replace(tmp_path, path)
+
+
+def _prune(indicator_type, export_format):
+    """Remove all but the newest KEEP_VERSIONS exports of a type and format,
+    and those of older revisions"""
+    prefix = os.path.join(settings.EXPORTS_DIR, f"{indicator_type}-{export_format}-")
+    current = f"{prefix}r{REVISION}-"
+    versions = {}
+    for path in glob.glob(f"{prefix}*.txt"):
+        if not path.startswith(current):
+            os.remove(path)
+            continue
+        try:
+            versions[int(path[len(current):-len('.txt')])] = path
+        except ValueError:
+            pass
+    # The previous version is kept for requests that already resolved its
+    # path; responses streaming older ones keep their open handle
+    for version in sorted(versions)[:-KEEP_VERSIONS]:
+        os.remove(versions[version])
+
+
+def get_export(indicator_type, export_format):
+    """Return (path, version) of the export for the current list version.
+
+    The export is rendered on first request for a version and reused until
+    the list changes; older versions are removed once a newer one exists.
+    """
+    if indicator_type not in FORMATS[export_format]['types']:
+        raise ValueError(f"The {export_format} format is not available for the {indicator_type} blocklist")
+    return _get_rendered(indicator_type, export_format, FORMATS[export_format]['render'])
+
+
+def get_raw(indicator_type):
+    """Return (path, version) of a copy of the current list version, for
+    serving the raw feed with ranges when its published copy is not current"""
+    return _get_rendered(indicator_type, 'raw', render_plain)
+
+
+def _get_rendered(indicator_type, export_format, render):
+    version = services.get_list_version(indicator_type)
+    path = export_path(indicator_type, export_format, version)
+    if os.path.exists(path):
+        return path, version
+
+    os.makedirs(settings.EXPORTS_DIR, exist_ok=True)
+    with file_lock(os.path.join(settings.EXPORTS_DIR, f".{indicator_type}-{export_format}.lock")):
+        # Entries and version are read together, so the file matches its version
+        version, entries = services.read_blocklist_snapshot(indicator_type)
+        path = export_path(indicator_type, export_format, version)
+        if not os.path.exists(path):
+            _write_export(path, render(indicator_type, version, entries))
+            _prune(indicator_type, export_format)
+    return path, version
+
+
+def _iter_file(f, length):
+    try:
+        while length > 0:
+            chunk = f.read(min(FILE_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
+
+
+async def _aiter_file(f, length=None):
+    try:
+        while length is None or length > 0:
+            read_size = FILE_CHUNK_SIZE if length is None else min(FILE_CHUNK_SIZE, length)
+            chunk = await asyncio.to_thread(f.read, read_size)
+            if not chunk:
+                break
+            if length is not None:
+                length -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
+
+
+def file_response(request, path, content_type, filename=None, byte_range=None):
+    """Stream a file, or the (first, last) byte range of it, without reading it into memory under WSGI or ASGI"""
+    f = open(path, 'rb')
+    size = os.fstat(f.fileno()).st_size
+    if byte_range is not None:
+        first, last = byte_range
+        f.seek(first)
+        length = last - first + 1
+        if isinstance(request, ASGIRequest):
+            response = StreamingHttpResponse(_aiter_file(f, length), content_type=content_type, status=206)
+        else:
+            response = StreamingHttpResponse(_iter_file(f, length), content_type=content_type, status=206)
+        response['Content-Range'] = f"bytes {first}-{last}/{size}"
+        response['Content-Length'] = length
+        return response
+
+    # Django buffers synchronous iterators completely under ASGI, so read
+    # the file on worker threads through an async iterator there
+    if isinstance(request, ASGIRequest):
+        response = StreamingHttpResponse(_aiter_file(f), content_type=content_type)
+    else:
+        response = FileResponse(f, content_type=content_type, filename=filename or os.path.basename(path))
+    response['Content-Length'] = size
+    return response
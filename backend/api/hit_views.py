@@ -0,0 +1,137 @@
+from django.conf import settings
+from drf_yasg import openapi
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from . import hits, services
+from .permissions import ApiKeyPermission, IsAuthenticatedOrHasApiKey
+
+indicator_type_param = openapi.Parameter(
+    'indicator_type', openapi.IN_QUERY, description="Type of indicator (ip, domain, url)",
+    type=openapi.TYPE_STRING, enum=list(services.INDICATOR_TYPES)
+)
+indicator_param = openapi.Parameter(
+    'indicator', openapi.IN_QUERY,
+    description="List entry to estimate hits for; repeat the parameter for several (needs indicator_type)",
+    type=openapi.TYPE_STRING
+)
+days_param = openapi.Parameter(
+    'days', openapi.IN_QUERY, description="Report entries with no hits in this many days (default 30)",
+    type=openapi.TYPE_INTEGER
+)
+limit_param = openapi.Parameter(
+    'limit', openapi.IN_QUERY, description="Number of entries to return (default 1000)", type=openapi.TYPE_INTEGER
+)
+
+hit_report_schema = openapi.Schema(
+    type=openapi.TYPE_OBJECT,
+    required=['hits'],
+    properties={
+        'hits': openapi.Schema(
+            type=openapi.TYPE_ARRAY,
+            description=f"Up to {settings.HIT_REPORT_MAX_HITS} hits",
+            items=openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                required=['indicator'],
+                properties={
+                    'indicator': openapi.Schema(type=openapi.TYPE_STRING,
+                                                description="IP or domain entry that was hit, or the URL visited; "
+                                                            "a URL counts for every entry that blocks it and is "
+                                                            "rejected if none does"),
+                    'indicator_type': openapi.Schema(type=openapi.TYPE_STRING,
+                                                     enum=list(services.INDICATOR_TYPES) + [services.AUTO_TYPE],
+                                                     description="Default: classified from the indicator"),
+                    'count': openapi.Schema(type=openapi.TYPE_INTEGER, description="Default 1"),
+                    'time': openapi.Schema(type=openapi.TYPE_STRING, format=openapi.FORMAT_DATETIME,
+                                           description="When the hits were last seen (default: now)"),
+                    'sources': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_STRING),
+                                              description="Addresses that triggered the hits"),
+                }
+            )
+        ),
+    }
+)
+
+
+class HitsView(APIView):
+    permission_classes = [IsAuthenticatedOrHasApiKey]
+
+    def get_permission_required(self, method):
+        if method == 'POST' and hasattr(self.request, 'api_key'):
+            # Reports change no list, so the read-only keys enforcement points
+            # download feeds with may send them
+            return ApiKeyPermission.ANY_KEY
+        return 'api.view_blocklist'
+
+    @swagger_auto_schema(
+        operation_description="Hit totals and unique sources per list type since tracking started; with "
+                              "indicator_type and indicator, also the estimated hits and last hit date of "
+                              "those indicators (estimates may be slightly high, never low).",
+        manual_parameters=[indicator_type_param, indicator_param],
+        responses={200: "Hit summary", 400: "Bad Request"}
+    )
+    def get(self, request):
+        summary = hits.get_sketch().summary()
+        indicators = request.query_params.getlist('indicator')
+        if indicators:
+            indicator_type = request.query_params.get('indicator_type')
+            if indicator_type not in services.INDICATOR_TYPES:
+                return Response({'error': 'indicator_type must be one of ip, domain, url'},
+                                status=status.HTTP_400_BAD_REQUEST)
+            summary['indicator_type'] = indicator_type
+            summary['results'] = services.hit_estimates(indicator_type, indicators)
+        return Response(summary)
+
+    @swagger_auto_schema(
+        operation_description="Report hits seen by an enforcement point, batched: "
+                              '{"hits": [{"indicator": "203.0.113.7", "count": 42, "sources": ["10.1.2.3"]}]}. '
+                              "Any API key may report, including read-only ones.",
+        request_body=hit_report_schema,
+        responses={200: "Number of hits accepted and the invalid ones", 400: "Bad Request"}
+    )
+    def post(self, request):
+        reports = request.data.get('hits') if isinstance(request.data, dict) else None
+        if not isinstance(reports, list) or not reports:
+            return Response({'error': 'hits must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(reports) > settings.HIT_REPORT_MAX_HITS:
+            return Response({'error': f'At most {settings.HIT_REPORT_MAX_HITS} hits per request'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response(services.record_hits(reports))
+
+
+class StaleEntriesView(APIView):
+    permission_classes = [IsAuthenticatedOrHasApiKey]
+
+    def get_permission_required(self, method):
+        return 'api.view_blocklist'
+
+    @swagger_auto_schema(
+        operation_description="Entries of a blocklist with no hits reported in the last `days` days, as "
+                              "candidates for removal. Only entries already on the list `days` days ago are "
+                              "reported, and none until hits have been tracked for that long.",
+        manual_parameters=[indicator_type_param, days_param, limit_param],
+        responses={200: "Stale entries", 400: "Bad Request"}
+    )
+    def get(self, request):
+        indicator_type = request.query_params.get('indicator_type')
+        if indicator_type not in services.INDICATOR_TYPES:
+            return Response({'error': 'indicator_type must be one of ip, domain, url'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        try:
+            days = int(request.query_params.get('days', 30))
+            limit = int(request.query_params.get('limit', 1000))
+        except ValueError:
+            return Response({'error': 'days and limit must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+        if days < 1:
+            return Response({'error': 'days must be at least 1'}, status=status.HTTP_400_BAD_REQUEST)
+
+        stale = services.stale_indicators(indicator_type, days)
+        return Response({
+            'indicator_type': indicator_type,
+            'days': days,
+            'tracking_since': hits.day_to_date(hits.get_sketch().created_day).isoformat(),
+            'count': len(stale),
+            'entries': stale[:max(0, limit)],
+        })
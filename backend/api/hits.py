@@ -0,0 +1,246 @@
+"""Hit counts reported by enforcement points, for finding entries nothing matches.
+
+Firewalls, resolvers and proxies report batches of (indicator, count) pairs
+to /api/hits/. The counts go into memory-bounded sketches rather than a
+table per indicator, so millions of entries and hits cost a fixed amount of
+memory:
+
+- a count-min sketch of hits per indicator: DEPTH rows of WIDTH counters,
+  each indicator adds its count to one counter per row, and its estimate is
+  the smallest of them. Estimates are never too low and are too high by at
+  most a small fraction of all hits.
+- a "last hit" sketch of the same shape that keeps, per counter, the
+  latest day anything hashed to it was hit. Its minimum over the rows is
+  never earlier than the indicator's real last hit, so an entry reported
+  as stale really had no hits.
+- a HyperLogLog per list type estimating the unique sources (the hosts that
+  triggered the hits) seen by all enforcement points.
+
+The sketches live in a memory-mapped file (settings.HIT_SKETCH_FILE) shared
+by all worker processes and guarded by flock, like the rate limit buckets.
+Updates land in the shared page cache at once, so they survive worker
+restarts, and ingestion flushes the file to disk every HIT_FLUSH_INTERVAL
+seconds, which bounds what a host crash can lose.
+
+IPs and domains are counted under the reported indicator. A reported URL
+is matched like /api/lookup/ matches it and counted under the url_matching
+key of every entry that blocks it, so hits on http://evil.com/a/b keep the
+entry http://evil.com/a from looking stale.
+
+stale_entries() checks every entry of a list against the last-hit sketch
+to find the entries with no hits in the last N days, as pruning candidates.
+"""
+import datetime
+import hashlib
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.utils import timezone
+
+try:
+    import fcntl
+except ImportError:  # Windows: sketches are per process
+    fcntl = None
+
+MAGIC = b'BLHITS2\0'
+
+# magic, width, depth, day the file was created, total hits per list type
+HEADER = struct.Struct('<8sIII3Q')
+HEADER_SIZE = 64
+
+TYPES = ('ip', 'domain', 'url')
+
+# HyperLogLog registers per list type: 2 ** 14, about 0.8% standard error
+HLL_PRECISION = 14
+HLL_REGISTERS = 1 << HLL_PRECISION
+
+COUNTER_MAX = 2 ** 32 - 1
+
+
+def today():
+    """Days since 1970-01-01 (UTC); 0 in the last-hit sketch means never"""
+    return int(time.time() // 86400)
+
+
+def day_to_date(day):
+    return datetime.date(1970, 1, 1) + datetime.timedelta(days=day)
+
+
+def _key_hashes(indicator_type, indicator):
+    digest = hashlib.blake2b(f"{indicator_type}:{indicator}".encode('utf-8'), digest_size=16).digest()
+    # Double hashing: row i uses h1 + i * h2
+    return int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+
+
+def _hll_update(registers, source):
+    value = int.from_bytes(hashlib.blake2b(source.encode('utf-8'), digest_size=8).digest(), 'little')
+    index = value >> (64 - HLL_PRECISION)
+    rest = value & ((1 << (64 - HLL_PRECISION)) - 1)
+    rank = (64 - HLL_PRECISION) - rest.bit_length() + 1
+    if rank > registers[index]:
+        registers[index] = rank
+
+
+def hll_estimate(registers):
+    m = len(registers)
+    alpha = 0.7213 / (1 + 1.079 / m)
+    estimate = alpha * m * m / sum(2.0 ** -register for register in registers)
+    zeros = registers.count(0)
+    if estimate <= 2.5 * m and zeros:
+        # Small range correction: linear counting
+        estimate = m * math.log(m / zeros)
+    return int(round(estimate))
+
+
+class HitSketch:
+    """Count-min, last-hit and HyperLogLog sketches in a shared memory-mapped file"""
+
+    def __init__(self, path, width, depth):
+        self.path = path
+        self.width = width
+        self.depth = depth
+        self.pid = os.getpid()
+        self._thread_lock = threading.Lock()
+        self._flushed_at = time.monotonic()
+
+        cells = width * depth
+        self._counts_offset = HEADER_SIZE
+        self._days_offset = self._counts_offset + 4 * cells
+        self._hll_offset = self._days_offset + 2 * cells
+        size = self._hll_offset + len(TYPES) * HLL_REGISTERS
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        with self._locked():
+            header = os.pread(self._fd, HEADER.size, 0)
+            if (os.fstat(self._fd).st_size != size or len(header) < HEADER.size
+                    or HEADER.unpack(header)[:3] != (MAGIC, width, depth)):
+                # New file, or HIT_SKETCH_WIDTH/DEPTH changed: start counting again
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, size)
+                os.pwrite(self._fd, HEADER.pack(MAGIC, width, depth, today(), 0, 0, 0), 0)
+        self._mm = mmap.mmap(self._fd, size)
+        view = memoryview(self._mm)
+        self._counts = view[self._counts_offset:self._days_offset].cast('I')
+        self._days = view[self._days_offset:self._hll_offset].cast('H')
+        self._hll = {
+            indicator_type: view[self._hll_offset + i * HLL_REGISTERS:self._hll_offset + (i + 1) * HLL_REGISTERS]
+            for i, indicator_type in enumerate(TYPES)
+        }
+
+    @contextmanager
+    def _locked(self):
+        with self._thread_lock:
+            if fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _cells(self, indicator_type, indicator):
+        h1, h2 = _key_hashes(indicator_type, indicator)
+        width = self.width
+        return [row * width + (h1 + row * h2) % width for row in range(self.depth)]
+
+    def _header(self):
+        return HEADER.unpack_from(self._mm, 0)
+
+    def add(self, hits):
+        """Record (indicator_type, keys, count, day, sources) hits; the count
+        is added to each key, but to the totals once"""
+        counts, days = self._counts, self._days
+        with self._locked():
+            header = list(self._header())
+            for indicator_type, keys, count, day, sources in hits:
+                for key in keys:
+                    for cell in self._cells(indicator_type, key):
+                        counts[cell] = min(COUNTER_MAX, counts[cell] + count)
+                        if day > days[cell]:
+                            days[cell] = day
+                header[4 + TYPES.index(indicator_type)] += count
+                registers = self._hll[indicator_type]
+                for source in sources:
+                    _hll_update(registers, source)
+            HEADER.pack_into(self._mm, 0, *header)
+        if time.monotonic() - self._flushed_at >= settings.HIT_FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        self._flushed_at = time.monotonic()
+        self._mm.flush()
+
+    def estimate(self, indicator_type, indicator):
+        """(estimated hits, last hit day or None)"""
+        cells = self._cells(indicator_type, indicator)
+        count = min(self._counts[cell] for cell in cells)
+        day = min(self._days[cell] for cell in cells)
+        return count, (day or None)
+
+    def last_hit(self, indicator_type, indicator):
+        h1, h2 = _key_hashes(indicator_type, indicator)
+        days, width = self._days, self.width
+        return min(days[row * width + (h1 + row * h2) % width] for row in range(self.depth))
+
+    def summary(self):
+        _, width, depth, created_day, *totals = self._header()
+        return {
+            'tracking_since': day_to_date(created_day).isoformat(),
+            'sketch': {'width': width, 'depth': depth},
+            'types': {
+                indicator_type: {
+                    'hits': total,
+                    'unique_sources': hll_estimate(self._hll[indicator_type].tolist()),
+                }
+                for indicator_type, total in zip(TYPES, totals)
+            },
+        }
+
+    @property
+    def created_day(self):
+        return self._header()[3]
+
+
+_sketch = None
+_sketch_lock = threading.Lock()
+
+def get_sketch():
+    """The process's HitSketch, reopened after a fork so flock works between workers"""
+    global _sketch
+    sketch = _sketch
+    if sketch is None or sketch.pid != os.getpid():
+        with _sketch_lock:
+            if _sketch is None or _sketch.pid != os.getpid():
+                _sketch = HitSketch(settings.HIT_SKETCH_FILE, settings.HIT_SKETCH_WIDTH, settings.HIT_SKETCH_DEPTH)
+            sketch = _sketch
+    return sketch
+
+
+def stale_entries(indicator_type, entries, days, key=None):
+    """Entries with no hits in the last `days` days, in list order.
+
+    Only entries that could have been tracked that long are candidates: a
+    sketch younger than `days` reports none. key maps an entry to the key its
+    hits are counted under (default: the entry itself).
+    """
+    sketch = get_sketch()
+    cutoff = today() - days
+    if sketch.created_day > cutoff:
+        return []
+    key = key or (lambda entry: entry)
+    return [entry for entry in entries if sketch.last_hit(indicator_type, key(entry)) <= cutoff]
+
+
+def hit_day(value):
+    """Day number of an ISO 8601 hit time; future times count as today"""
+    seen_at = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if timezone.is_naive(seen_at):
+        seen_at = timezone.make_aware(seen_at, datetime.timezone.utc)
+    return min(today(), int(seen_at.timestamp() // 86400))
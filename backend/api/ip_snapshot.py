@@ -0,0 +1,214 @@
+"""Immutable, memory-mapped binary snapshot of the IP blocklist.
+
+The service layer publishes a new snapshot after every IP list mutation by
+writing a temporary file and renaming it over the old one. Workers mmap the
+current file and binary-search it, so membership checks copy nothing, the
+pages are shared through the OS page cache, and a 2M-entry list costs about
+8 MB in total instead of a Python list of strings per worker.
+
+File layout (little-endian header):
+
+    magic    8s   b'BLIPSNP1'
+    version  Q    list version the snapshot was built from
+    v4_count I    number of IPv4 records
+    v6_count I    number of IPv6 records
+    v4 records    v4_count x uint32, little-endian, sorted ascending
+    v6 records    v6_count x 16 bytes, big-endian, sorted ascending
+"""
+import array
+import bisect
+import mmap
+import os
+import socket
+import struct
+import sys
+import threading
+
+MAGIC = b'BLIPSNP1'
+HEADER = struct.Struct('<8sQII')
+
+# Deltas larger than this rebuild the sorted arrays instead of inserting
+# records one at a time
+INCREMENTAL_LIMIT = 64
+
+_native_little_endian = sys.byteorder == 'little'
+
+
+def parse_ip(value):
+    """Return (4, int) or (6, packed bytes) for an address, or None"""
+    value = value.strip()
+    try:
+        return 4, int.from_bytes(socket.inet_pton(socket.AF_INET, value), 'big')
+    except (OSError, ValueError):
+        pass
+    try:
+        return 6, socket.inet_pton(socket.AF_INET6, value)
+    except (OSError, ValueError):
+        return None
+
+
+def _split(indicators):
+    v4, v6 = set(), set()
+    for indicator in indicators:
+        parsed = parse_ip(indicator)
+        if parsed is None:
+            continue
+        (v4 if parsed[0] == 4 else v6).add(parsed[1])
+    return v4, v6
+
+
+def _v4_array(values):
+    return array.array('I', sorted(values))
+
+
+def write_snapshot(path, version, v4, v6):
+    """Atomically write a snapshot from a sorted uint32 array and sorted v6 list"""
+    v4_bytes = v4.tobytes() if _native_little_endian else _swapped(v4).tobytes()
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, version, len(v4), len(v6)))
+        f.write(v4_bytes)
+        f.write(b''.join(v6))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _swapped(values):
+    copy = array.array('I', values)
+    copy.byteswap()
+    return copy
+
+
+class IPSnapshot:
+    """Read-only view over a published snapshot file"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            self.identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.version, self.v4_count, self.v6_count = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not an IP blocklist snapshot")
+        self._v4_offset = HEADER.size
+        self._v6_offset = self._v4_offset + 4 * self.v4_count
+        view = memoryview(self._mm)
+        # A native uint32 view lets bisect run in C over the mapped pages
+        self._v4 = view[self._v4_offset:self._v6_offset].cast('I') if _native_little_endian else None
+
+    def __len__(self):
+        return self.v4_count + self.v6_count
+
+    def __contains__(self, indicator):
+        parsed = parse_ip(indicator)
+        if parsed is None:
+            return False
+        if parsed[0] == 4:
+            return self._contains_v4(parsed[1])
+        return self._contains_v6(parsed[1])
+
+    def _contains_v4(self, value):
+        if self._v4 is not None:
+            i = bisect.bisect_left(self._v4, value)
+            return i < self.v4_count and self._v4[i] == value
+        lo, hi = 0, self.v4_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            current = struct.unpack_from('<I', self._mm, self._v4_offset + 4 * mid)[0]
+            if current < value:
+                lo = mid + 1
+            elif current > value:
+                hi = mid
+            else:
+                return True
+        return False
+
+    def _contains_v6(self, packed):
+        lo, hi = 0, self.v6_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            start = self._v6_offset + 16 * mid
+            current = self._mm[start:start + 16]
+            if current < packed:
+                lo = mid + 1
+            elif current > packed:
+                hi = mid
+            else:
+                return True
+        return False
+
+    def v4_array(self):
+        """Return a mutable copy of the IPv4 records"""
+        values = array.array('I')
+        values.frombytes(self._mm[self._v4_offset:self._v6_offset])
+        if not _native_little_endian:
+            values.byteswap()
+        return values
+
+    def v6_list(self):
+        """Return the IPv6 records as a list of packed addresses"""
+        start = self._v6_offset
+        return [self._mm[start + 16 * i:start + 16 * (i + 1)] for i in range(self.v6_count)]
+
+
+def build_from_list(path, version, indicators):
+    """Publish a snapshot built from scratch from the given indicators"""
+    v4, v6 = _split(indicators)
+    write_snapshot(path, version, _v4_array(v4), sorted(v6))
+
+
+def apply_change(path, previous_version, version, action, indicators, read_all):
+    """Publish a new snapshot after a BLOCK or UNBLOCK.
+
+    The previous snapshot is patched when it matches the list version the
+    change was made against; otherwise the snapshot is rebuilt from read_all().
+    """
+    try:
+        current = IPSnapshot(path)
+    except (FileNotFoundError, ValueError):
+        current = None
+    if current is None or current.version != previous_version:
+        build_from_list(path, version, read_all())
+        return
+
+    delta_v4, delta_v6 = _split(indicators)
+    v4 = current.v4_array()
+    v6 = current.v6_list()
+    if action == 'BLOCK':
+        if len(delta_v4) <= INCREMENTAL_LIMIT:
+            for value in delta_v4:
+                i = bisect.bisect_left(v4, value)
+                if i == len(v4) or v4[i] != value:
+                    v4.insert(i, value)
+        else:
+            v4 = _v4_array(set(v4) | delta_v4)
+        v6 = sorted(set(v6) | delta_v6)
+    else:
+        if len(delta_v4) <= INCREMENTAL_LIMIT:
+            for value in delta_v4:
+                i = bisect.bisect_left(v4, value)
+                if i < len(v4) and v4[i] == value:
+                    del v4[i]
+        else:
+            v4 = _v4_array(set(v4) - delta_v4)
+        v6 = sorted(set(v6) - delta_v6)
+    write_snapshot(path, version, v4, v6)
+
+
+_reader_lock = threading.Lock()
+_reader = None
+
+
+def get_snapshot(path):
+    """Return the mapped snapshot, remapping it if a newer one was published"""
+    global _reader
+    stat = os.stat(path)
+    identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    reader = _reader
+    if reader is not None and reader.identity == identity:
+        return reader
+    with _reader_lock:
+        if _reader is None or _reader.identity != identity:
+            _reader = IPSnapshot(path)
+        return _reader
@@ -0,0 +1,82 @@
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from . import jobs
+from .models import Job
+from .permissions import IsAuthenticatedOrHasApiKey, ApiKeyPermission
+from .serializers import JobSerializer, JobRequestSerializer
+
+def job_accepted_response(job):
+    """202 response pointing the client at a job's status endpoint"""
+    return Response({
+        'message': f'Accepted as background job {job.id}',
+        'job_id': str(job.id),
+        'status': job.status,
+        'total': job.total,
+        'status_url': f'/api/jobs/{job.id}/',
+    }, status=status.HTTP_202_ACCEPTED)
+
+def visible_jobs(user):
+    """Admins see every job; other users see their own"""
+    return Job.objects.all() if user.is_staff else Job.objects.filter(user=user)
+
+class JobListView(APIView):
+    permission_classes = [IsAuthenticatedOrHasApiKey]
+
+    def get_permission_required(self, method):
+        if hasattr(self.request, 'api_key'):
+            return ApiKeyPermission.READ_ONLY if method == 'GET' else ApiKeyPermission.READ_WRITE
+        return 'api.view_blocklist'
+
+    @swagger_auto_schema(
+        operation_description="List the 50 most recent background jobs",
+        responses={200: JobSerializer(many=True)}
+    )
+    def get(self, request):
+        return Response(JobSerializer(visible_jobs(request.user)[:50], many=True).data)
+
+    @swagger_auto_schema(
+        operation_description="Start a background job: 'export' builds a raw feed export "
+                              "(indicator_type, format); 'canonicalize_urls' rewrites the URL list "
+                              "in canonical form (admin only). Large block and unblock requests "
+                              "become jobs automatically.",
+        request_body=JobRequestSerializer,
+        responses={202: "Job accepted", 400: "Bad Request", 403: "Forbidden"}
+    )
+    def post(self, request):
+        serializer = JobRequestSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        data = serializer.validated_data
+
+        if data['kind'] == 'canonicalize_urls':
+            if not request.user.is_staff:
+                return Response({'error': 'Only admins can canonicalize the URL list'},
+                                status=status.HTTP_403_FORBIDDEN)
+            params = {'username': request.user.username, 'reason': data.get('reason') or 'URL canonicalization'}
+        else:
+            params = {'indicator_type': data['indicator_type'], 'format': data['format']}
+
+        job = jobs.submit(data['kind'], params, request.user)
+        return job_accepted_response(job)
+
+class JobDetailView(APIView):
+    permission_classes = [IsAuthenticatedOrHasApiKey]
+
+    def get_permission_required(self, method):
+        return ApiKeyPermission.READ_ONLY if hasattr(self.request, 'api_key') else 'api.view_blocklist'
+
+    @swagger_auto_schema(
+        operation_description="Get the status, progress and partial results of a background job. "
+                              "Block and unblock jobs report per-bucket counts and up to "
+                              "JOB_RESULT_SAMPLE_SIZE sample items per bucket.",
+        responses={200: JobSerializer, 404: "Not Found"}
+    )
+    def get(self, request, job_id):
+        try:
+            job = visible_jobs(request.user).get(pk=job_id)
+        except Job.DoesNotExist:
+            return Response({'error': 'Job not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(JobSerializer(jobs.mark_if_interrupted(job)).data)
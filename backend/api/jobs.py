@@ -0,0 +1,186 @@
+"""Background jobs for operations too large to run inside a request.
+
+A job is a Job row in the database plus, for block and unblock jobs, a
+payload file of indicators (one per line) in settings.JOBS_DIR. submit()
+stores both and hands the job to a thread pool in the current process, so
+the request returns the job ID straight away and clients poll
+/api/jobs/<id>/ for progress.
+
+Block and unblock jobs read the payload settings.JOB_CHUNK_SIZE lines at a
+time and apply each chunk under its own mutation lock: memory stays bounded,
+other writers are not shut out for the whole import, and progress and
+partial results are saved after every chunk.
+"""
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from . import exports, services
+from .models import Job
+
+logger = logging.getLogger('django')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.JOB_WORKERS, thread_name_prefix='job')
+        return _executor
+
+def payload_path(job_id):
+    return os.path.join(settings.JOBS_DIR, f"{job_id}.txt")
+
+def submit(kind, params, user, indicators=None):
+    """Record a job and start it in the background; returns the Job"""
+    if kind not in RUNNERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    job = Job(kind=kind, params=params, user=user, pid=os.getpid())
+    if indicators is not None:
+        os.makedirs(settings.JOBS_DIR, exist_ok=True)
+        try:
+            with open(payload_path(job.id), 'w') as f:
+                for indicator in indicators:
+                    f.write(f"{indicator}\n")
+                    job.total += 1
+        except BaseException:
+            # e.g. a streamed upload that turned out to be malformed
+            os.remove(payload_path(job.id))
+            raise
+    job.save()
+    _get_executor().submit(run, job.id)
+    return job
+
+def run(job_id):
+    """Run a queued job to completion, recording the outcome"""
+    try:
+        # Claim the job so it runs only once
+        claimed = Job.objects.filter(pk=job_id, status=Job.QUEUED).update(
+            status=Job.RUNNING, pid=os.getpid(), started_at=timezone.now()
+        )
+        if not claimed:
+            return
+        job = Job.objects.get(pk=job_id)
+        try:
+            RUNNERS[job.kind](job)
+            job.status = Job.SUCCEEDED
+        except Exception as e:
+            logger.exception(f"Job {job.id} ({job.kind}) failed")
+            job.status = Job.FAILED
+            job.error = str(e)
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'finished_at', 'processed', 'result'])
+    finally:
+        try:
+            os.remove(payload_path(job_id))
+        except FileNotFoundError:
+            pass
+        # Pool threads outlive requests, so nothing else closes their connections
+        connections.close_all()
+
+def mark_if_interrupted(job):
+    """Fail a queued or running job whose process has exited (e.g. a worker restart)"""
+    if job.status not in (Job.QUEUED, Job.RUNNING) or job.pid is None or job.pid == os.getpid():
+        return job
+    try:
+        os.kill(job.pid, 0)
+    except ProcessLookupError:
+        updated = Job.objects.filter(pk=job.pk, status=job.status).update(
+            status=Job.FAILED, error='Interrupted: the process running the job exited',
+            finished_at=timezone.now()
+        )
+        if updated:
+            job.refresh_from_db()
+    except (PermissionError, OSError):
+        pass  # Process exists (or cannot be checked); assume it is still working
+    return job
+
+def _read_chunks(job):
+    with open(payload_path(job.id), 'r') as f:
+        while True:
+            chunk = [line.rstrip('\n') for line in islice(f, settings.JOB_CHUNK_SIZE)]
+            if not chunk:
+                return
+            yield chunk
+
+def _save_progress(job, chunk_size, chunk_result):
+    """Add a chunk's result to the job's counts and samples and save them"""
+    counts = job.result.setdefault('counts', {})
+    samples = job.result.setdefault('samples', {})
+    for key, items in chunk_result.items():
+        if key in ('batch_id', 'batch_ids'):
+            # Audit batches written for this chunk, for /api/logs/batches/<id>/revert/
+            batch_ids = items if isinstance(items, list) else [items]
+            job.result.setdefault('batch_ids', []).extend(i for i in batch_ids if i is not None)
+            continue
+        counts[key] = counts.get(key, 0) + len(items)
+        sample = samples.setdefault(key, [])
+        sample.extend(items[:settings.JOB_RESULT_SAMPLE_SIZE - len(sample)])
+    job.processed += chunk_size
+    job.save(update_fields=['processed', 'result'])
+
+def _merge_types(result):
+    """Flatten an indicator_type=auto result into one set of buckets"""
+    merged = {'invalid': result['invalid']}
+    for type_result in result['by_type'].values():
+        for key, items in type_result.items():
+            if key == 'batch_id':
+                merged.setdefault('batch_ids', []).append(items)
+            else:
+                merged.setdefault(key, []).extend(items)
+    return merged
+
+def _run_block(job):
+    params = job.params
+    for chunk in _read_chunks(job):
+        if params['indicator_type'] == services.AUTO_TYPE:
+            result = _merge_types(services.add_auto_to_blocklist(
+                chunk, params['username'], params.get('reason', ''), expires_at=params.get('expires_at')
+            ))
+        else:
+            result = services.add_to_blocklist(
+                params['indicator_type'], chunk, params['username'], params.get('reason', ''),
+                expires_at=params.get('expires_at')
+            )
+        _save_progress(job, len(chunk), result)
+
+def _run_unblock(job):
+    params = job.params
+    for chunk in _read_chunks(job):
+        if params['indicator_type'] == services.AUTO_TYPE:
+            result = _merge_types(services.remove_auto_from_blocklist(
+                chunk, params['username'], params.get('reason', '')
+            ))
+        else:
+            result = services.remove_from_blocklist(
+                params['indicator_type'], chunk, params['username'], params.get('reason', '')
+            )
+        _save_progress(job, len(chunk), result)
+
+def _run_export(job):
+    indicator_type, export_format = job.params['indicator_type'], job.params['format']
+    path, version = exports.get_export(indicator_type, export_format)
+    job.result = {
+        'version': version,
+        'size': os.path.getsize(path),
+        'url': f"/api/raw/{indicator_type}-blocklist/{export_format}/",
+    }
+
+def _run_canonicalize_urls(job):
+    result = services.canonicalize_url_blocklist(job.params['username'], job.params.get('reason', ''))
+    _save_progress(job, 0, result)
+
+RUNNERS = {
+    'block': _run_block,
+    'unblock': _run_unblock,
+    'export': _run_export,
+    'canonicalize_urls': _run_canonicalize_urls,
+}
@@ -0,0 +1,246 @@
+"""Persisted, memory-mapped index of a text blocklist.
+
+Domain and URL lookups need every entry of a list in a searchable form.
+Parsing and de-duplicating a million-line text file takes seconds in every
+worker, so the sorted entries are written once under settings.INDEX_CACHE_DIR
+and workers map that file instead: a restarted worker is ready as soon as the
+file is opened, and all workers share the same pages of the OS page cache.
+
+Each index records the size, mtime and SHA-256 of the text file it was built
+from. An index whose source has changed is stale: it is never served, and a
+replacement is built on a background thread while callers fall back to
+reading the text file.
+
+File layout (little-endian header):
+
+    magic        8s   b'BLIDX001' (bumped whenever the layout changes)
+    source_size  Q    size of the source file
+    source_mtime q    st_mtime_ns of the source file
+    source_hash  32s  SHA-256 of the source file
+    count        Q    number of entries
+    offsets      (count + 1) x uint64, start of each entry in the data block
+    data         UTF-8 entries, sorted bytewise and concatenated
+"""
+import array
+import glob
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import sys
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows development checkouts have no flock
+    fcntl = None
+
+logger = logging.getLogger('django')
+
+MAGIC = b'BLIDX001'
+HEADER = struct.Struct('<8sQq32sQ')
+
+_native_little_endian = sys.byteorder == 'little'
+
+
+def _stat_key(path):
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def _file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.digest()
+
+
+def build(source_path, index_path, key=None):
+    """Build an index of source_path and atomically publish it at index_path.
+
+    key, if given, maps each entry to the string that is indexed (entries it
+    maps to None are left out).
+    """
+    size, mtime = _stat_key(source_path)
+    with open(source_path, 'rb') as f:
+        data = f.read()
+    source_hash = hashlib.sha256(data).digest()
+
+    # Same entries as services.read_blocklist(): stripped, non-empty lines
+    entries = {line.strip() for line in data.decode('utf-8', 'replace').split('\n')}
+    entries.discard('')
+    if key is not None:
+        entries = {key(entry) for entry in entries}
+        entries.discard(None)
+    encoded = sorted(entry.encode('utf-8') for entry in entries)
+
+    offsets = array.array('Q', [0])
+    position = 0
+    for entry in encoded:
+        position += len(entry)
+        offsets.append(position)
+    if not _native_little_endian:
+        offsets.byteswap()
+
+    tmp_path = f"{index_path}.tmp.{os.getpid()}"
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, size, mtime, source_hash, len(encoded)))
+        f.write(offsets.tobytes())
+        f.write(b''.join(encoded))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, index_path)
+
+
+def _remove_partial_builds(index_path):
+    """Remove temporary files of builds that never finished, e.g. on a daemon
+    thread of a management command that exited. Only called with the index
+    lock held, when no other build of the index can be running."""
+    for tmp_path in glob.glob(f"{glob.escape(index_path)}.tmp.*"):
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+
+
+class ListIndex:
+    """Read-only view over a published index file"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            stat = os.fstat(f.fileno())
+            self.identity = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+            if stat.st_size < HEADER.size:
+                raise ValueError(f"{path} is not a blocklist index")
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.source_size, self.source_mtime, self.source_hash, self.count = \
+            HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a blocklist index")
+        self._data_offset = HEADER.size + 8 * (self.count + 1)
+        offsets = memoryview(self._mm)[HEADER.size:self._data_offset]
+        self._offsets = offsets.cast('Q') if _native_little_endian else None
+
+    def __len__(self):
+        return self.count
+
+    def _offset(self, i):
+        if self._offsets is not None:
+            return self._offsets[i]
+        return struct.unpack_from('<Q', self._mm, HEADER.size + 8 * i)[0]
+
+    def _entry(self, i):
+        start = self._data_offset + self._offset(i)
+        end = self._data_offset + self._offset(i + 1)
+        return self._mm[start:end]
+
+    def __contains__(self, value):
+        value = value.encode('utf-8')
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            current = self._entry(mid)
+            if current < value:
+                lo = mid + 1
+            elif current > value:
+                hi = mid
+            else:
+                return True
+        return False
+
+    def matches(self, source_path, stat_key):
+        """Return True if the index was built from the current source contents"""
+        if stat_key == (self.source_size, self.source_mtime):
+            return True
+        if stat_key[0] != self.source_size:
+            return False
+        # Same size but touched since the build; compare contents
+        return _file_hash(source_path) == self.source_hash
+
+
+class IndexCache:
+    """Per-process registry of mapped indexes, rebuilt in the background.
+
+    get() returns an index only if it matches the current source file; when
+    it does not, a rebuild is started and None is returned so the caller can
+    answer from the text file in the meantime.
+    """
+
+    def __init__(self, directory, keys=None):
+        self.directory = directory
+        self.keys = keys or {}  # name -> key function passed to build()
+        self._lock = threading.Lock()
+        self._indexes = {}  # name -> (ListIndex, source stat key it was verified against)
+        self._building = set()
+
+    def index_path(self, name):
+        return os.path.join(self.directory, f"{name}.idx")
+
+    def get(self, name, source_path):
+        stat_key = _stat_key(source_path)
+        entry = self._indexes.get(name)
+        if entry is not None and entry[1] == stat_key:
+            return entry[0]
+
+        index = self._load(name, entry[0] if entry else None)
+        if index is not None and index.matches(source_path, stat_key):
+            self._indexes[name] = (index, stat_key)
+            return index
+        self.rebuild_async(name, source_path)
+        return None
+
+    def _load(self, name, current):
+        """Map the published index, reusing the current mapping if unchanged"""
+        path = self.index_path(name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        if current is not None and current.identity == (stat.st_ino, stat.st_mtime_ns, stat.st_size):
+            return current
+        try:
+            return ListIndex(path)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def rebuild_async(self, name, source_path):
+        """Start a background rebuild unless one is already running in this process"""
+        with self._lock:
+            if name in self._building:
+                return
+            self._building.add(name)
+        thread = threading.Thread(
+            target=self._rebuild, args=(name, source_path),
+            name=f"index-rebuild-{name}", daemon=True
+        )
+        thread.start()
+
+    def _rebuild(self, name, source_path):
+        try:
+            self.rebuild(name, source_path)
+        except Exception:
+            logger.exception(f"Failed to rebuild the {name} blocklist index")
+        finally:
+            with self._lock:
+                self._building.discard(name)
+
+    def rebuild(self, name, source_path):
+        """Rebuild an index now; returns False if another process is already building it"""
+        os.makedirs(self.directory, exist_ok=True)
+        index_path = self.index_path(name)
+        with open(f"{index_path}.lock", 'a') as lock_file:
+            if fcntl:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return False
+            try:
+                if fcntl:
+                    _remove_partial_builds(index_path)
+                build(source_path, index_path, key=self.keys.get(name))
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+        return True
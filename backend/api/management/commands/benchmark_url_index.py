@@ -0,0 +1,78 @@
+import os
+import random
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import list_index, url_matching
+
+
+def _percentile(values, percent):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+class Command(BaseCommand):
+    help = "Benchmark URL canonicalization, prefix index builds and lookups on a synthetic URL blocklist"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--urls', type=int, default=1000000, help="Blocked URLs to generate (default: 1000000)")
+        parser.add_argument('--lookups', type=int, default=100000, help="Lookups to time (default: 100000)")
+        parser.add_argument('--seed', type=int, default=1)
+
+    def _random_url(self, rng):
+        host = f"host{rng.randrange(self.host_count)}.example{rng.randrange(100)}.com"
+        segments = '/'.join(f"p{rng.randrange(1000)}" for _ in range(rng.randint(0, 4)))
+        url = f"{rng.choice(['http', 'https'])}://{host}/{segments}"
+        if rng.random() < 0.2:
+            url += f"?id={rng.randrange(100000)}"
+        return url
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        self.host_count = max(1, options['urls'] // 4)
+        blocked = [self._random_url(rng) for _ in range(options['urls'])]
+
+        with tempfile.TemporaryDirectory() as directory:
+            source_path = os.path.join(directory, 'url-blocklist.txt')
+            index_path = os.path.join(directory, 'url-prefix.idx')
+
+            start = time.perf_counter()
+            canonical = [url_matching.canonicalize_url(url) for url in blocked]
+            canonicalize_time = time.perf_counter() - start
+            with open(source_path, 'w') as f:
+                f.writelines(f"{url}\n" for url in canonical)
+
+            start = time.perf_counter()
+            list_index.build(source_path, index_path, key=url_matching.match_key)
+            build_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            index = list_index.ListIndex(index_path)
+            load_time = time.perf_counter() - start
+
+            # Half the lookups are below a blocked path prefix, half are random URLs
+            prefixes = [url for url in canonical if '?' not in url]
+            visited = []
+            for i in range(options['lookups']):
+                if i % 2:
+                    visited.append(self._random_url(rng))
+                else:
+                    visited.append(f"{rng.choice(prefixes).rstrip('/')}/child/page?q={i}")
+
+            timings = []
+            hits = 0
+            for url in visited:
+                start = time.perf_counter()
+                hits += url_matching.is_blocked(url, index)
+                timings.append(time.perf_counter() - start)
+
+            self.stdout.write(f"Blocked URLs:        {len(blocked)} ({len(index)} unique keys)")
+            self.stdout.write(f"Canonicalization:    {canonicalize_time / len(blocked) * 1e6:.1f} us/URL")
+            self.stdout.write(f"Index build:         {build_time:.2f} s, {os.path.getsize(index_path) / 1e6:.1f} MB")
+            self.stdout.write(f"Index load (mmap):   {load_time * 1e3:.2f} ms")
+            self.stdout.write(f"Lookups:             {len(visited)} ({hits} blocked)")
+            self.stdout.write(f"Lookup latency:      mean {sum(timings) / len(timings) * 1e6:.1f} us, "
+                              f"p50 {_percentile(timings, 50) * 1e6:.1f} us, "
+                              f"p99 {_percentile(timings, 99) * 1e6:.1f} us")
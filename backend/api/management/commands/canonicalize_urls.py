@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from api import services
+
+
+class Command(BaseCommand):
+    help = "Rewrite the URL blocklist in canonical form, merging spelling variants of the same URL"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Report the entries that would change without writing anything")
+        parser.add_argument('--username', default='system',
+                            help="User recorded in the audit log (default: system)")
+
+    def handle(self, *args, **options):
+        result = services.canonicalize_url_blocklist(
+            options['username'], 'URL canonicalization', dry_run=options['dry_run']
+        )
+        for entry in result['removed']:
+            self.stdout.write(f"- {entry}")
+        for entry in result['added']:
+            self.stdout.write(f"+ {entry}")
+
+        verb = "Would rewrite" if options['dry_run'] else "Rewrote"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {len(result['removed'])} entries as {len(result['added'])} canonical URLs"
+        ))
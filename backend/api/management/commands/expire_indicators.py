@@ -0,0 +1,41 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api import expiry, replication, services
+
+
+class Command(BaseCommand):
+    help = "Unblock indicators whose expiry time has passed, in batched sweeps"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help="Run a single sweep and exit (for cron) instead of running continuously")
+        parser.add_argument('--interval', type=float, default=settings.EXPIRY_SWEEP_INTERVAL,
+                            help=f"Seconds between sweeps (default: {settings.EXPIRY_SWEEP_INTERVAL})")
+
+    def sweep(self, scheduler):
+        expired = services.expire_indicators(scheduler)
+        for indicator_type, indicators in expired.items():
+            self.stdout.write(f"Expired {len(indicators)} {indicator_type} indicators")
+        return expired
+
+    def handle(self, *args, **options):
+        if replication.is_follower():
+            raise CommandError("This node is a read-only replica; expiry runs on the leader")
+        scheduler = expiry.ExpiryScheduler()
+        if options['once']:
+            self.sweep(scheduler)
+            return
+
+        self.stdout.write(f"Sweeping expired indicators every {options['interval']}s")
+        while True:
+            started = time.monotonic()
+            # The heap answers "is anything due?" without touching the lists
+            with services.mutation_lock():
+                scheduler.refresh()
+                next_due = scheduler.next_due()
+            if next_due is not None and next_due <= time.time():
+                self.sweep(scheduler)
+            time.sleep(max(0.0, options['interval'] - (time.monotonic() - started)))
@@ -0,0 +1,82 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import feeds, replication, services
+
+
+class Command(BaseCommand):
+    help = ("Import indicators from threat feed files (text, CSV, STIX JSON), parsing the files in parallel "
+            "and adding everything as one batched mutation")
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='+', help="Feed files to import")
+        parser.add_argument('--format', choices=feeds.FORMATS,
+                            help="Format of every file (default: detect from the extension and content)")
+        parser.add_argument('--column', help="CSV column holding the indicators (default: guess from the header)")
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help="Parser processes (default: number of CPUs)")
+        parser.add_argument('--reason', help="Reason recorded in the audit log (default: the feed file names)")
+        parser.add_argument('--username', default='system',
+                            help="User recorded in the audit log (default: system)")
+        parser.add_argument('--dry-run', action='store_true',
+                            help="Parse and report without changing the blocklists")
+
+    def handle(self, *args, **options):
+        if replication.is_follower() and not options['dry_run']:
+            raise CommandError("This node is a read-only replica; import on the leader")
+        for path in options['files']:
+            if not os.path.isfile(path):
+                raise CommandError(f"No such file: {path}")
+
+        started = time.perf_counter()
+        merged = {indicator_type: {} for indicator_type in services.INDICATOR_TYPES}
+        values = 0
+        invalid = 0
+        workers = max(1, min(options['workers'], len(options['files'])))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(feeds.parse_feed, path, options['format'], options['column']): path
+                for path in options['files']
+            }
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except Exception as e:
+                    raise CommandError(f"{futures[future]}: {e}")
+                values += result['values']
+                invalid += result['invalid']
+                counts = ', '.join(f"{len(found)} {t}" for t, found in result['indicators'].items())
+                self.stdout.write(
+                    f"{result['path']} ({result['format']}): {result['values']} values, {counts}, "
+                    f"{result['invalid']} invalid in {result['seconds']:.2f}s "
+                    f"({result['values'] / max(result['seconds'], 1e-9):,.0f} values/s)"
+                )
+                for indicator_type, found in result['indicators'].items():
+                    merged[indicator_type].update(dict.fromkeys(found))
+        parsed = time.perf_counter()
+
+        indicators_by_type = {t: list(found) for t, found in merged.items() if found}
+        unique = sum(len(found) for found in indicators_by_type.values())
+        self.stdout.write(f"Parsed {values} values from {len(options['files'])} files with {workers} workers "
+                          f"in {parsed - started:.2f}s: {unique} unique indicators, {invalid} invalid")
+        if options['dry_run'] or not indicators_by_type:
+            return
+
+        reason = options['reason'] or f"Feed import: {', '.join(os.path.basename(p) for p in options['files'])}"
+        results = services.add_many_to_blocklist(
+            indicators_by_type, options['username'], reason, prepared=True
+        )
+        finished = time.perf_counter()
+
+        for indicator_type, result in results.items():
+            self.stdout.write(
+                f"{indicator_type}: {len(result['added'])} added, {len(result['existing'])} already blocked, "
+                f"{len(result['allowlisted'])} allowlisted"
+                + (f" (audit batch {result['batch_id']})" if result['batch_id'] is not None else "")
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"Committed in {finished - parsed:.2f}s; {values / (finished - started):,.0f} values/s overall"
+        ))
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api import schema
+
+
+class Command(BaseCommand):
+    help = ("Generate the OpenAPI schema served by /swagger.json, /swagger.yaml and the docs UIs "
+            "into settings.OPENAPI_SCHEMA_DIR")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help="Fail if the stored schema does not match the views instead of writing it")
+
+    def handle(self, *args, **options):
+        documents = schema.generate_schema()
+        stale = schema.stale_schema_files(documents)
+        if options['check']:
+            if stale:
+                raise CommandError(f"OpenAPI schema is out of date: {', '.join(stale)}; "
+                                   "run python manage.py openapi_schema and commit the result")
+            self.stdout.write(self.style.SUCCESS("OpenAPI schema is up to date"))
+            return
+
+        schema.write_schema(documents)
+        for schema_format in documents:
+            path = schema.schema_path(schema_format)
+            self.stdout.write(f"{'Updated' if path in stale else 'Unchanged'} {path}")
@@ -0,0 +1,17 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api import publish, services
+
+
+class Command(BaseCommand):
+    help = ("Write the current version of each blocklist's raw feed, exports and checksums to "
+            "settings.PUBLISH_DIR for a static file server (changes are published automatically)")
+
+    def handle(self, *args, **options):
+        if not settings.PUBLISH_ENABLED:
+            raise CommandError("Publishing is disabled; set PUBLISH_ENABLED=true")
+
+        for indicator_type in services.INDICATOR_TYPES:
+            version = publish.publish(indicator_type)
+            self.stdout.write(f"Published the {indicator_type} blocklist at version {version}")
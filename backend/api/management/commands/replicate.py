@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api import replication
+
+
+class Command(BaseCommand):
+    help = ("Keep this follower's blocklists in step with the replication leader "
+            "(settings.REPLICATION_LEADER_URL) by following its change events")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true',
+                            help="Apply the changes available now and exit instead of following continuously")
+        parser.add_argument('--bootstrap', action='store_true',
+                            help="Download the leader's lists again before following it")
+
+    def handle(self, *args, **options):
+        if not replication.is_follower():
+            raise CommandError("This node is not a follower; set REPLICATION_ROLE=follower")
+        if not settings.REPLICATION_LEADER_URL:
+            raise CommandError("REPLICATION_LEADER_URL is not set")
+
+        client = replication.LeaderClient(settings.REPLICATION_LEADER_URL, settings.REPLICATION_API_KEY or None)
+        follower = replication.Follower(client)
+        try:
+            if options['bootstrap'] or follower.state.get('last_event_id') is None:
+                follower.bootstrap()
+            if options['once']:
+                applied = None
+                while applied != 0:
+                    applied = follower.sync_once()
+                    if applied:
+                        self.stdout.write(f"Applied {applied} events")
+                status = replication.status()
+                self.stdout.write(f"At leader event {status['last_event_id']}, lag {status['lag_seconds']}s")
+                return
+        except replication.LeaderError as e:
+            raise CommandError(f"Replication failed: {e}")
+
+        self.stdout.write(f"Following {settings.REPLICATION_LEADER_URL}")
+        follower.run()
@@ -1,6 +1,10 @@
 import json
 import time
 import logging
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import JsonResponse
 from django.utils import timezone
 
 logger = logging.getLogger('api_calls')
@@ -8,10 +12,20 @@ logger = logging.getLogger('api_calls')
 class APICallLoggingMiddleware:
     """Middleware to log all API calls with detailed information."""
     
+    # Supports both modes so async views are not pushed back onto a sync
+    # thread when the project is served through ASGI
+    sync_capable = True
+    async_capable = True
+    
     def __init__(self, get_response):
         self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
         
     def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        
         # Skip logging for static files and admin
         if request.path.startswith(('/static/', '/admin/')):
             return self.get_response(request)
@@ -25,6 +39,24 @@ class APICallLoggingMiddleware:
         # End timer
         duration = time.time() - start_time
         
+        self._log_call(request, response, duration)
+        return response
+    
+    async def __acall__(self, request):
+        # Skip logging for static files and admin
+        if request.path.startswith(('/static/', '/admin/')):
+            return await self.get_response(request)
+        
+        start_time = time.time()
+        response = await self.get_response(request)
+        duration = time.time() - start_time
+        
+        # Resolving request.user may hit the session store, so log from a thread
+        await sync_to_async(self._log_call)(request, response, duration)
+        return response
+    
+    def _log_call(self, request, response, duration):
+        """Write one JSON log line describing the request and response."""
         # Get user information
         user = request.user.username if request.user.is_authenticated else 'anonymous'
         
@@ -55,8 +87,6 @@ class APICallLoggingMiddleware:
         
         # Log as JSON
         logger.info(f"API Call: {json.dumps(log_data)}")
-        
-        return response
     
     def _get_request_body(self, request):
         """Safely extract request body if possible."""
@@ -70,3 +100,42 @@ class APICallLoggingMiddleware:
         except Exception:
             pass
         return {}
+
+
+class ReadOnlyReplicaMiddleware:
+    """Refuse blocklist changes on replication followers (REPLICATION_ROLE = 'follower').
+    
+    Lists on a follower only change through manage.py replicate, so every
+    other write to the API is answered with 403 pointing at the leader.
+    Logging in and managing the follower's own API keys still work.
+    """
+    
+    sync_capable = True
+    async_capable = True
+    
+    SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+    WRITABLE_PATHS = ('/api/token/', '/api/login/', '/api/api-keys/')
+    
+    def __init__(self, get_response):
+        if settings.REPLICATION_ROLE != 'follower':
+            raise MiddlewareNotUsed()
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+    
+    def _refusal(self, request):
+        if (request.method in self.SAFE_METHODS or not request.path.startswith('/api/')
+                or request.path.startswith(self.WRITABLE_PATHS)):
+            return None
+        return JsonResponse({
+            'error': 'This node is a read-only replica; send changes to the leader',
+            'leader': settings.REPLICATION_LEADER_URL,
+        }, status=403)
+    
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self._refusal(request) or self.get_response(request)
+    
+    async def __acall__(self, request):
+        return self._refusal(request) or await self.get_response(request)
@@ -0,0 +1,49 @@
+"""Parsers that hand indicator payloads to views as a stream of lines.
+
+JSON requests carry indicators as one newline-separated string, which DRF
+buffers and decodes whole. Block and unblock also accept a text/plain body
+or a multipart upload; both are read one line at a time as the view
+consumes them, so memory use does not grow with the payload.
+"""
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+
+# Longest line accepted; longer lines are rejected rather than buffered
+MAX_LINE_LENGTH = 8192
+
+
+class IndicatorLines:
+    """Iterator over the non-blank, stripped lines of a binary stream"""
+
+    def __init__(self, stream, encoding='utf-8'):
+        self.stream = stream
+        self.encoding = encoding
+        self.line_number = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.stream is None:
+            raise StopIteration
+        while True:
+            # Room for the line and a \r\n terminator, which does not count
+            line = self.stream.readline(MAX_LINE_LENGTH + 2)
+            if not line:
+                raise StopIteration
+            self.line_number += 1
+            if len(line.rstrip(b'\r\n')) > MAX_LINE_LENGTH:
+                raise ParseError(f"Line {self.line_number} is longer than {MAX_LINE_LENGTH} bytes")
+            indicator = line.decode(self.encoding, errors='replace').strip()
+            if indicator:
+                return indicator
+
+
+class PlainTextLinesParser(BaseParser):
+    """Parse a text/plain body of indicators, one per line, lazily"""
+    media_type = 'text/plain'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get('encoding', 'utf-8')
+        return IndicatorLines(stream, encoding)
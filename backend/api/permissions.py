@@ -16,6 +16,8 @@ class ApiKeyPermission(BasePermission):
     # Constants for permission types
     READ_ONLY = 'read_only'
     READ_WRITE = 'read_write'
+    # Any active key, read-only or not (e.g. for reports that change no list)
+    ANY_KEY = 'any_key'
     
     def has_permission(self, request, view):
         # Check if authenticated with API key
@@ -28,6 +30,8 @@ class ApiKeyPermission(BasePermission):
                     return request.method in SAFE_METHODS
                 elif perm == self.READ_WRITE:
                     return request.method in SAFE_METHODS if request.api_key.read_only else True
+                elif perm == self.ANY_KEY:
+                    return True
                 else:
                     # Use the API key's has_perm method for Django permissions
                     return request.user.api_key_has_perm(perm)
@@ -52,6 +56,8 @@ class IsAuthenticatedOrHasApiKey(BasePermission):
                     return request.method in SAFE_METHODS
                 elif perm == ApiKeyPermission.READ_WRITE:
                     return request.method in SAFE_METHODS if request.api_key.read_only else True
+                elif perm == ApiKeyPermission.ANY_KEY:
+                    return True
                 else:
                     # Use the API key's has_perm method for Django permissions
                     return request.user.api_key_has_perm(perm)
@@ -62,7 +68,7 @@ class IsAuthenticatedOrHasApiKey(BasePermission):
         if has_user_auth and hasattr(view, 'get_permission_required'):
             perm = view.get_permission_required(request.method)
             # Skip permission check for our custom constants
-            if perm in [ApiKeyPermission.READ_ONLY, ApiKeyPermission.READ_WRITE]:
+            if perm in [ApiKeyPermission.READ_ONLY, ApiKeyPermission.READ_WRITE, ApiKeyPermission.ANY_KEY]:
                 return True
             return request.user.has_perm(perm)
         
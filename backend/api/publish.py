@@ -0,0 +1,220 @@
+"""Static copies of the raw feeds for a front web server.
+
+After every change to a list (services._record_change) its new version is
+written to settings.PUBLISH_DIR with the same paths as the /api/raw/ URLs,
+so nginx or any static file server can answer feed downloads without going
+through Django:
+
+    ip-blocklist -> .versions/ip-r<revision>-<version>    symlink, swapped atomically
+    .versions/ip-r<revision>-<version>/
+        index.txt, index.txt.gz              the list, one entry per line
+        <format>/index.txt, index.txt.gz     each export format of the list
+        SHA256SUMS                           `sha256sum -c` checksums of the above
+        VERSION                              the list version
+
+The revision is exports.REVISION, so a release that changes an export format
+publishes every list again instead of keeping the old output.
+
+A version directory is complete before the symlink is pointed at it, and it
+is never modified afterwards, so readers see either the old version or the
+new one. Publishing runs on a background thread and is coalesced: a burst of
+changes publishes the list once more after the publish already running.
+The Django feed views stay in place and serve the published files when they
+are current, so the front server can fall back to them.
+"""
+import gzip
+import hashlib
+import logging
+import os
+import shutil
+import threading
+from itertools import islice
+
+from django.conf import settings
+
+from . import exports, services
+
+logger = logging.getLogger('django')
+
+VERSIONS_DIR = '.versions'
+PLAIN_NAME = 'index.txt'
+CHECKSUMS_NAME = 'SHA256SUMS'
+
+# The previous version is kept for downloads that already resolved its
+# directory; responses streaming older ones keep their open handle
+KEEP_VERSIONS = 2
+
+WRITE_BATCH_LINES = 10000
+
+_lock = threading.Lock()
+_running = set()
+_pending = set()
+
+
+def export_name(export_format):
+    return f"{export_format}/{PLAIN_NAME}"
+
+
+def _link_path(indicator_type):
+    return os.path.join(settings.PUBLISH_DIR, f"{indicator_type}-blocklist")
+
+
+def _version_prefix(indicator_type):
+    return f"{indicator_type}-r{exports.REVISION}-"
+
+
+def _version_dir_name(indicator_type, version):
+    return os.path.join(VERSIONS_DIR, f"{_version_prefix(indicator_type)}{version}")
+
+
+def published_version(indicator_type):
+    """Version the published feed of a list points at, or None (also if it
+    was published with another export revision)"""
+    try:
+        target = os.path.basename(os.readlink(_link_path(indicator_type)))
+    except (FileNotFoundError, OSError):
+        return None
+    prefix = _version_prefix(indicator_type)
+    if not target.startswith(prefix):
+        return None
+    try:
+        return int(target[len(prefix):])
+    except ValueError:
+        return None
+
+
+def current_file(indicator_type, name=PLAIN_NAME):
+    """(path, version) of a published file if it is of the current list version, else None.
+
+    The path goes through the version directory rather than the symlink, so
+    a file opened from it stays the same version while it is read. A stale
+    feed is published again in the background.
+    """
+    if not settings.PUBLISH_ENABLED:
+        return None
+    version = services.get_list_version(indicator_type)
+    if published_version(indicator_type) != version:
+        publish_async(indicator_type)
+        return None
+    path = os.path.join(settings.PUBLISH_DIR, _version_dir_name(indicator_type, version), name)
+    return (path, version) if os.path.exists(path) else None
+
+
+def get_file(indicator_type, name):
+    """(path, version) of a published file of the current list version, publishing it first if needed"""
+    version = publish(indicator_type)
+    return os.path.join(settings.PUBLISH_DIR, _version_dir_name(indicator_type, version), name), version
+
+
+def _write_file(path, lines):
+    """Write lines to path and a gzip copy next to it; returns the SHA-256 of each"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    plain_hash = hashlib.sha256()
+    lines = iter(lines)
+    with open(path, 'wb') as f, open(f"{path}.gz", 'wb') as gz_file:
+        # Fixed mtime and no name, so equal contents give equal .gz files
+        with gzip.GzipFile(filename='', mode='wb', fileobj=gz_file, compresslevel=6, mtime=0) as gz:
+            while True:
+                data = ''.join(islice(lines, WRITE_BATCH_LINES)).encode('utf-8')
+                if not data:
+                    break
+                f.write(data)
+                gz.write(data)
+                plain_hash.update(data)
+    with open(f"{path}.gz", 'rb') as f:
+        gz_hash = hashlib.sha256(f.read())
+    return plain_hash.hexdigest(), gz_hash.hexdigest()
+
+
+def write_version(directory, indicator_type, version, entries):
+    """Write every published file of a list version into directory"""
+    names = [PLAIN_NAME]
+    hashes = list(_write_file(os.path.join(directory, PLAIN_NAME), exports.render_plain(indicator_type, version, entries)))
+    for export_format in exports.formats_for(indicator_type):
+        render = exports.FORMATS[export_format]['render']
+        name = export_name(export_format)
+        names.append(name)
+        hashes.extend(_write_file(os.path.join(directory, name), render(indicator_type, version, entries)))
+
+    with open(os.path.join(directory, CHECKSUMS_NAME), 'w', encoding='utf-8', newline='\n') as f:
+        for name, (plain_hash, gz_hash) in zip(names, zip(hashes[::2], hashes[1::2])):
+            f.write(f"{plain_hash}  {name}\n{gz_hash}  {name}.gz\n")
+    with open(os.path.join(directory, 'VERSION'), 'w') as f:
+        f.write(f"{version}\n")
+
+
+def _prune(indicator_type):
+    """Remove unfinished, older revision and all but the newest KEEP_VERSIONS
+    version directories of a list"""
+    versions_dir = os.path.join(settings.PUBLISH_DIR, VERSIONS_DIR)
+    prefix = _version_prefix(indicator_type)
+    versions = {}
+    for name in os.listdir(versions_dir):
+        if not name.startswith(f"{indicator_type}-"):
+            continue
+        try:
+            if not name.startswith(prefix):
+                raise ValueError(name)
+            versions[int(name[len(prefix):])] = name
+        except ValueError:
+            # Left behind by a publish that did not finish, or by an older revision
+            shutil.rmtree(os.path.join(versions_dir, name), ignore_errors=True)
+    for version in sorted(versions)[:-KEEP_VERSIONS]:
+        shutil.rmtree(os.path.join(versions_dir, versions[version]), ignore_errors=True)
+
+
+def publish(indicator_type):
+    """Publish the current version of a list unless it already is; returns the published version"""
+    os.makedirs(os.path.join(settings.PUBLISH_DIR, VERSIONS_DIR), exist_ok=True)
+    with exports.file_lock(os.path.join(settings.PUBLISH_DIR, f".{indicator_type}.lock")):
+        version = services.get_list_version(indicator_type)
+        if published_version(indicator_type) == version:
+            return version
+        # Entries and version are read together, so the files match their version
+        version, entries = services.read_blocklist_snapshot(indicator_type)
+
+        relative_dir = _version_dir_name(indicator_type, version)
+        version_dir = os.path.join(settings.PUBLISH_DIR, relative_dir)
+        if not os.path.isdir(version_dir):
+            tmp_dir = f"{version_dir}.tmp"
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            os.makedirs(tmp_dir)
+            write_version(tmp_dir, indicator_type, version, entries)
+            os.rename(tmp_dir, version_dir)
+
+        # Relative target, so the directory can be mounted elsewhere (e.g. in
+        # the web server's container); replacing a symlink is atomic
+        link_path = _link_path(indicator_type)
+        tmp_link = f"{link_path}.tmp"
+        if os.path.lexists(tmp_link):
+            os.remove(tmp_link)
+        os.symlink(relative_dir, tmp_link)
+        os.replace(tmp_link, link_path)
+        _prune(indicator_type)
+    return version
+
+
+def publish_async(indicator_type):
+    """Publish a list on a background thread, once more if one is already running"""
+    with _lock:
+        if indicator_type in _running:
+            _pending.add(indicator_type)
+            return
+        _running.add(indicator_type)
+    # Not a daemon thread, so management commands that change a list
+    # (expire_indicators --once, import_indicators) publish it before exiting
+    thread = threading.Thread(target=_run, args=(indicator_type,), name=f"publish-{indicator_type}")
+    thread.start()
+
+
+def _run(indicator_type):
+    while True:
+        try:
+            publish(indicator_type)
+        except Exception:
+            logger.exception(f"Failed to publish the {indicator_type} blocklist")
+        with _lock:
+            if indicator_type not in _pending:
+                _running.discard(indicator_type)
+                return
+            _pending.discard(indicator_type)
@@ -0,0 +1,73 @@
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+
+try:
+    import orjson
+except ImportError:  # Optional dependency; fall back to the stdlib encoder
+    orjson = None
+
+# U+2028/U+2029 are valid JSON but not valid JavaScript; escape them like
+# DRF's JSONRenderer does
+_LINE_SEPARATOR = '\u2028'.encode('utf-8')
+_PARAGRAPH_SEPARATOR = '\u2029'.encode('utf-8')
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer backed by orjson when it is installed.
+
+    Output matches DRF's compact JSON. Indented output (requested by the
+    browsable API) and environments without orjson use the stdlib encoder.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if orjson is None or self.get_indent(accepted_media_type or '', renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        ret = orjson.dumps(data, default=self.encoder_class().default)
+        if _LINE_SEPARATOR in ret or _PARAGRAPH_SEPARATOR in ret:
+            ret = ret.replace(_LINE_SEPARATOR, b'\\u2028').replace(_PARAGRAPH_SEPARATOR, b'\\u2029')
+        return ret
+
+
+def get_json_renderer():
+    """Return an instance of the first JSON renderer configured in REST_FRAMEWORK"""
+    for renderer_class in api_settings.DEFAULT_RENDERER_CLASSES:
+        if renderer_class.format == 'json':
+            return renderer_class()
+    return JSONRenderer()
+
+
+def iter_json_array(items, chunk_size=None):
+    """Yield a JSON array as encoded chunks of items.
+
+    Items are encoded a chunk at a time with the configured JSON renderer, so
+    the first bytes are sent before the whole array has been serialized and
+    only one chunk is held in encoded form at once.
+    """
+    chunk_size = chunk_size or settings.STREAMING_JSON_CHUNK_SIZE
+    renderer = get_json_renderer()
+    yield b'['
+    separator = b''
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            # Encode the chunk as an array and drop its brackets
+            yield separator + renderer.render(chunk)[1:-1]
+            separator = b','
+            chunk = []
+    if chunk:
+        yield separator + renderer.render(chunk)[1:-1]
+    yield b']'
+
+
+class StreamingJSONArrayResponse(StreamingHttpResponse):
+    """Streams a list (or any iterable) to the client as a JSON array"""
+
+    def __init__(self, items, chunk_size=None, **kwargs):
+        kwargs.setdefault('content_type', 'application/json')
+        super().__init__(iter_json_array(items, chunk_size), **kwargs)
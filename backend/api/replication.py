@@ -0,0 +1,205 @@
+"""Leader/follower replication of the blocklists.
+
+A follower (settings.REPLICATION_ROLE = 'follower') is a read-only node that
+serves the raw feeds, exports and lookups from its own copy of the lists.
+`manage.py replicate` keeps that copy in step with the leader at
+settings.REPLICATION_LEADER_URL over plain HTTP:
+
+1. Bootstrap: note the leader's current event ID, download the raw lists,
+   replace the local lists with them, then continue from that event ID.
+2. Follow: long-poll the leader's /api/events/ for the BLOCK/UNBLOCK events
+   after the last applied one, and apply each batch with one atomic rewrite
+   per list (services.apply_replicated_events).
+
+Replaying a BLOCK or UNBLOCK is idempotent, so lists downloaded a little
+after the noted event ID converge once the events since then are applied,
+and a follower that crashes before saving its position simply replays a
+batch again. When the leader no longer knows the follower's event ID (its
+journal was replaced), the follower bootstraps again.
+
+Progress and lag are kept in settings.REPLICATION_STATE_FILE and reported
+by /api/replication/.
+"""
+import json
+import logging
+import os
+import time
+import urllib.error
+import urllib.request
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import events, services
+
+logger = logging.getLogger('django')
+
+FOLLOWER = 'follower'
+LEADER = 'leader'
+
+
+def is_follower():
+    return settings.REPLICATION_ROLE == FOLLOWER
+
+
+class LeaderError(Exception):
+    """The leader could not be reached or returned an unexpected response"""
+
+
+class EventIdGone(LeaderError):
+    """The leader no longer has the event the follower wants to resume after"""
+
+
+class LeaderClient:
+    """Minimal HTTP client for the leader's public feed and event endpoints"""
+
+    def __init__(self, base_url, api_key=None, timeout=60):
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+        self.timeout = timeout
+
+    def get(self, path, params=None, timeout=None):
+        url = f"{self.base_url}{path}"
+        if params:
+            url = f"{url}?{urlencode(params)}"
+        request = urllib.request.Request(url, headers={'User-Agent': 'blocklist-replica/1.0'})
+        if self.api_key:
+            request.add_header('Authorization', f"ApiKey {self.api_key}")
+        try:
+            with urllib.request.urlopen(request, timeout=timeout or self.timeout) as response:
+                return response.read()
+        except urllib.error.HTTPError as e:
+            body = e.read()
+            if e.code == 400 and b'last_event_id' in body:
+                raise EventIdGone(body.decode('utf-8', 'replace'))
+            if e.code == 429:
+                # Rate limited: wait as long as the leader asks
+                time.sleep(float(e.headers.get('Retry-After') or 1))
+            raise LeaderError(f"{url}: HTTP {e.code}")
+        except (urllib.error.URLError, OSError) as e:
+            raise LeaderError(f"{url}: {e}")
+
+    def current_event_id(self):
+        return json.loads(self.get('/api/events/', {'timeout': 0}))['last_event_id']
+
+    def events_after(self, event_id, timeout):
+        # Allow the long-poll its full duration before giving up on the socket
+        return json.loads(self.get('/api/events/', {'after': event_id, 'timeout': timeout}, timeout=timeout + 30))
+
+    def raw_list(self, indicator_type):
+        content = self.get(f"/api/raw/{indicator_type}-blocklist/").decode('utf-8')
+        return [line.strip() for line in content.splitlines() if line.strip()]
+
+
+def read_state():
+    try:
+        with open(settings.REPLICATION_STATE_FILE, 'r') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+
+def write_state(state):
+    tmp_path = f"{settings.REPLICATION_STATE_FILE}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, settings.REPLICATION_STATE_FILE)
+
+
+class Follower:
+    """Pulls the leader's changes into the local lists"""
+
+    def __init__(self, client):
+        services.ensure_files_exist()
+        self.client = client
+        self.state = read_state()
+        if self.state.get('leader') != client.base_url:
+            # New or different leader: the stored position means nothing
+            self.state = {'leader': client.base_url}
+
+    def _save(self, **changes):
+        self.state.update(changes)
+        write_state(self.state)
+
+    def bootstrap(self):
+        """Replace the local lists with the leader's and resume from its current event"""
+        event_id = self.client.current_event_id()
+        lists = {indicator_type: self.client.raw_list(indicator_type) for indicator_type in services.INDICATOR_TYPES}
+        services.replace_blocklists(lists)
+        now = timezone.now().isoformat()
+        self._save(last_event_id=event_id, leader_event_id=event_id, bootstrapped_at=now,
+                   last_contact_at=now, synced_at=now, caught_up=True, error=None)
+        logger.info(f"Replica bootstrapped from {self.client.base_url} at event {event_id}: "
+                    + ', '.join(f"{len(entries)} {t}" for t, entries in lists.items()))
+
+    def sync_once(self, timeout=0):
+        """Apply the next batch of leader events; returns the number applied"""
+        if self.state.get('last_event_id') is None:
+            self.bootstrap()
+        try:
+            response = self.client.events_after(self.state['last_event_id'], timeout)
+        except EventIdGone:
+            logger.warning(f"Leader no longer has event {self.state['last_event_id']}; bootstrapping again")
+            self.bootstrap()
+            return 0
+
+        batch = response['events']
+        changes = {'error': None}
+        if batch:
+            services.apply_replicated_events(batch)
+            changes.update(last_event_id=batch[-1]['id'], last_event_time=batch[-1]['time'],
+                           last_applied_at=timezone.now().isoformat())
+        changes['leader_event_id'] = max(response['last_event_id'], self.state.get('leader_event_id') or 0)
+        # A short batch means the leader had nothing newer when it answered
+        changes['caught_up'] = len(batch) < settings.EVENTS_BUFFER_SIZE
+        changes['last_contact_at'] = timezone.now().isoformat()
+        if changes['caught_up']:
+            changes['synced_at'] = changes['last_contact_at']
+        self._save(**changes)
+        return len(batch)
+
+    def run(self):
+        while True:
+            try:
+                self.sync_once(settings.REPLICATION_POLL_TIMEOUT)
+            except LeaderError as e:
+                logger.error(f"Replication from {self.client.base_url} failed: {e}")
+                self._save(error=str(e))
+                time.sleep(settings.REPLICATION_RETRY_INTERVAL)
+
+
+def status():
+    """Replication role, position and lag of this node"""
+    if not is_follower():
+        return {
+            'role': LEADER,
+            'event_id': events.current_event_id(),
+            'versions': services.get_list_versions(),
+        }
+    state = read_state()
+    lag = None
+    if state.get('synced_at'):
+        now = timezone.now()
+        last_contact = parse_datetime(state['last_contact_at'])
+        if state.get('caught_up') and (now - last_contact).total_seconds() <= settings.REPLICATION_POLL_TIMEOUT + 5:
+            # Caught up and waiting on a long-poll that returns as soon as anything changes
+            lag = 0.0
+        else:
+            lag = (now - parse_datetime(state['synced_at'])).total_seconds()
+    return {
+        'role': FOLLOWER,
+        'leader': settings.REPLICATION_LEADER_URL,
+        'last_event_id': state.get('last_event_id'),
+        'leader_event_id': state.get('leader_event_id'),
+        # 0 while in step with the leader, else seconds since it last was
+        'lag_seconds': lag,
+        'synced_at': state.get('synced_at'),
+        'last_contact_at': state.get('last_contact_at'),
+        'last_applied_at': state.get('last_applied_at'),
+        'last_event_time': state.get('last_event_time'),
+        'bootstrapped_at': state.get('bootstrapped_at'),
+        'error': state.get('error'),
+    }
+
@@ -0,0 +1,18 @@
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from . import replication
+
+class ReplicationStatusView(APIView):
+    """Replication role and lag of this node (no authentication, for monitoring)"""
+    permission_classes = []
+
+    @swagger_auto_schema(
+        operation_description="Replication status. A leader reports its current event ID and list versions; "
+                              "a follower reports the leader event it has applied, the leader's latest known "
+                              "event, and lag_seconds (0 while in step with the leader).",
+        responses={200: "Replication status"}
+    )
+    def get(self, request):
+        return Response(replication.status())
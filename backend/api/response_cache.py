@@ -0,0 +1,70 @@
+"""Versioned cache of pre-serialized JSON list responses.
+
+Keys embed the versions of the lists a response was built from, so a
+mutation through the service layer makes every older entry unreachable
+without having to find and delete it; stale entries simply expire.
+"""
+import hashlib
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+from .renderers import get_json_renderer
+
+
+def get_response_cache():
+    return caches[settings.RESPONSE_CACHE_ALIAS]
+
+
+def make_key(name, versions, query_params):
+    """Build a cache key from the view name, list versions and query parameters"""
+    version_part = ','.join(f"{key}={versions[key]}" for key in sorted(versions))
+    params = '&'.join(
+        f"{key}={value}"
+        for key in sorted(query_params)
+        for value in sorted(query_params.getlist(key))
+    )
+    digest = hashlib.sha1(params.encode('utf-8')).hexdigest()[:16]
+    return f"json:{name}:{version_part}:{digest}"
+
+
+def can_use_cache(request):
+    """Only plain JSON responses are cached; the browsable API is always rendered"""
+    renderer = getattr(request, 'accepted_renderer', None)
+    return renderer is None or renderer.format == 'json'
+
+
+def render_json(data):
+    """Serialize data exactly as the configured JSON renderer would"""
+    return get_json_renderer().render(data)
+
+
+def json_response(body, hit):
+    response = HttpResponse(body, content_type='application/json')
+    response['X-Cache'] = 'HIT' if hit else 'MISS'
+    return response
+
+
+def get_or_build(key, build):
+    """Return a JSON response from the cache, building and storing it on a miss"""
+    cache = get_response_cache()
+    body = cache.get(key)
+    if body is not None:
+        return json_response(body, hit=True)
+    body = render_json(build())
+    cache.set(key, body)
+    return json_response(body, hit=False)
+
+
+async def aget_or_build(key, build):
+    """Async variant of get_or_build; build is a coroutine function"""
+    cache = get_response_cache()
+    body = await cache.aget(key)
+    if body is not None:
+        return json_response(body, hit=True)
+    data = await build()
+    body = await sync_to_async(render_json, thread_sensitive=False)(data)
+    await cache.aset(key, body)
+    return json_response(body, hit=False)
@@ -35,14 +35,38 @@ def api_root(request):
                 'ip_blocklist': '/api/ip-blocklist/',
                 'domain_blocklist': '/api/domain-blocklist/',
                 'url_blocklist': '/api/url-blocklist/',
+                'lookup': '/api/lookup/',
+                'hits': '/api/hits/',
+                'stale_entries': '/api/hits/stale/?indicator_type={ip,domain,url}&days=30',
+                'allowlist': '/api/allowlist/',
+                'allowlist_remove': '/api/allowlist/remove/',
+                'jobs': '/api/jobs/',
             },
             'raw_blocklists': {
                 'ip_blocklist': '/api/raw/ip-blocklist/',
                 'domain_blocklist': '/api/raw/domain-blocklist/',
                 'url_blocklist': '/api/raw/url-blocklist/',
+                'ip_exports': '/api/raw/ip-blocklist/{ipset,nftables,edl}/',
+                'domain_exports': '/api/raw/domain-blocklist/{rpz,squid,edl}/',
+                'url_exports': '/api/raw/url-blocklist/{squid,edl}/',
+                'bloom_filters': '/api/raw/{ip,domain,url}-blocklist/bloom/',
+                'checksums': '/api/raw/{ip,domain,url}-blocklist/SHA256SUMS',
+            },
+            'list_history': {
+                'versions': '/api/snapshots/{ip,domain,url}/',
+                'version': '/api/snapshots/{ip,domain,url}/{version}/',
+                'diff': '/api/snapshots/{ip,domain,url}/diff/?from={version}&to={version}',
+            },
+            'change_notifications': {
+                'long_poll': '/api/events/',
+                'event_stream': '/api/events/stream/',
+                'replication_status': '/api/replication/',
             },
             'logs': {
                 'audit_logs': '/api/logs/',
+                'audit_batch': '/api/logs/batches/{batch_id}/',
+                'revert_batch': '/api/logs/batches/{batch_id}/revert/',
+                'stats': '/api/stats/',
             },
             'api_keys': {
                 'manage_keys': '/api/api-keys/',
@@ -53,7 +77,7 @@ def api_root(request):
             }
         },
         'important_notice': 'This service is intended solely for legitimate cybersecurity purposes. Misuse is strictly prohibited and may result in legal action.',
-        'note': 'All endpoints except raw blocklists require authentication.'
+        'note': 'All endpoints except raw blocklists and change notifications require authentication.'
     })
 
 
@@ -0,0 +1,105 @@
+"""Precomputed OpenAPI schema for /swagger.json, /swagger.yaml and the Swagger/ReDoc UIs.
+
+drf_yasg introspects every view to build the schema, which is wasted work on
+each request because the schema only changes with the code. Instead
+`manage.py openapi_schema` writes it to settings.OPENAPI_SCHEMA_DIR, where it
+is kept under version control, and `manage.py openapi_schema --check` fails
+when the stored files no longer match the views (the Docker build runs it).
+
+Processes read the stored files once and serve them from memory with an
+ETag, so pollers revalidate with If-None-Match and get 304 Not Modified.
+With OPENAPI_SCHEMA_PRECOMPUTED off (the default under DEBUG), each process
+generates the schema on first use instead, so edits show up after a reload.
+"""
+import hashlib
+import os
+import threading
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from drf_yasg.app_settings import swagger_settings
+from drf_yasg.codecs import OpenAPICodecJson, OpenAPICodecYaml
+from drf_yasg.renderers import SwaggerYAMLRenderer, _SpecRenderer
+
+# JSON is pretty-printed so schema changes show up as readable diffs in review
+CODECS = {
+    'json': lambda: OpenAPICodecJson(validators=[], pretty=True),
+    'yaml': lambda: OpenAPICodecYaml(validators=[]),
+}
+
+_documents = {}
+_documents_lock = threading.Lock()
+
+
+def schema_path(schema_format):
+    return os.path.join(settings.OPENAPI_SCHEMA_DIR, f"openapi.{schema_format}")
+
+
+def generate_schema():
+    """Build the public schema from the URL configuration; returns {format: bytes}"""
+    generator = swagger_settings.DEFAULT_GENERATOR_CLASS(swagger_settings.DEFAULT_INFO)
+    swagger = generator.get_schema(request=None, public=True)
+    return {schema_format: codec().encode(swagger) for schema_format, codec in CODECS.items()}
+
+
+def write_schema(documents):
+    os.makedirs(settings.OPENAPI_SCHEMA_DIR, exist_ok=True)
+    for schema_format, content in documents.items():
+        tmp_path = f"{schema_path(schema_format)}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, schema_path(schema_format))
+
+
+def stale_schema_files(documents):
+    """Paths of stored schema files that are missing or differ from freshly generated documents"""
+    stale = []
+    for schema_format, content in documents.items():
+        path = schema_path(schema_format)
+        try:
+            with open(path, 'rb') as f:
+                if f.read() == content:
+                    continue
+        except FileNotFoundError:
+            pass
+        stale.append(path)
+    return stale
+
+
+def get_schema_document(schema_format):
+    """(content, etag) for a schema format, loaded or generated once per process"""
+    with _documents_lock:
+        if schema_format not in _documents:
+            path = schema_path(schema_format)
+            if settings.OPENAPI_SCHEMA_PRECOMPUTED and os.path.exists(path):
+                with open(path, 'rb') as f:
+                    documents = {schema_format: f.read()}
+            else:
+                documents = generate_schema()
+            for fmt, content in documents.items():
+                _documents[fmt] = (content, f'"{hashlib.sha256(content).hexdigest()[:32]}"')
+        return _documents[schema_format]
+
+
+class PrecomputedSchemaMixin:
+    """Serve the spec formats of a drf_yasg schema view from get_schema_document().
+
+    The UI pages still go through drf_yasg, which renders them without
+    generating any paths; their JavaScript then fetches the spec from here.
+    """
+
+    def get(self, request, version='', format=None):
+        renderer = request.accepted_renderer
+        if not isinstance(renderer, _SpecRenderer):
+            return super().get(request, version, format)
+
+        content, etag = get_schema_document('yaml' if isinstance(renderer, SwaggerYAMLRenderer) else 'json')
+        not_modified = get_conditional_response(request._request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+        response = HttpResponse(content, content_type=renderer.media_type)
+        response['ETag'] = etag
+        # Cacheable, but revalidated on every use so a deploy shows up at once
+        response['Cache-Control'] = 'public, no-cache'
+        return response
@@ -1,16 +1,46 @@
+import datetime
+
+from django.utils import timezone
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import APIKey
+from .models import APIKey, Job
+from .exports import formats_for
 
 class IndicatorSerializer(serializers.Serializer):
     indicator_type = serializers.CharField(max_length=10)
     indicators = serializers.CharField()
     reason = serializers.CharField(max_length=255, required=False, allow_blank=True)
+    background = serializers.BooleanField(required=False, default=False)
+    
+    def __init__(self, *args, indicators_streamed=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Indicators sent as a text/plain body or an uploaded file are read by
+        # the view as a stream instead of through this field
+        if indicators_streamed:
+            self.fields['indicators'].required = False
+
+class BlockIndicatorSerializer(IndicatorSerializer):
+    expires_in = serializers.IntegerField(required=False, min_value=1)
+    expires_at = serializers.DateTimeField(required=False)
+    
+    def validate(self, data):
+        # Normalize both forms to expires_at
+        if 'expires_in' in data:
+            if 'expires_at' in data:
+                raise serializers.ValidationError("Give either expires_in or expires_at, not both")
+            data['expires_at'] = timezone.now() + datetime.timedelta(seconds=data.pop('expires_in'))
+        elif 'expires_at' in data and data['expires_at'] <= timezone.now():
+            raise serializers.ValidationError({'expires_at': "Must be in the future"})
+        return data
+
+class AllowlistSerializer(serializers.Serializer):
+    entries = serializers.CharField()
+    reason = serializers.CharField(max_length=255, required=False, allow_blank=True)
 
 class BlocklistItemSerializer(serializers.Serializer):
     indicator = serializers.CharField()
     added_by = serializers.CharField()
-    added_at = serializers.CharField()
+    added_at = serializers.CharField(allow_null=True)
     reason = serializers.CharField()
 
 class LogEntrySerializer(serializers.Serializer):
@@ -24,16 +54,42 @@ class LogEntrySerializer(serializers.Serializer):
 class APIKeySerializer(serializers.ModelSerializer):
     class Meta:
         model = APIKey
-        fields = ['id', 'key', 'name', 'created_at', 'is_active', 'read_only']
+        fields = ['id', 'key', 'name', 'created_at', 'is_active', 'read_only', 'rate_limit', 'rate_limit_burst']
         read_only_fields = ['id', 'key', 'created_at']
 
 class APIKeyCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = APIKey
-        fields = ['name', 'read_only']
+        fields = ['name', 'read_only', 'rate_limit', 'rate_limit_burst']
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'is_staff']
         read_only_fields = ['id', 'is_staff']
+
+class JobSerializer(serializers.ModelSerializer):
+    username = serializers.CharField(source='user.username', read_only=True, default=None)
+    
+    class Meta:
+        model = Job
+        fields = ['id', 'kind', 'params', 'username', 'status', 'total', 'processed', 'result', 'error',
+                  'created_at', 'started_at', 'finished_at']
+        read_only_fields = fields
+
+class JobRequestSerializer(serializers.Serializer):
+    kind = serializers.ChoiceField(choices=['export', 'canonicalize_urls'])
+    indicator_type = serializers.CharField(max_length=10, required=False)
+    format = serializers.CharField(max_length=20, required=False)
+    reason = serializers.CharField(max_length=255, required=False, allow_blank=True)
+    
+    def validate(self, data):
+        if data['kind'] == 'export':
+            indicator_type = data.get('indicator_type')
+            if indicator_type not in ('ip', 'domain', 'url'):
+                raise serializers.ValidationError({'indicator_type': "Must be one of ip, domain, url"})
+            if data.get('format') not in formats_for(indicator_type):
+                raise serializers.ValidationError(
+                    {'format': f"Must be one of {', '.join(formats_for(indicator_type))}"}
+                )
+        return data
@@ -1,27 +1,95 @@
 import os
 import datetime
+import json
+import logging
 import re
+import threading
+import time
+from contextlib import contextmanager
+from itertools import islice
 import pytz
+from asgiref.sync import sync_to_async
 from django.conf import settings
 
-# Ensure data directory exists
-os.makedirs(settings.DATA_DIR, exist_ok=True)
+from . import allowlist, events, expiry, hits, ip_snapshot, list_index, publish, snapshots, stats, url_matching
 
-# Create files if they don't exist
+try:
+    import fcntl
+except ImportError:  # Windows development checkouts have no flock
+    fcntl = None
+
+logger = logging.getLogger('django')
+
+INDICATOR_TYPES = ('ip', 'domain', 'url')
+
+# Pseudo-type for requests mixing indicator types, classified per line
+AUTO_TYPE = 'auto'
+
+# Audit actions and the actions that undo them
+REVERT_ACTIONS = {'BLOCK': 'UNBLOCK', 'UNBLOCK': 'BLOCK', 'ALLOW': 'DISALLOW', 'DISALLOW': 'ALLOW'}
+
+# Audit log user for changes made by the platform itself
+EXPIRY_USERNAME = 'system'
+
+_files_ready = False
+
+# Create the data directory and files on first use rather than at import, so
+# importing this module (e.g. for manage.py commands) touches no files
 def ensure_files_exist():
+    global _files_ready
+    if _files_ready:
+        return
+    os.makedirs(settings.DATA_DIR, exist_ok=True)
     files = [
         settings.IP_BLOCKLIST_FILE,
         settings.DOMAIN_BLOCKLIST_FILE,
         settings.URL_BLOCKLIST_FILE,
-        settings.LOG_FILE
+        settings.LOG_FILE,
+        settings.EVENTS_FILE
     ]
     for file_path in files:
         if not os.path.exists(file_path):
             with open(file_path, 'w') as f:
                 pass  # Create empty file
+    _files_ready = True
+
+# On-disk indexes of the domain and URL lists, mapped on first lookup. The
+# URL index holds host/path keys for prefix matching rather than the entries
+list_indexes = list_index.IndexCache(
+    settings.INDEX_CACHE_DIR, keys={'url-prefix': url_matching.match_key}
+)
+LOOKUP_INDEXES = {'domain': 'domain', 'url': 'url-prefix'}
+
+# Pending expiries, tailed from the journal under mutation_lock() so blocks
+# of listed indicators can tell which of them carry an expiry
+_expiries = expiry.ExpiryScheduler()
 
-# Call this function when the module is imported
-ensure_files_exist()
+_lock_state = threading.local()
+
+@contextmanager
+def mutation_lock():
+    """Serialize blocklist mutations across threads and worker processes"""
+    # Re-entrant within a thread so helpers can be composed freely
+    depth = getattr(_lock_state, 'depth', 0)
+    if depth:
+        _lock_state.depth = depth + 1
+        try:
+            yield
+        finally:
+            _lock_state.depth -= 1
+        return
+    
+    ensure_files_exist()
+    with open(settings.LOCK_FILE, 'a') as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        _lock_state.depth = 1
+        try:
+            yield
+        finally:
+            _lock_state.depth = 0
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
 
 def sanitize_indicator(indicator):
     """Sanitize indicator by removing brackets, braces, and parentheses"""
@@ -98,8 +166,61 @@ def validate_indicator_type(indicator_type, indicator):
     
     return False
 
+# Classifies an indicator with a single match: the alternatives mirror
+# validate_indicator_type's patterns, tried in the same order, and the name
+# of the group that matched is the type. CIDR networks are recognized so
+# they can be reported, but the IP list only holds single addresses
+CLASSIFY_PATTERN = re.compile(
+    r'(?P<url>https?://.*)'
+    r'|(?P<cidr>\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3}/\d{1,2})'
+    r'|(?P<ip>\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})'
+    r'|(?P<domain>[a-zA-Z0-9](?:[a-zA-Z0-9\-\.]+)?\.[a-zA-Z]{2,})',
+    re.DOTALL
+)
+
+def classify_indicator(indicator):
+    """Return the type of a sanitized indicator ('ip', 'cidr', 'domain' or 'url'), or None"""
+    match = CLASSIFY_PATTERN.fullmatch(indicator)
+    return match.lastgroup if match else None
+
+def group_indicators_by_type(indicators, canonicalize=True):
+    """Sanitize and classify mixed indicators in one pass.
+    
+    Returns ({indicator_type: [indicators]}, invalid) with duplicates dropped
+    and, if canonicalize is set, each indicator in its stored form.
+    """
+    groups = {indicator_type: {} for indicator_type in INDICATOR_TYPES}
+    invalid = []
+    for indicator in indicators:
+        sanitized = sanitize_indicator(indicator)
+        if not sanitized:
+            continue
+        indicator_type = classify_indicator(sanitized)
+        if indicator_type in groups:
+            if canonicalize:
+                sanitized = canonicalize_indicator(indicator_type, sanitized)
+            groups[indicator_type][sanitized] = None
+        else:
+            invalid.append({
+                'original': indicator,
+                'sanitized': sanitized,
+                'reason': 'CIDR networks are not supported; list the addresses' if indicator_type == 'cidr'
+                          else 'Not a valid ip, domain or url'
+            })
+    return {indicator_type: list(found) for indicator_type, found in groups.items() if found}, invalid
+
+def canonicalize_indicator(indicator_type, indicator):
+    """Return the form a sanitized indicator is stored in"""
+    if indicator_type == 'url':
+        try:
+            return url_matching.canonicalize_url(indicator)
+        except ValueError:
+            pass  # Left for validate_indicator_type to reject
+    return indicator
+
 def get_blocklist_file_path(indicator_type):
     """Return the appropriate file path based on indicator type"""
+    ensure_files_exist()
     if indicator_type == 'ip':
         return settings.IP_BLOCKLIST_FILE
     elif indicator_type == 'domain':
@@ -118,6 +239,254 @@ def read_blocklist(indicator_type):
     except FileNotFoundError:
         return []
 
+def get_list_versions():
+    """Return the current version of every blocklist.
+    
+    A list's version is the ID of the last change event that touched it, so it
+    changes on every mutation made through this module and is the same in
+    every worker process.
+    """
+    try:
+        with open(settings.VERSIONS_FILE, 'r') as f:
+            versions = json.load(f)
+    except (FileNotFoundError, ValueError):
+        versions = {}
+    return {indicator_type: versions.get(indicator_type, 0) for indicator_type in INDICATOR_TYPES}
+
+def get_list_version(indicator_type):
+    """Return the current version of one blocklist"""
+    get_blocklist_file_path(indicator_type)  # Validate the type
+    return get_list_versions()[indicator_type]
+
+def _record_change(action, indicator_type, indicators):
+    """Publish a committed mutation to subscribers and bump the list version"""
+    event_id = events.append_event(action, indicator_type, indicators)
+    
+    versions = get_list_versions()
+    previous_version = versions[indicator_type]
+    versions[indicator_type] = event_id
+    
+    # Publish the binary snapshot workers use for IP membership checks
+    if indicator_type == 'ip':
+        ip_snapshot.apply_change(
+            settings.IP_SNAPSHOT_FILE, previous_version, event_id,
+            action, indicators, lambda: read_blocklist('ip')
+        )
+    else:
+        # Start rebuilding the lookup index now rather than on the next lookup
+        list_indexes.rebuild_async(LOOKUP_INDEXES[indicator_type], get_blocklist_file_path(indicator_type))
+    
+    # Keep the new version in the content-addressed history. The change is
+    # already committed, so a failure here only leaves a gap in the history
+    try:
+        snapshots.apply_change(
+            indicator_type, previous_version, event_id, action, indicators,
+            lambda: read_blocklist(indicator_type)
+        )
+    except Exception:
+        logger.exception(f"Could not store {indicator_type} list version {event_id} in the snapshot history")
+    
+    tmp_path = f"{settings.VERSIONS_FILE}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(versions, f)
+    os.replace(tmp_path, settings.VERSIONS_FILE)
+    
+    # Write the static feed files for the front web server; the publisher
+    # waits for this mutation to finish before reading the list
+    if settings.PUBLISH_ENABLED:
+        publish.publish_async(indicator_type)
+    return event_id
+
+def _ip_snapshot_is_stale():
+    try:
+        snapshot_mtime = os.stat(settings.IP_SNAPSHOT_FILE).st_mtime_ns
+    except FileNotFoundError:
+        return True
+    try:
+        return os.stat(settings.IP_BLOCKLIST_FILE).st_mtime_ns > snapshot_mtime
+    except FileNotFoundError:
+        return False
+
+def get_ip_snapshot():
+    """Return the memory-mapped IP snapshot, rebuilding it if it is missing or
+    older than the list file (e.g. after an upgrade or a manual edit)"""
+    if _ip_snapshot_is_stale():
+        with mutation_lock():
+            if _ip_snapshot_is_stale():
+                ip_snapshot.build_from_list(
+                    settings.IP_SNAPSHOT_FILE, get_list_version('ip'), read_blocklist('ip')
+                )
+    return ip_snapshot.get_snapshot(settings.IP_SNAPSHOT_FILE)
+
+def get_lookup_index(indicator_type):
+    """Return a container of the entries of a list (for URLs, of their
+    url_matching keys) that supports `in`"""
+    if indicator_type == 'ip':
+        return get_ip_snapshot()
+    blocked = list_indexes.get(LOOKUP_INDEXES[indicator_type], get_blocklist_file_path(indicator_type))
+    if blocked is None:
+        # Index is missing or stale and being rebuilt; read the list directly
+        entries = read_blocklist(indicator_type)
+        if indicator_type == 'url':
+            entries = map(url_matching.match_key, entries)
+        blocked = set(entries)
+    return blocked
+
+def lookup_indicators(indicator_type, indicators):
+    """Check which indicators are on a blocklist.
+    
+    Returns a list of {'indicator', 'blocked'} dicts in input order.
+    """
+    get_blocklist_file_path(indicator_type)  # Validate the type
+    sanitized = [sanitize_indicator(indicator) for indicator in indicators]
+    blocked = get_lookup_index(indicator_type)
+    if indicator_type == 'url':
+        # A URL is blocked by its own entry or one for a parent path
+        return [
+            {'indicator': indicator, 'blocked': bool(value) and url_matching.is_blocked(value, blocked)}
+            for indicator, value in zip(indicators, sanitized)
+        ]
+    return [
+        {'indicator': indicator, 'blocked': bool(value) and value in blocked}
+        for indicator, value in zip(indicators, sanitized)
+    ]
+
+def read_blocklist_snapshot(indicator_type):
+    """Return (version, entries) of a blocklist, read together so they match"""
+    with mutation_lock():
+        return get_list_version(indicator_type), read_blocklist(indicator_type)
+
+def get_snapshot_manifest(indicator_type, version=None):
+    """Manifest of a stored list version (default: the current one), or None.
+    
+    The current version is stored on demand, e.g. for lists last changed
+    before snapshots were introduced.
+    """
+    if version is None or version == get_list_version(indicator_type):
+        manifest = snapshots.read_manifest(indicator_type, get_list_version(indicator_type))
+        if manifest is None:
+            with mutation_lock():
+                version, entries = get_list_version(indicator_type), read_blocklist(indicator_type)
+                manifest = snapshots.read_manifest(indicator_type, version)
+                if manifest is None:
+                    manifest = snapshots.build_snapshot(indicator_type, version, entries)
+        return manifest
+    return snapshots.read_manifest(indicator_type, version)
+
+def record_hits(reports):
+    """Add hit reports from enforcement points to the hit sketches.
+    
+    Each report is a dict with 'indicator' and optionally 'indicator_type'
+    (classified like AUTO_TYPE when missing), 'count' (default 1), 'time' (ISO
+    8601, default now) and 'sources' (addresses that triggered the hits).
+    A URL is counted for every entry that blocks it, and rejected as invalid
+    if none does. Returns {'accepted', 'hits', 'invalid'}.
+    """
+    prepared = []
+    invalid = []
+    current_day = hits.today()
+    url_index = None
+    for report in reports:
+        if not isinstance(report, dict) or not isinstance(report.get('indicator'), str):
+            invalid.append({'hit': report, 'reason': 'indicator is required'})
+            continue
+        indicator = sanitize_indicator(report['indicator'])
+        indicator_type = report.get('indicator_type') or AUTO_TYPE
+        if indicator_type == AUTO_TYPE and indicator:
+            indicator_type = classify_indicator(indicator)
+        if indicator_type not in INDICATOR_TYPES or not validate_indicator_type(indicator_type, indicator):
+            invalid.append({'hit': report, 'reason': 'Not a valid ip, domain or url'})
+            continue
+        
+        count = report.get('count', 1)
+        if not isinstance(count, int) or isinstance(count, bool) or count < 1:
+            invalid.append({'hit': report, 'reason': 'count must be a positive integer'})
+            continue
+        try:
+            day = hits.hit_day(report['time']) if report.get('time') else current_day
+        except (TypeError, ValueError, AttributeError):
+            invalid.append({'hit': report, 'reason': 'time must be an ISO 8601 date and time'})
+            continue
+        indicator = canonicalize_indicator(indicator_type, indicator)
+        if indicator_type == 'url':
+            if url_index is None:
+                url_index = get_lookup_index('url')
+            try:
+                keys = [key for key in url_matching.candidate_keys(indicator) if key in url_index]
+            except ValueError:
+                keys = []
+            if not keys:
+                invalid.append({'hit': report, 'reason': 'No url blocklist entry matches this URL'})
+                continue
+        else:
+            keys = [indicator]
+        sources = report.get('sources') or []
+        if isinstance(sources, str):
+            sources = [sources]
+        prepared.append((indicator_type, keys, count, day, [str(source) for source in sources]))
+    
+    if prepared:
+        hits.get_sketch().add(prepared)
+    return {
+        'accepted': len(prepared),
+        'hits': sum(hit[2] for hit in prepared),
+        'invalid': invalid,
+    }
+
+def hit_key(indicator_type, entry):
+    """Key the hits of a list entry are counted under"""
+    if indicator_type == 'url':
+        return url_matching.match_key(entry) or entry
+    return entry
+
+def hit_estimates(indicator_type, indicators):
+    """Estimated hits and last hit date of list entries, in input order"""
+    sketch = hits.get_sketch()
+    results = []
+    for indicator in indicators:
+        key = hit_key(indicator_type, canonicalize_indicator(indicator_type, sanitize_indicator(indicator)))
+        count, day = sketch.estimate(indicator_type, key)
+        results.append({
+            'indicator': indicator,
+            'hits': count,
+            'last_hit': hits.day_to_date(day).isoformat() if day else None,
+        })
+    return results
+
+def stale_indicators(indicator_type, days):
+    """Entries of a list with no hits reported in the last `days` days.
+    
+    Only entries that were already on the list `days` days ago qualify, so
+    new entries get that long to be hit; none do while the stored list
+    history does not reach back that far.
+    """
+    get_blocklist_file_path(indicator_type)  # Validate the type
+    cutoff = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=days)
+    version_then = next((
+        version for version in snapshots.history(indicator_type)
+        if datetime.datetime.fromisoformat(version['created_at']) <= cutoff
+    ), None)
+    manifest = version_then and snapshots.read_manifest(indicator_type, version_then['version'])
+    if not manifest:
+        return []
+    listed_then = set()
+    for chunk_hash, _, _ in manifest['chunks']:
+        listed_then.update(snapshots.read_chunk(chunk_hash))
+    entries = [entry for entry in read_blocklist(indicator_type) if entry in listed_then]
+    return hits.stale_entries(indicator_type, entries, days,
+                              key=lambda entry: hit_key(indicator_type, entry))
+
+def read_blocklist_content(indicator_type):
+    """Read the raw text of a blocklist file"""
+    with open(get_blocklist_file_path(indicator_type), 'r') as f:
+        return f.read()
+
+async def read_blocklist_content_async(indicator_type):
+    """Read the raw text of a blocklist file on a worker thread"""
+    # thread_sensitive=False so concurrent reads are not serialized behind
+    # Django's single sync thread
+    return await sync_to_async(read_blocklist_content, thread_sensitive=False)(indicator_type)
+
 def read_all_blocklists():
     """Read all blocklists and return a combined list with type information"""
     result = []
@@ -136,25 +505,68 @@ def read_all_blocklists():
     
     return result
 
-def add_to_blocklist(indicator_type, indicators, username, reason):
-    """Add indicators to the appropriate blocklist file"""
+def add_to_blocklist(indicator_type, indicators, username, reason, expires_at=None):
+    """Add indicators to the appropriate blocklist file.
+    
+    expires_at is an optional Unix time after which the expiry sweeper
+    unblocks the indicators. Indicators already on the list get the new
+    expiry too, and without expires_at a pending expiry of theirs is
+    cancelled; both are returned as 'expiry_updated'.
+    """
+    with mutation_lock():
+        return _add_to_blocklist(indicator_type, indicators, username, reason, expires_at)
+
+def add_many_to_blocklist(indicators_by_type, username, reason, expires_at=None, prepared=False):
+    """Add indicators of several types as one mutation.
+    
+    indicators_by_type maps indicator types to indicators; returns a dict of
+    add_to_blocklist results by type. With prepared=True the indicators are
+    known to be sanitized, canonical and valid (e.g. checked by import
+    workers) and are not processed again.
+    """
+    with mutation_lock():
+        return {
+            indicator_type: _add_to_blocklist(indicator_type, indicators, username, reason, expires_at, prepared)
+            for indicator_type, indicators in indicators_by_type.items()
+        }
+
+def add_auto_to_blocklist(indicators, username, reason, expires_at=None):
+    """Classify mixed indicators and add each type to its list in one mutation.
+    
+    Returns {'by_type': {indicator_type: add_to_blocklist result}, 'invalid': [...]}.
+    """
+    groups, invalid = group_indicators_by_type(indicators)
+    return {
+        'by_type': add_many_to_blocklist(groups, username, reason, expires_at, prepared=True),
+        'invalid': invalid
+    }
+
+def _add_to_blocklist(indicator_type, indicators, username, reason, expires_at=None, prepared=False):
     file_path = get_blocklist_file_path(indicator_type)
     
     # Get existing indicators to avoid duplicates
-    existing_indicators = read_blocklist(indicator_type)
+    existing_indicators = set(read_blocklist(indicator_type))
+    allowed = get_allowlist_index()
     
     # Process and validate indicators
     processed_indicators = []
     invalid_indicators = []
     existing_in_request = []
+    allowlisted_indicators = []
     
     for indicator in indicators:
-        # Sanitize the indicator
-        sanitized = sanitize_indicator(indicator)
-        
-        # Skip empty indicators
-        if not sanitized:
-            continue
+        if prepared:
+            sanitized = indicator
+        else:
+            # Sanitize the indicator
+            sanitized = sanitize_indicator(indicator)
+            
+            # Skip empty indicators
+            if not sanitized:
+                continue
+            
+            # Store URLs in canonical form so spelling variants are one entry
+            sanitized = canonicalize_indicator(indicator_type, sanitized)
         
         # Check if indicator already exists in the blocklist
         if sanitized in existing_indicators:
@@ -162,53 +574,123 @@ def add_to_blocklist(indicator_type, indicators, username, reason):
             continue
         
         # Validate indicator type
-        if validate_indicator_type(indicator_type, sanitized):
-            processed_indicators.append(sanitized)
-        else:
+        if not prepared and not validate_indicator_type(indicator_type, sanitized):
             invalid_indicators.append({
                 'original': indicator,
                 'sanitized': sanitized,
                 'reason': f'Not a valid {indicator_type}'
             })
+            continue
+        
+        # Refuse indicators covered by the allowlist
+        allowlist_entry = allowed.match(indicator_type, sanitized)
+        if allowlist_entry is not None:
+            allowlisted_indicators.append({
+                'indicator': sanitized,
+                'allowlist_entry': allowlist_entry
+            })
+            continue
+        
+        processed_indicators.append(sanitized)
     
-    # Filter out indicators that already exist
-    new_indicators = [ind for ind in processed_indicators if ind not in existing_indicators]
+    # Drop duplicates within the request (e.g. two spellings of one URL)
+    new_indicators = list(dict.fromkeys(processed_indicators))
     
     # If there are new indicators to add
+    batch_id = None
     if new_indicators:
         with open(file_path, 'a') as f:
             for indicator in new_indicators:
                 f.write(f"{indicator}\n")
         
         # Log the action
-        log_action(username, 'BLOCK', indicator_type, new_indicators, reason)
+        batch_id = log_action(username, 'BLOCK', indicator_type, new_indicators, reason)
+        
+        if expires_at is not None:
+            expiry.schedule(indicator_type, new_indicators, expires_at)
+        
+        # Notify subscribers and invalidate cached responses
+        _record_change('BLOCK', indicator_type, new_indicators)
+    
+    # Blocking a listed indicator again replaces its expiry, so a permanent
+    # block is not expired by an earlier temporary one
+    expiry_updated = []
+    existing = list(dict.fromkeys(existing_in_request))
+    if existing and expires_at is not None:
+        expiry.schedule(indicator_type, existing, expires_at)
+        expiry_updated = existing
+    elif existing and os.path.exists(settings.EXPIRY_FILE):
+        _expiries.refresh()
+        expiry_updated = [
+            indicator for indicator in existing if _expiries.expires_at(indicator_type, indicator) is not None
+        ]
+        if expiry_updated:
+            expiry.cancel(indicator_type, expiry_updated)
     
     return {
         'added': new_indicators,
         'invalid': invalid_indicators,
-        'existing': existing_in_request
+        'existing': existing_in_request,
+        'allowlisted': allowlisted_indicators,
+        'expiry_updated': expiry_updated,
+        'batch_id': batch_id
     }
 
 def remove_from_blocklist(indicator_type, indicators, username, reason):
     """Remove indicators from the appropriate blocklist file"""
+    with mutation_lock():
+        return _remove_from_blocklist(indicator_type, indicators, username, reason)
+
+def remove_auto_from_blocklist(indicators, username, reason):
+    """Classify mixed indicators and remove each type from its list in one mutation.
+    
+    Returns {'by_type': {indicator_type: remove_from_blocklist result}, 'invalid': [...]}.
+    """
+    # Not canonicalized: entries stored before canonicalization are matched as given
+    groups, invalid = group_indicators_by_type(indicators, canonicalize=False)
+    with mutation_lock():
+        by_type = {
+            indicator_type: _remove_from_blocklist(indicator_type, found, username, reason)
+            for indicator_type, found in groups.items()
+        }
+    return {
+        'by_type': by_type,
+        'invalid': invalid
+    }
+
+def _remove_from_blocklist(indicator_type, indicators, username, reason):
     file_path = get_blocklist_file_path(indicator_type)
     
     # Get existing indicators
     existing_indicators = read_blocklist(indicator_type)
     
+    existing_set = set(existing_indicators)
+    
     # Process indicators
     processed_indicators = [sanitize_indicator(ind) for ind in indicators if sanitize_indicator(ind)]
     
-    # Filter indicators that exist and can be removed
-    removable_indicators = [ind for ind in processed_indicators if ind in existing_indicators]
-    
-    # Identify indicators that don't exist in the blocklist
-    non_existent = [ind for ind in processed_indicators if ind not in existing_indicators]
+    # Filter indicators that exist and can be removed; URLs added before they
+    # were canonicalized may be stored as given rather than in canonical form
+    removable = {}  # Ordered set of entries to remove
+    non_existent = []
+    for ind in processed_indicators:
+        forms = [
+            form for form in dict.fromkeys((ind, canonicalize_indicator(indicator_type, ind)))
+            if form in existing_set
+        ]
+        if forms:
+            removable.update(dict.fromkeys(forms))
+        else:
+            # Identify indicators that don't exist in the blocklist
+            non_existent.append(ind)
+    removable_indicators = list(removable)
     
     # If there are indicators to remove
+    batch_id = None
     if removable_indicators:
         # Create a new list without the indicators to remove
-        updated_indicators = [ind for ind in existing_indicators if ind not in removable_indicators]
+        removable_set = set(removable_indicators)
+        updated_indicators = [ind for ind in existing_indicators if ind not in removable_set]
         
         # Write the updated list back to the file
         with open(file_path, 'w') as f:
@@ -216,53 +698,457 @@ def remove_from_blocklist(indicator_type, indicators, username, reason):
                 f.write(f"{indicator}\n")
         
         # Log the action
-        log_action(username, 'UNBLOCK', indicator_type, removable_indicators, reason)
+        batch_id = log_action(username, 'UNBLOCK', indicator_type, removable_indicators, reason)
+        
+        # Cancel pending expiry so a later permanent block is not expired
+        if os.path.exists(settings.EXPIRY_FILE):
+            expiry.cancel(indicator_type, removable_indicators)
+        
+        # Notify subscribers and invalidate cached responses
+        _record_change('UNBLOCK', indicator_type, removable_indicators)
     
     return {
         'removed': removable_indicators,
-        'non_existent': non_existent
+        'non_existent': non_existent,
+        'batch_id': batch_id
+    }
+
+def _replace_blocklist(indicator_type, entries):
+    """Atomically replace a list's contents, publishing the difference as changes"""
+    current = read_blocklist(indicator_type)
+    current_set, new_set = set(current), set(entries)
+    removed = [indicator for indicator in current if indicator not in new_set]
+    added = [indicator for indicator in entries if indicator not in current_set]
+    if not removed and not added:
+        return
+    
+    file_path = get_blocklist_file_path(indicator_type)
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.writelines(f"{indicator}\n" for indicator in entries)
+    os.replace(tmp_path, file_path)
+    
+    if removed:
+        _record_change('UNBLOCK', indicator_type, removed)
+    if added:
+        _record_change('BLOCK', indicator_type, added)
+
+def replace_blocklists(lists):
+    """Replace whole lists with a replication leader's ({type: entries})"""
+    with mutation_lock():
+        for indicator_type, entries in lists.items():
+            _replace_blocklist(indicator_type, list(dict.fromkeys(entries)))
+
+def apply_replicated_events(change_events):
+    """Apply a replication leader's BLOCK/UNBLOCK events in order.
+    
+    Each list is rewritten once for the whole batch. Changes made on the
+    leader were audited there, so nothing is written to the local audit log.
+    """
+    with mutation_lock():
+        for indicator_type in INDICATOR_TYPES:
+            type_events = [event for event in change_events if event['indicator_type'] == indicator_type]
+            if not type_events:
+                continue
+            # dict keeps the list order while making replays idempotent
+            entries = dict.fromkeys(read_blocklist(indicator_type))
+            for event in type_events:
+                if event['action'] == 'BLOCK':
+                    entries.update(dict.fromkeys(event['indicators']))
+                else:
+                    for indicator in event['indicators']:
+                        entries.pop(indicator, None)
+            _replace_blocklist(indicator_type, list(entries))
+
+def canonicalize_url_blocklist(username, reason, dry_run=False):
+    """Rewrite the URL blocklist in canonical form, merging spelling variants.
+    
+    Entries stored before URLs were canonicalized are replaced by their
+    canonical form; the change is logged and published as an UNBLOCK of the
+    old spellings followed by a BLOCK of the new ones.
+    """
+    with mutation_lock():
+        entries = list(dict.fromkeys(read_blocklist('url')))
+        canonical = list(dict.fromkeys(canonicalize_indicator('url', entry) for entry in entries))
+        entry_set, canonical_set = set(entries), set(canonical)
+        removed = [entry for entry in entries if entry not in canonical_set]
+        added = [entry for entry in canonical if entry not in entry_set]
+        
+        if removed and not dry_run:
+            with open(get_blocklist_file_path('url'), 'w') as f:
+                for indicator in canonical:
+                    f.write(f"{indicator}\n")
+            log_action(username, 'UNBLOCK', 'url', removed, reason)
+            _record_change('UNBLOCK', 'url', removed)
+            if added:
+                log_action(username, 'BLOCK', 'url', added, reason)
+                _record_change('BLOCK', 'url', added)
+    
+    return {
+        'removed': removed,
+        'added': added
+    }
+
+def expire_indicators(scheduler, now=None):
+    """Unblock every indicator whose expiry time has passed.
+    
+    Due indicators are removed with one rewrite per list and logged as
+    UNBLOCK with reason "expired". Returns {indicator_type: [removed]}.
+    """
+    now = time.time() if now is None else now
+    expired = {}
+    with mutation_lock():
+        scheduler.refresh()
+        for indicator_type, indicators in scheduler.pop_due(now).items():
+            result = _remove_from_blocklist(indicator_type, indicators, EXPIRY_USERNAME, 'expired')
+            if result['removed']:
+                expired[indicator_type] = result['removed']
+        scheduler.refresh()  # Skip past our own cancel records
+        scheduler.compact()
+    return expired
+
+_allowlist_cache = {'key': None, 'index': None}
+
+def read_allowlist():
+    """Read the entries of the allowlist file"""
+    try:
+        with open(settings.ALLOWLIST_FILE, 'r') as f:
+            return [line.strip() for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+
+def get_allowlist_index():
+    """Return the index of the allowlist, rebuilt in each process when the file changes"""
+    try:
+        stat = os.stat(settings.ALLOWLIST_FILE)
+        key = (stat.st_size, stat.st_mtime_ns)
+    except FileNotFoundError:
+        key = None
+    if _allowlist_cache['index'] is None or _allowlist_cache['key'] != key:
+        _allowlist_cache['index'] = allowlist.AllowlistIndex(read_allowlist())
+        _allowlist_cache['key'] = key
+    return _allowlist_cache['index']
+
+def _normalize_allowlist_entry(entry):
+    """Return the stored form of an allowlist entry, or None if it is invalid"""
+    parsed = allowlist.parse_entry(entry)
+    if parsed is None:
+        return None
+    kind, value = parsed
+    if kind == 'network' and '/' not in entry:
+        return str(value.network_address)  # A single address
+    return str(value)
+
+def add_to_allowlist(entries, username, reason):
+    """Add IPs, CIDR networks or domains to the allowlist.
+    
+    Blocked indicators the new entries cover are reported as conflicts; they
+    stay blocked until someone unblocks them.
+    """
+    with mutation_lock():
+        existing_entries = set(read_allowlist())
+        
+        added = []
+        invalid = []
+        existing = []
+        for entry in entries:
+            if not entry.strip():
+                continue
+            normalized = _normalize_allowlist_entry(entry)
+            if normalized is None:
+                invalid.append({
+                    'original': entry,
+                    'reason': 'Not a valid IP address, CIDR network or domain'
+                })
+            elif normalized in existing_entries:
+                existing.append(normalized)
+            elif normalized not in added:
+                added.append(normalized)
+        
+        conflicts = []
+        batch_id = None
+        if added:
+            with open(settings.ALLOWLIST_FILE, 'a') as f:
+                for entry in added:
+                    f.write(f"{entry}\n")
+            batch_id = log_action(username, 'ALLOW', 'allowlist', added, reason)
+            
+            new_entries = allowlist.AllowlistIndex(added)
+            for indicator_type in INDICATOR_TYPES:
+                for indicator in read_blocklist(indicator_type):
+                    allowlist_entry = new_entries.match(indicator_type, indicator)
+                    if allowlist_entry is not None:
+                        conflicts.append({
+                            'indicator_type': indicator_type,
+                            'indicator': indicator,
+                            'allowlist_entry': allowlist_entry
+                        })
+    
+    return {
+        'added': added,
+        'invalid': invalid,
+        'existing': existing,
+        'conflicts': conflicts,
+        'batch_id': batch_id
+    }
+
+def remove_from_allowlist(entries, username, reason):
+    """Remove entries from the allowlist"""
+    with mutation_lock():
+        current_entries = read_allowlist()
+        current_set = set(current_entries)
+        
+        removed = []
+        non_existent = []
+        for entry in entries:
+            if not entry.strip():
+                continue
+            normalized = _normalize_allowlist_entry(entry) or entry.strip()
+            if normalized in current_set:
+                if normalized not in removed:
+                    removed.append(normalized)
+            else:
+                non_existent.append(entry.strip())
+        
+        batch_id = None
+        if removed:
+            removed_set = set(removed)
+            tmp_path = f"{settings.ALLOWLIST_FILE}.tmp"
+            with open(tmp_path, 'w') as f:
+                for entry in current_entries:
+                    if entry not in removed_set:
+                        f.write(f"{entry}\n")
+            os.replace(tmp_path, settings.ALLOWLIST_FILE)
+            batch_id = log_action(username, 'DISALLOW', 'allowlist', removed, reason)
+    
+    return {
+        'removed': removed,
+        'non_existent': non_existent,
+        'batch_id': batch_id
     }
 
 def log_action(username, action, indicator_type, indicators, reason):
-    """Log an action to the log file"""
+    """Append one audit record for a batch of indicators and return its batch ID.
+    
+    The shared fields are stored once with the indicators as a list, as a
+    JSON line. The batch ID is the record's byte offset in the log file, so
+    read_log_batch() can seek straight to it. Callers hold mutation_lock().
+    """
     # Get current time in GMT+3
     tz = pytz.timezone('Europe/Istanbul')  # Istanbul is GMT+3
     timestamp = datetime.datetime.now(tz).strftime("%Y-%m-%d %H:%M:%S %z")
     
-    with open(settings.LOG_FILE, 'a') as f:
-        for indicator in indicators:
-            log_entry = f"{timestamp} | {username} | {action} | {indicator_type} | {indicator} | {reason}\n"
-            f.write(log_entry)
+    with open(settings.LOG_FILE, 'ab') as f:
+        batch_id = f.seek(0, os.SEEK_END)
+        record = {
+            'batch_id': batch_id,
+            'timestamp': timestamp,
+            'username': username,
+            'action': action,
+            'indicator_type': indicator_type,
+            'reason': reason,
+            'indicators': list(indicators)
+        }
+        f.write(json.dumps(record, separators=(',', ':')).encode() + b'\n')
+    
+    try:
+        update_stats()
+    except Exception:
+        # The change is made and logged; the statistics catch up on the next update
+        logger.exception("Failed to update statistics")
+    return batch_id
 
-def read_logs(limit=None):
-    """Read the log file and return entries"""
+def update_stats():
+    """Fold the audit records logged since the statistics were last updated into them.
+    
+    Returns the updated statistics. Callers hold mutation_lock(), so no
+    record is half written and only one process updates the file at a time.
+    """
+    data = stats.load()
     try:
-        with open(settings.LOG_FILE, 'r') as f:
-            logs = [line.strip() for line in f if line.strip()]
-            
-        # Parse log entries into structured format
-        parsed_logs = []
-        for log in logs:
-            parts = log.split(' | ')
-            if len(parts) >= 6:
-                parsed_logs.append({
-                    'timestamp': parts[0],
-                    'username': parts[1],
-                    'action': parts[2],
-                    'indicator_type': parts[3],  
-                    'indicator': parts[4],
-                    'reason': parts[5]
-                })
-        
-        # Sort logs by timestamp in descending order (newest first)
-        parsed_logs.sort(key=lambda x: x['timestamp'], reverse=True)
-        
-        # Return limited number of logs if specified
-        if limit and isinstance(limit, int):
-            return parsed_logs[:limit]
-        return parsed_logs
+        size = os.path.getsize(settings.LOG_FILE)
     except FileNotFoundError:
-        return []
+        size = 0
+    if data['log_offset'] > size:
+        # The log was replaced or truncated: aggregate it again
+        data = stats.empty()
+    if data['log_offset'] == size:
+        return data
+    
+    with open(settings.LOG_FILE, 'rb') as f:
+        offset = f.seek(data['log_offset'])
+        for line in f:
+            offset += len(line)
+            fields, indicators = _parse_log_line(line.decode('utf-8', errors='replace').strip())
+            if fields is not None:
+                stats.add_record(data, fields, len(indicators), offset)
+    data['log_offset'] = offset
+    stats.trim(data)
+    stats.save(data)
+    return data
+
+def get_stats(days=30, users=10):
+    """Dashboard statistics: list totals, recent growth, daily counts and user activity"""
+    data = stats.load()
+    try:
+        size = os.path.getsize(settings.LOG_FILE)
+    except FileNotFoundError:
+        size = 0
+    if data['log_offset'] != size:
+        # Records logged while statistics were not kept (or by an older version)
+        with mutation_lock():
+            data = update_stats()
+    
+    totals = {}
+    for indicator_type in INDICATOR_TYPES:
+        manifest = get_snapshot_manifest(indicator_type)
+        totals[indicator_type] = manifest['count'] if manifest else 0
+    totals['all'] = sum(totals.values())
+    totals['allowlist'] = len(read_allowlist())
+    
+    today = datetime.datetime.now(pytz.timezone('Europe/Istanbul')).date()
+    return stats.summarize(data, totals, today, days=days, users=users)
+
+def _parse_log_line(line):
+    """Return (shared fields, indicators) of a log line, or (None, [])
+    
+    Lines are batch records, or entries for a single indicator written as
+    "timestamp | username | action | indicator_type | indicator | reason"
+    before batches were introduced.
+    """
+    if line.startswith('{'):
+        try:
+            record = json.loads(line)
+        except ValueError:
+            return None, []
+        return record, record.pop('indicators', [])
+    parts = line.split(' | ')
+    if len(parts) == 5 and parts[4].endswith(' |'):
+        # Empty reason, with the trailing space stripped along with the newline
+        parts[4:] = [parts[4][:-2], '']
+    if len(parts) >= 6:
+        return {
+            'timestamp': parts[0],
+            'username': parts[1],
+            'action': parts[2],
+            'indicator_type': parts[3],
+            'reason': parts[5]
+        }, [parts[4]]
+    return None, []
+
+def _read_lines_reversed(path, block_size=1 << 16):
+    """Yield the non-empty lines of a file from last to first"""
+    with open(path, 'rb') as f:
+        position = f.seek(0, os.SEEK_END)
+        remainder = b''
+        while position > 0:
+            read_size = min(block_size, position)
+            position -= read_size
+            f.seek(position)
+            lines = (f.read(read_size) + remainder).split(b'\n')
+            # The first piece may be the end of a line that starts in an earlier block
+            remainder = lines.pop(0)
+            for line in reversed(lines):
+                if line.strip():
+                    yield line.decode('utf-8', errors='replace').strip()
+        if remainder.strip():
+            yield remainder.decode('utf-8', errors='replace').strip()
+
+def iter_log_batches():
+    """Yield (shared fields, indicators) for every audit record, oldest first"""
+    try:
+        with open(settings.LOG_FILE, 'r', encoding='utf-8', errors='replace') as f:
+            for line in f:
+                fields, indicators = _parse_log_line(line.strip())
+                if fields is not None:
+                    yield fields, indicators
+    except FileNotFoundError:
+        return
+
+def iter_logs():
+    """Yield audit log entries, one per indicator, newest first.
+    
+    The file is read backwards and batch records are expanded as they are
+    reached, so reading the latest entries does not parse the whole log.
+    """
+    try:
+        for line in _read_lines_reversed(settings.LOG_FILE):
+            fields, indicators = _parse_log_line(line)
+            if fields is None:
+                continue
+            for indicator in indicators:
+                entry = {
+                    'timestamp': fields['timestamp'],
+                    'username': fields['username'],
+                    'action': fields['action'],
+                    'indicator_type': fields['indicator_type'],
+                    'indicator': indicator,
+                    'reason': fields['reason']
+                }
+                if 'batch_id' in fields:
+                    entry['batch_id'] = fields['batch_id']
+                yield entry
+    except FileNotFoundError:
+        return
+
+def read_logs(limit=None):
+    """Read the log file and return entries, newest first"""
+    entries = iter_logs()
+    
+    # Return limited number of logs if specified
+    if limit and isinstance(limit, int):
+        return list(islice(entries, limit))
+    return list(entries)
+
+def read_log_batch(batch_id):
+    """Return the audit record with the given batch ID, or None"""
+    try:
+        with open(settings.LOG_FILE, 'rb') as f:
+            f.seek(batch_id)
+            line = f.readline()
+    except (FileNotFoundError, ValueError, OSError):
+        return None
+    if not line.startswith(b'{'):
+        return None
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return None
+    # Any other offset lands mid-record or on a record with another ID
+    return record if record.get('batch_id') == batch_id else None
+
+def revert_batch(batch_id, username, reason=''):
+    """Undo an audited batch with one reverse mutation.
+    
+    A BLOCK batch is unblocked, an UNBLOCK batch blocked again (subject to
+    the allowlist), and allowlist changes are reversed likewise. Returns
+    {'batch', 'action', 'result'}, or None if there is no such batch.
+    """
+    reason = f"Revert of batch {batch_id}" + (f": {reason}" if reason else '')
+    with mutation_lock():
+        record = read_log_batch(batch_id)
+        if record is None:
+            return None
+        action = record['action']
+        indicator_type = record['indicator_type']
+        indicators = record.pop('indicators')
+        if action == 'BLOCK':
+            result = _remove_from_blocklist(indicator_type, indicators, username, reason)
+        elif action == 'UNBLOCK':
+            # Re-added exactly as they were stored
+            result = _add_to_blocklist(indicator_type, indicators, username, reason, prepared=True)
+        elif action == 'ALLOW':
+            result = remove_from_allowlist(indicators, username, reason)
+        elif action == 'DISALLOW':
+            result = add_to_allowlist(indicators, username, reason)
+        else:
+            raise ValueError(f"Cannot revert {action} batches")
+    record['count'] = len(indicators)
+    return {
+        'batch': record,
+        'action': REVERT_ACTIONS[action],
+        'result': result
+    }
 
 def get_logs(limit=None):
     """Get logs for the API - wrapper around read_logs with error handling"""
@@ -0,0 +1,135 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from drf_yasg import openapi
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from . import services, snapshots
+from .async_views import AsyncAPIView
+from .permissions import IsAuthenticatedOrHasApiKey
+
+def validate_type(indicator_type):
+    if indicator_type not in services.INDICATOR_TYPES:
+        raise Http404(f"Unknown indicator type: {indicator_type}")
+
+async def _aiter_snapshot(manifest):
+    # Django buffers synchronous iterators completely under ASGI
+    chunks = snapshots.iter_snapshot(manifest)
+    while True:
+        chunk = await asyncio.to_thread(next, chunks, None)
+        if chunk is None:
+            break
+        yield chunk
+
+limit_param = openapi.Parameter(
+    'limit', openapi.IN_QUERY, description="Number of versions to return (default 100)", type=openapi.TYPE_INTEGER
+)
+from_param = openapi.Parameter(
+    'from', openapi.IN_QUERY, description="Older list version", type=openapi.TYPE_INTEGER, required=True
+)
+to_param = openapi.Parameter(
+    'to', openapi.IN_QUERY, description="Newer list version (default: the current version)",
+    type=openapi.TYPE_INTEGER
+)
+
+class SnapshotHistoryView(APIView):
+    permission_classes = [IsAuthenticatedOrHasApiKey]
+
+    def get_permission_required(self, method):
+        return 'api.view_blocklist'
+
+    @swagger_auto_schema(
+        operation_description="List the stored versions of a blocklist, newest first. Each version has "
+                              "an entry count and an id that is the same for versions with equal contents.",
+        manual_parameters=[limit_param],
+        responses={200: "Stored versions", 400: "Bad Request", 404: "Unknown indicator type"}
+    )
+    def get(self, request, indicator_type):
+        validate_type(indicator_type)
+        try:
+            limit = int(request.query_params.get('limit', 100))
+        except ValueError:
+            return Response({'error': 'limit must be an integer'}, status=status.HTTP_400_BAD_REQUEST)
+
+        current = services.get_snapshot_manifest(indicator_type)
+        return Response({
+            'indicator_type': indicator_type,
+            'current_version': current['version'],
+            'versions': snapshots.history(indicator_type, max(1, limit)),
+        })
+
+class SnapshotView(AsyncAPIView):
+    permission_classes = [IsAuthenticatedOrHasApiKey]
+    throttle_scope = 'lists'
+
+    def get_permission_required(self, method):
+        return 'api.view_blocklist'
+
+    @swagger_auto_schema(
+        operation_description="Get a stored version of a blocklist as sorted text, one entry per line. "
+                              "Versions never change, so responses can be cached indefinitely.",
+        responses={200: "Raw text file with one entry per line", 404: "Version not stored"}
+    )
+    async def get(self, request, indicator_type, version, format=None):
+        validate_type(indicator_type)
+        manifest = await sync_to_async(services.get_snapshot_manifest, thread_sensitive=False)(
+            indicator_type, version
+        )
+        if manifest is None:
+            return Response({'error': f'Version {version} of the {indicator_type} blocklist is not stored'},
+                            status=status.HTTP_404_NOT_FOUND)
+
+        etag = f'"{manifest["id"]}"'
+        response = get_conditional_response(request._request, etag=etag)
+        if response is None:
+            chunks = (_aiter_snapshot(manifest) if isinstance(request._request, ASGIRequest)
+                      else snapshots.iter_snapshot(manifest))
+            response = StreamingHttpResponse(chunks, content_type='text/plain')
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, max-age=31536000, immutable'
+        response['X-Blocklist-Version'] = manifest['version']
+        return response
+
+class SnapshotDiffView(APIView):
+    permission_classes = [IsAuthenticatedOrHasApiKey]
+
+    def get_permission_required(self, method):
+        return 'api.view_blocklist'
+
+    @swagger_auto_schema(
+        operation_description="Entries added and removed between two stored versions of a blocklist",
+        manual_parameters=[from_param, to_param],
+        responses={200: "Added and removed entries", 400: "Bad Request", 404: "Version not stored"}
+    )
+    def get(self, request, indicator_type):
+        validate_type(indicator_type)
+        try:
+            from_version = int(request.query_params['from'])
+            to_version = int(request.query_params['to']) if 'to' in request.query_params else None
+        except (KeyError, ValueError):
+            return Response({'error': 'from (and optionally to) must be list versions'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        old = services.get_snapshot_manifest(indicator_type, from_version)
+        new = services.get_snapshot_manifest(indicator_type, to_version)
+        for version, manifest in ((from_version, old), (to_version, new)):
+            if manifest is None:
+                return Response({'error': f'Version {version} of the {indicator_type} blocklist is not stored'},
+                                status=status.HTTP_404_NOT_FOUND)
+
+        result = snapshots.diff(old, new)
+        return Response({
+            'indicator_type': indicator_type,
+            'from': old['version'],
+            'to': new['version'],
+            'added_count': len(result['added']),
+            'removed_count': len(result['removed']),
+            'added': result['added'],
+            'removed': result['removed'],
+        })
@@ -0,0 +1,223 @@
+"""Content-addressed history of every blocklist version.
+
+Each committed mutation (services._record_change) stores a snapshot of the
+list's new version: its entries in sorted order, split into chunks that are
+stored by the SHA-256 of their content. A chunk ends after an entry whose
+CRC-32 has its low bits clear, so boundaries depend only on the entries
+around them. Adding or removing an indicator changes the chunk it falls in
+and leaves every other chunk, and its hash, unchanged: a new version costs
+its changed chunks plus a manifest, not another copy of the list. Updates
+only read and rewrite the chunks the change touches.
+
+Diffs skip the chunks two versions share (the same hash means the same
+entries on both sides) and merge the remaining sorted entries in one pass.
+
+Layout under settings.SNAPSHOT_DIR:
+
+    chunks/<ab>/<sha256>         zlib-compressed entries, one per line
+    <type>/<version>.json.gz     manifest: [hash, entry count, first entry] per chunk
+    <type>/history.jsonl         one line per stored version, oldest first
+"""
+import bisect
+import collections
+import gzip
+import hashlib
+import json
+import logging
+import os
+import zlib
+
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger('django')
+
+
+def _is_boundary(entry):
+    return zlib.crc32(entry.encode('utf-8')) % settings.SNAPSHOT_CHUNK_ENTRIES == 0
+
+
+def split_chunks(entries):
+    """Split sorted entries into runs ending at content-defined boundaries"""
+    max_entries = settings.SNAPSHOT_CHUNK_ENTRIES * 4
+    chunk = []
+    for entry in entries:
+        chunk.append(entry)
+        if _is_boundary(entry) or len(chunk) >= max_entries:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _chunk_path(chunk_hash):
+    return os.path.join(settings.SNAPSHOT_DIR, 'chunks', chunk_hash[:2], chunk_hash)
+
+
+def store_chunk(entries):
+    """Store a run of entries unless an identical chunk exists; returns its manifest row"""
+    data = ''.join(f"{entry}\n" for entry in entries).encode('utf-8')
+    chunk_hash = hashlib.sha256(data).hexdigest()
+    path = _chunk_path(chunk_hash)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(zlib.compress(data))
+        os.replace(tmp_path, path)
+    return [chunk_hash, len(entries), entries[0]]
+
+
+def read_chunk_bytes(chunk_hash):
+    with open(_chunk_path(chunk_hash), 'rb') as f:
+        return zlib.decompress(f.read())
+
+
+def read_chunk(chunk_hash):
+    return read_chunk_bytes(chunk_hash).decode('utf-8').splitlines()
+
+
+def _type_dir(indicator_type):
+    return os.path.join(settings.SNAPSHOT_DIR, indicator_type)
+
+
+def manifest_path(indicator_type, version):
+    return os.path.join(_type_dir(indicator_type), f"{version}.json.gz")
+
+
+def read_manifest(indicator_type, version):
+    """Return a stored version's manifest, or None"""
+    try:
+        with gzip.open(manifest_path(indicator_type, version), 'rt', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write_manifest(indicator_type, version, chunks):
+    manifest = {
+        'indicator_type': indicator_type,
+        'version': version,
+        'created_at': timezone.now().isoformat(),
+        'count': sum(count for _, count, _ in chunks),
+        # Content address of the whole version: equal lists share an ID
+        'id': hashlib.sha256('\n'.join(chunk_hash for chunk_hash, _, _ in chunks).encode()).hexdigest(),
+        'chunks': chunks,
+    }
+    os.makedirs(_type_dir(indicator_type), exist_ok=True)
+    path = manifest_path(indicator_type, version)
+    tmp_path = f"{path}.tmp"
+    with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+        json.dump(manifest, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+
+    summary = {key: manifest[key] for key in ('version', 'created_at', 'count', 'id')}
+    with open(os.path.join(_type_dir(indicator_type), 'history.jsonl'), 'a') as f:
+        f.write(json.dumps(summary) + '\n')
+    return manifest
+
+
+def build_snapshot(indicator_type, version, entries):
+    """Store a version from the list's full contents"""
+    chunks = [store_chunk(chunk) for chunk in split_chunks(sorted(set(entries)))]
+    return _write_manifest(indicator_type, version, chunks)
+
+
+def _apply_delta(entries, action, delta):
+    if action == 'BLOCK':
+        return sorted(set(entries).union(delta))
+    removed = set(delta)
+    return [entry for entry in entries if entry not in removed]
+
+
+def _updated_chunks(chunks, action, indicators):
+    """Manifest rows of a version after a change, rewriting only the chunks it touches"""
+    if not chunks:
+        return [store_chunk(chunk) for chunk in split_chunks(_apply_delta([], action, indicators))]
+
+    # Entries go to the chunk whose range they fall in
+    firsts = [first for _, _, first in chunks]
+    delta_by_chunk = collections.defaultdict(list)
+    for entry in set(indicators):
+        delta_by_chunk[max(0, bisect.bisect_right(firsts, entry) - 1)].append(entry)
+
+    result = []
+    i = 0
+    while i < len(chunks):
+        if i not in delta_by_chunk:
+            result.append(chunks[i])
+            i += 1
+            continue
+        # Rewrite a run of chunks, extended until it ends on a natural
+        # boundary again so later chunks keep their hashes
+        entries, delta = [], []
+        while True:
+            entries.extend(read_chunk(chunks[i][0]))
+            delta.extend(delta_by_chunk.get(i, ()))
+            i += 1
+            if i == len(chunks):
+                break
+            if i in delta_by_chunk:
+                continue  # The next chunk changes too
+            updated = _apply_delta(entries, action, delta)
+            if updated and _is_boundary(updated[-1]):
+                break
+        result.extend(store_chunk(chunk) for chunk in split_chunks(_apply_delta(entries, action, delta)))
+    return result
+
+
+def apply_change(indicator_type, previous_version, version, action, indicators, read_entries):
+    """Store the version a BLOCK or UNBLOCK change produced.
+
+    Derived from the previous version's manifest when it exists, otherwise
+    built from read_entries(), which returns the list after the change.
+    """
+    previous = read_manifest(indicator_type, previous_version) if previous_version else None
+    if previous is None:
+        return build_snapshot(indicator_type, version, read_entries())
+    return _write_manifest(indicator_type, version, _updated_chunks(previous['chunks'], action, indicators))
+
+
+def history(indicator_type, limit=None):
+    """Stored versions of a list, newest first"""
+    try:
+        with open(os.path.join(_type_dir(indicator_type), 'history.jsonl'), 'r') as f:
+            lines = collections.deque(f, maxlen=limit)
+    except FileNotFoundError:
+        return []
+    return [json.loads(line) for line in reversed(lines)]
+
+
+def iter_snapshot(manifest):
+    """Yield a stored version's text, one chunk at a time"""
+    for chunk_hash, _, _ in manifest['chunks']:
+        yield read_chunk_bytes(chunk_hash)
+
+
+def _iter_entries(chunk_hashes):
+    for chunk_hash in chunk_hashes:
+        yield from read_chunk(chunk_hash)
+
+
+def diff(old, new):
+    """Entries added and removed between two manifests, each sorted"""
+    old_hashes = [row[0] for row in old['chunks']]
+    new_hashes = [row[0] for row in new['chunks']]
+    shared = set(old_hashes).intersection(new_hashes)
+    old_entries = _iter_entries(h for h in old_hashes if h not in shared)
+    new_entries = _iter_entries(h for h in new_hashes if h not in shared)
+
+    added, removed = [], []
+    old_entry = next(old_entries, None)
+    new_entry = next(new_entries, None)
+    while old_entry is not None or new_entry is not None:
+        if new_entry is None or (old_entry is not None and old_entry < new_entry):
+            removed.append(old_entry)
+            old_entry = next(old_entries, None)
+        elif old_entry is None or new_entry < old_entry:
+            added.append(new_entry)
+            new_entry = next(new_entries, None)
+        else:
+            old_entry = next(old_entries, None)
+            new_entry = next(new_entries, None)
+    return {'added': added, 'removed': removed}
@@ -0,0 +1,132 @@
+"""Dashboard statistics, kept up to date as changes are logged.
+
+The statistics are a running aggregate of the audit log: all-time counts
+per action and list type, the same counts per day, and per-user activity.
+They are stored in settings.STATS_FILE together with the log offset they
+cover. services.log_action() folds each new record in right after writing
+it, so /api/stats/ answers from a small file however long the history is.
+Records the stored aggregate has not seen yet (the file was deleted, or the
+log was written by an older version) are folded in from that offset on the
+next update, and a log that shrank is aggregated again from the start.
+
+Days are the dates of the audit log timestamps. Daily counts older than
+settings.STATS_HISTORY_DAYS are dropped; all-time counts are kept.
+"""
+import datetime
+import json
+import os
+import threading
+
+from django.conf import settings
+
+# Actions that add entries to a list or the allowlist, and those that remove them
+ADDING_ACTIONS = ('BLOCK', 'ALLOW')
+REMOVING_ACTIONS = ('UNBLOCK', 'DISALLOW')
+
+GROWTH_WINDOWS = (1, 7, 30)
+
+_cache_lock = threading.Lock()
+_cache = {}  # 'key': (mtime_ns, size) of STATS_FILE when loaded, 'stats': its contents
+
+
+def empty():
+    return {'log_offset': 0, 'actions': {}, 'daily': {}, 'users': {}}
+
+
+def load():
+    """The stored statistics, parsed once per change of the file"""
+    try:
+        stat = os.stat(settings.STATS_FILE)
+    except FileNotFoundError:
+        return empty()
+    key = (stat.st_mtime_ns, stat.st_size)
+    with _cache_lock:
+        if _cache.get('key') != key:
+            try:
+                with open(settings.STATS_FILE, 'r') as f:
+                    _cache['stats'] = json.load(f)
+            except ValueError:
+                _cache['stats'] = empty()
+            _cache['key'] = key
+        # Callers update the statistics in place
+        return json.loads(json.dumps(_cache['stats']))
+
+
+def save(stats):
+    tmp_path = f"{settings.STATS_FILE}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(stats, f, separators=(',', ':'))
+    os.replace(tmp_path, settings.STATS_FILE)
+
+
+def _add(counts, key, count):
+    counts[key] = counts.get(key, 0) + count
+
+
+def add_record(stats, fields, count, end_offset):
+    """Fold one audit record of `count` indicators, ending at end_offset in the log, into stats"""
+    action = fields['action']
+    indicator_type = fields['indicator_type']
+    _add(stats['actions'].setdefault(action, {}), indicator_type, count)
+
+    day = fields['timestamp'][:10]
+    _add(stats['daily'].setdefault(day, {}).setdefault(action, {}), indicator_type, count)
+
+    user = stats['users'].setdefault(fields['username'], {'batches': 0, 'actions': {}, 'last_action_at': None})
+    user['batches'] += 1
+    _add(user['actions'], action, count)
+    user['last_action_at'] = fields['timestamp']
+
+    stats['log_offset'] = end_offset
+
+
+def trim(stats):
+    """Drop daily counts older than STATS_HISTORY_DAYS before the newest day"""
+    days = sorted(stats['daily'])
+    if not days:
+        return
+    newest = datetime.date.fromisoformat(days[-1])
+    oldest = (newest - datetime.timedelta(days=settings.STATS_HISTORY_DAYS - 1)).isoformat()
+    for day in days:
+        if day >= oldest:
+            break
+        del stats['daily'][day]
+
+
+def _net_change(daily_counts):
+    """{type: entries added minus entries removed} for a day's counts"""
+    net = {}
+    for action, counts in daily_counts.items():
+        sign = 1 if action in ADDING_ACTIONS else -1 if action in REMOVING_ACTIONS else 0
+        for indicator_type, count in counts.items():
+            _add(net, indicator_type, sign * count)
+    return net
+
+
+def summarize(stats, totals, today, days=30, users=10):
+    """The /api/stats/ response: current totals, recent growth, daily counts and the most active users"""
+    dates = [(today - datetime.timedelta(days=offset)).isoformat() for offset in range(max(days, *GROWTH_WINDOWS))]
+    net_by_day = {day: _net_change(stats['daily'].get(day, {})) for day in dates}
+
+    growth = {}
+    for window in GROWTH_WINDOWS:
+        window_growth = {}
+        for day in dates[:window]:
+            for indicator_type, count in net_by_day[day].items():
+                _add(window_growth, indicator_type, count)
+        growth[f"{window}d"] = window_growth
+
+    active_users = sorted(
+        ({'username': username, **activity} for username, activity in stats['users'].items()),
+        key=lambda user: sum(user['actions'].values()), reverse=True
+    )
+    return {
+        'totals': totals,
+        'actions': stats['actions'],
+        'growth': growth,
+        # Oldest first, with a (possibly empty) entry for every day
+        'daily': [{'date': day, **stats['daily'].get(day, {})} for day in reversed(dates[:days])],
+        'users': active_users[:users],
+        'user_count': len(active_users),
+        'log_offset': stats['log_offset'],
+    }
@@ -0,0 +1,45 @@
+from django.conf import settings
+from drf_yasg import openapi
+from drf_yasg.utils import swagger_auto_schema
+from rest_framework import status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from . import services
+from .permissions import ApiKeyPermission, IsAuthenticatedOrHasApiKey
+
+days_param = openapi.Parameter(
+    'days', openapi.IN_QUERY,
+    description=f"Days of daily counts to return, up to {settings.STATS_HISTORY_DAYS} (default 30)",
+    type=openapi.TYPE_INTEGER
+)
+users_param = openapi.Parameter(
+    'users', openapi.IN_QUERY, description="Number of most active users to return (default 10)",
+    type=openapi.TYPE_INTEGER
+)
+
+
+class StatsView(APIView):
+    permission_classes = [IsAuthenticatedOrHasApiKey]
+
+    def get_permission_required(self, method):
+        return ApiKeyPermission.READ_ONLY if hasattr(self.request, 'api_key') else 'api.view_blocklist'
+
+    @swagger_auto_schema(
+        operation_description="Dashboard statistics: entries per list, blocks and unblocks per list type all "
+                              "time and per day, net growth over the last 1, 7 and 30 days, and the most active "
+                              "users. The counts are kept up to date as changes are logged, so this does not "
+                              "read the audit log.",
+        manual_parameters=[days_param, users_param],
+        responses={200: "Statistics", 400: "Bad Request"}
+    )
+    def get(self, request):
+        try:
+            days = int(request.query_params.get('days', 30))
+            users = int(request.query_params.get('users', 10))
+        except ValueError:
+            return Response({'error': 'days and users must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+        if not 1 <= days <= settings.STATS_HISTORY_DAYS:
+            return Response({'error': f'days must be between 1 and {settings.STATS_HISTORY_DAYS}'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response(services.get_stats(days=days, users=max(0, users)))
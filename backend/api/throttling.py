@@ -0,0 +1,225 @@
+"""Token-bucket rate limits shared by every worker process on a host.
+
+Each request takes a token from the bucket of its endpoint class (the view's
+throttle_scope, or 'default') for its caller: the API key, the user, or the
+client address for anonymous requests. A per-key limit set on the APIKey
+model and a per-user limit from settings.RATE_LIMIT_USERS add a second,
+endpoint-independent bucket.
+
+Buckets are kept with GCRA, which is an exact token bucket that needs one
+number per bucket: the "theoretical arrival time" (TAT) at which the bucket
+would be full again. A request is allowed when it would not push the TAT
+more than `burst` emission intervals past now. A bucket whose TAT has passed
+is full, which is the same as not existing, so idle buckets need no cleanup
+and their slots are simply reused.
+
+The buckets live in a small memory-mapped hash table (settings.RATE_LIMIT_FILE)
+guarded by flock, so gunicorn workers share counters without a server round
+trip; a check costs one lock, a hash and a couple of struct reads.
+
+File layout: RATE_LIMIT_SLOTS slots of
+
+    key  Q   first 8 bytes of the BLAKE2b hash of the bucket key (0 = empty)
+    tat  d   theoretical arrival time, Unix seconds
+"""
+import hashlib
+import logging
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+
+from django.conf import settings
+from rest_framework.throttling import BaseThrottle
+
+try:
+    import fcntl
+except ImportError:  # Windows: buckets are per process
+    fcntl = None
+
+logger = logging.getLogger('django')
+
+SLOT = struct.Struct('<Qd')
+
+# Slots probed from a key's home slot before the bucket with the earliest
+# TAT is evicted
+MAX_PROBES = 8
+
+PERIODS = {'s': 1, 'sec': 1, 'second': 1, 'm': 60, 'min': 60, 'minute': 60,
+           'h': 3600, 'hour': 3600, 'd': 86400, 'day': 86400}
+
+
+def parse_rate(rate):
+    """'100/min' -> requests per second"""
+    count, _, period = rate.partition('/')
+    return int(count) / PERIODS[period.strip().lower()]
+
+
+def parse_limit(limit):
+    """Return (requests per second, burst) for a RATE_LIMITS value, or None for no limit.
+
+    A value is a rate string ('100/min'), or a (rate, burst) pair; the burst
+    defaults to ten seconds' worth of requests.
+    """
+    if limit is None:
+        return None
+    if isinstance(limit, str):
+        rate, burst = parse_rate(limit), None
+    else:
+        rate, burst = parse_rate(limit[0]), limit[1]
+    if burst is None:
+        burst = max(1, math.ceil(rate * 10))
+    return rate, burst
+
+
+def _key_hash(key):
+    value = int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), 'little')
+    return value or 1
+
+
+class BucketStore:
+    """Fixed-size table of GCRA buckets in a shared memory-mapped file"""
+
+    def __init__(self, path, slots):
+        self.path = path
+        self.slots = slots
+        self.pid = os.getpid()
+        self._thread_lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        size = slots * SLOT.size
+        with self._locked():
+            if os.fstat(self._fd).st_size != size:
+                # New file, or RATE_LIMIT_SLOTS changed: start with empty buckets
+                os.ftruncate(self._fd, 0)
+                os.ftruncate(self._fd, size)
+        self._mm = mmap.mmap(self._fd, size)
+
+    def _locked(self):
+        return _FileLock(self._fd, self._thread_lock)
+
+    def _find(self, key_hash, now, claimed=()):
+        """Offset and TAT of a key's bucket, claiming a free or idle slot for a new one"""
+        home = key_hash % self.slots
+        free = None
+        oldest = None
+        for probe in range(MAX_PROBES):
+            offset = ((home + probe) % self.slots) * SLOT.size
+            slot_hash, tat = SLOT.unpack_from(self._mm, offset)
+            if slot_hash == key_hash:
+                return offset, tat
+            if offset in claimed:
+                continue
+            if free is None and (slot_hash == 0 or tat <= now):
+                # Empty, or a full (idle) bucket that is as good as a new one
+                free = offset
+            if oldest is None or tat < oldest[1]:
+                oldest = (offset, tat)
+        # With every probed bucket in use, drop the one closest to full
+        return (oldest[0] if free is None else free), now
+
+    def take(self, buckets, now=None):
+        """Take one token from each (key, rate, burst) bucket.
+
+        Returns 0 if every bucket had a token, else the seconds until they all
+        will; no token is taken from any bucket when the request is refused.
+        """
+        now = time.time() if now is None else now
+        updates = []
+        wait = 0.0
+        with self._locked():
+            for key, rate, burst in buckets:
+                key_hash = _key_hash(key)
+                offset, tat = self._find(key_hash, now, [update[0] for update in updates])
+                interval = 1.0 / rate
+                new_tat = max(tat, now) + interval
+                wait = max(wait, new_tat - burst * interval - now)
+                updates.append((offset, key_hash, new_tat))
+            if wait > 0:
+                return wait
+            for offset, key_hash, new_tat in updates:
+                SLOT.pack_into(self._mm, offset, key_hash, new_tat)
+        return 0.0
+
+
+class _FileLock:
+    def __init__(self, fd, thread_lock):
+        self.fd = fd
+        self.thread_lock = thread_lock
+
+    def __enter__(self):
+        self.thread_lock.acquire()
+        if fcntl is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_EX)
+
+    def __exit__(self, *exc_info):
+        if fcntl is not None:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+        self.thread_lock.release()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store():
+    """The process's BucketStore, reopened after a fork so flock works between workers"""
+    global _store
+    store = _store
+    if store is None or store.pid != os.getpid():
+        with _store_lock:
+            if _store is None or _store.pid != os.getpid():
+                _store = BucketStore(settings.RATE_LIMIT_FILE, settings.RATE_LIMIT_SLOTS)
+            store = _store
+    return store
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """Rate limit requests per caller and endpoint class (see module docstring)"""
+
+    def get_caller(self, request):
+        api_key = getattr(request, 'api_key', None)
+        if api_key is not None:
+            return f"key:{api_key.pk}"
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            return f"user:{user.pk}"
+        return f"addr:{self.get_ident(request)}"
+
+    def get_buckets(self, request, view):
+        """Yield (bucket key, requests per second, burst) for every bucket the request draws from"""
+        caller = self.get_caller(request)
+        scope = getattr(view, 'throttle_scope', None) or 'default'
+        limit = parse_limit(settings.RATE_LIMITS.get(scope, settings.RATE_LIMITS.get('default')))
+        if limit is not None:
+            yield (f"{scope}:{caller}",) + limit
+
+        api_key = getattr(request, 'api_key', None)
+        if api_key is not None and api_key.rate_limit:
+            yield (f"key-total:{api_key.pk}", api_key.rate_limit / 60,
+                   api_key.rate_limit_burst or max(1, math.ceil(api_key.rate_limit / 6)))
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            limit = parse_limit(settings.RATE_LIMIT_USERS.get(user.get_username()))
+            if limit is not None:
+                yield (f"user-total:{user.pk}",) + limit
+
+    def allow_request(self, request, view):
+        self.retry_after = None
+        if not settings.RATE_LIMITS_ENABLED:
+            return True
+        try:
+            store = get_store()
+        except OSError as e:
+            # Never turn a broken counter file into an outage
+            logger.error(f"Rate limiting disabled: cannot open {settings.RATE_LIMIT_FILE}: {e}")
+            return True
+        wait = store.take(list(self.get_buckets(request, view)))
+        if wait:
+            self.retry_after = wait
+            return False
+        return True
+
+    def wait(self):
+        return self.retry_after
@@ -8,6 +8,7 @@ logger = logging.getLogger('django')
 
 class CustomTokenObtainPairView(TokenObtainPairView):
     serializer_class = CustomTokenObtainPairSerializer
+    throttle_scope = 'login'
     
     def post(self, request, *args, **kwargs):
         logger.info(f"Token request received: {request.data}")
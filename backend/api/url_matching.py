@@ -0,0 +1,125 @@
+"""URL canonicalization and path-prefix matching for the URL blocklist.
+
+Blocked URLs are stored in canonical form, so spelling variants of the same
+URL (scheme/host case, default ports, percent-encoding, dot segments,
+trailing slashes) are one entry. For matching, every URL is reduced to a key
+of its host followed by its path segments:
+
+    http://Evil.com:80/a/./b/?x=1  ->  canonical http://evil.com/a/b?x=1
+                                       key       evil.com/a/b?x=1
+
+A blocked URL without a query blocks every URL below its path, segment by
+segment (/a blocks /a, /a/b and /a?x=1 but not /ab); a blocked URL with a
+query blocks exactly that path and query. The scheme is not part of the key,
+so blocking an http:// URL also blocks its https:// equivalent.
+
+The keys form a host-then-path trie flattened into a sorted array (see
+list_index); a lookup probes one key per path segment of the visited URL.
+"""
+import re
+import string
+from urllib.parse import quote, urlsplit
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+_UNRESERVED = frozenset(string.ascii_letters + string.digits + '-._~')
+_ESCAPE = re.compile(r'%([0-9A-Fa-f]{2})')
+
+# Characters left as they are in paths and queries (RFC 3986 sub-delims and
+# the characters allowed in segments), besides the unreserved ones
+_PATH_SAFE = "/:@!$&'()*+,;=%"
+_QUERY_SAFE = "/?:@!$&'()*+,;=%"
+
+
+def _normalize_escapes(value, safe):
+    """Decode escaped unreserved characters, uppercase other escapes and
+    escape characters that must be"""
+    def replace(match):
+        char = chr(int(match.group(1), 16))
+        return char if char in _UNRESERVED else f"%{match.group(1).upper()}"
+    return quote(_ESCAPE.sub(replace, value), safe=safe)
+
+
+def _remove_dot_segments(path):
+    """RFC 3986 section 5.2.4"""
+    output = []
+    for segment in path.split('/')[1:]:
+        if segment == '..':
+            if output:
+                output.pop()
+        elif segment != '.':
+            output.append(segment)
+    # A trailing dot segment still denotes a directory
+    if path.endswith(('/.', '/..')):
+        output.append('')
+    return '/' + '/'.join(output)
+
+
+def _split(url):
+    """Return (scheme, netloc, path, query) of the canonical form of url"""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS:
+        raise ValueError(f"Unsupported URL scheme: {url}")
+    host = parts.hostname  # Lowercased, userinfo and IPv6 brackets removed
+    if not host:
+        raise ValueError(f"URL has no host: {url}")
+    host = host.rstrip('.')
+    try:
+        host = host.encode('idna').decode('ascii')
+    except UnicodeError:
+        pass
+    if ':' in host:
+        host = f"[{host}]"
+    port = parts.port  # Raises ValueError for an invalid port
+    netloc = host if port in (None, DEFAULT_PORTS[scheme]) else f"{host}:{port}"
+
+    path = _remove_dot_segments(_normalize_escapes(parts.path or '/', _PATH_SAFE))
+    if len(path) > 1:
+        path = path.rstrip('/') or '/'
+    query = _normalize_escapes(parts.query, _QUERY_SAFE)
+    return scheme, netloc, path, query
+
+
+def canonicalize_url(url):
+    """Return the canonical form of an http(s) URL; raises ValueError if it has none"""
+    scheme, netloc, path, query = _split(url)
+    return f"{scheme}://{netloc}{path}" + (f"?{query}" if query else '')
+
+
+def _segments(path):
+    # Empty segments are ignored for matching, so /a//b is keyed like /a/b
+    return [segment for segment in path.split('/') if segment]
+
+
+def match_key(url):
+    """Return the index key of a blocked URL, or None if it cannot be parsed"""
+    try:
+        _, netloc, path, query = _split(url)
+    except ValueError:
+        return None
+    key = netloc + ''.join(f"/{segment}" for segment in _segments(path))
+    return f"{key}?{query}" if query else key
+
+
+def candidate_keys(url):
+    """Return the keys a visited URL is blocked by: its host, each path
+    prefix, and the full path with its query"""
+    _, netloc, path, query = _split(url)
+    keys = [netloc]
+    prefix = netloc
+    for segment in _segments(path):
+        prefix = f"{prefix}/{segment}"
+        keys.append(prefix)
+    if query:
+        keys.append(f"{prefix}?{query}")
+    return keys
+
+
+def is_blocked(url, index):
+    """Return True if url is blocked by any key in index (a ListIndex or set)"""
+    try:
+        keys = candidate_keys(url)
+    except ValueError:
+        return False
+    return any(key in index for key in keys)
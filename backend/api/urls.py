@@ -3,6 +3,12 @@ from rest_framework.routers import DefaultRouter
 from . import views
 from .api_key_views import APIKeyViewSet
 from .log_views import ApiLogView
+from .event_views import EventsView, EventStreamView
+from .hit_views import HitsView, StaleEntriesView
+from .job_views import JobListView, JobDetailView
+from .replication_views import ReplicationStatusView
+from .snapshot_views import SnapshotHistoryView, SnapshotView, SnapshotDiffView
+from .stats_views import StatsView
 
 # Set up the router for viewsets
 router = DefaultRouter()
@@ -23,14 +29,68 @@ urlpatterns = [
     path('unblock/', views.UnblockIndicatorView.as_view(), name='unblock'),
     path('blocklist/', views.BlocklistView.as_view(), name='blocklist'),
     path('logs/', views.LogsView.as_view(), name='logs'),
+    path('logs/batches/<int:batch_id>/', views.LogBatchView.as_view(), name='log-batch'),
+    path('logs/batches/<int:batch_id>/revert/', views.LogBatchRevertView.as_view(), name='log-batch-revert'),
+    path('stats/', StatsView.as_view(), name='stats'),
+    
+    # Protected indicators that block requests are checked against
+    path('allowlist/', views.AllowlistView.as_view(), name='allowlist'),
+    path('allowlist/remove/', views.AllowlistRemoveView.as_view(), name='allowlist-remove'),
     
     # Direct access to blocklist files (authenticated JSON)
     path('ip-blocklist/', views.IPBlocklistView.as_view(), name='ip-blocklist'),
     path('domain-blocklist/', views.DomainBlocklistView.as_view(), name='domain-blocklist'),
     path('url-blocklist/', views.URLBlocklistView.as_view(), name='url-blocklist'),
     
+    # Stored versions of each list and diffs between them
+    path('snapshots/<str:indicator_type>/', SnapshotHistoryView.as_view(), name='snapshots'),
+    path('snapshots/<str:indicator_type>/diff/', SnapshotDiffView.as_view(), name='snapshot-diff'),
+    path('snapshots/<str:indicator_type>/<int:version>/', SnapshotView.as_view(), name='snapshot'),
+    
+    # Background jobs for large imports, exports and compactions
+    path('jobs/', JobListView.as_view(), name='jobs'),
+    path('jobs/<uuid:job_id>/', JobDetailView.as_view(), name='job-detail'),
+    
+    # Membership checks
+    path('lookup/', views.LookupView.as_view(), name='lookup'),
+    
+    # Hit counts reported by enforcement points, and entries nothing hits
+    path('hits/', HitsView.as_view(), name='hits'),
+    path('hits/stale/', StaleEntriesView.as_view(), name='hits-stale'),
+    
     # Direct access to blocklist files (raw text, no auth)
     path('raw/ip-blocklist/', views.RawIPBlocklistView.as_view(), name='raw-ip-blocklist'),
     path('raw/domain-blocklist/', views.RawDomainBlocklistView.as_view(), name='raw-domain-blocklist'),
     path('raw/url-blocklist/', views.RawURLBlocklistView.as_view(), name='raw-url-blocklist'),
+    
+    # Bloom filters for "maybe blocked" checks on edge devices
+    path('raw/ip-blocklist/bloom/', views.BloomFilterView.as_view(),
+         {'indicator_type': 'ip'}, name='raw-ip-blocklist-bloom'),
+    path('raw/domain-blocklist/bloom/', views.BloomFilterView.as_view(),
+         {'indicator_type': 'domain'}, name='raw-domain-blocklist-bloom'),
+    path('raw/url-blocklist/bloom/', views.BloomFilterView.as_view(),
+         {'indicator_type': 'url'}, name='raw-url-blocklist-bloom'),
+    
+    # Checksums of the files published for static serving (api.publish)
+    path('raw/ip-blocklist/SHA256SUMS', views.ChecksumsView.as_view(),
+         {'indicator_type': 'ip'}, name='raw-ip-blocklist-checksums'),
+    path('raw/domain-blocklist/SHA256SUMS', views.ChecksumsView.as_view(),
+         {'indicator_type': 'domain'}, name='raw-domain-blocklist-checksums'),
+    path('raw/url-blocklist/SHA256SUMS', views.ChecksumsView.as_view(),
+         {'indicator_type': 'url'}, name='raw-url-blocklist-checksums'),
+    
+    # Firewall, DNS and proxy export formats of the raw feeds
+    path('raw/ip-blocklist/<str:export_format>/', views.BlocklistExportView.as_view(),
+         {'indicator_type': 'ip'}, name='raw-ip-blocklist-export'),
+    path('raw/domain-blocklist/<str:export_format>/', views.BlocklistExportView.as_view(),
+         {'indicator_type': 'domain'}, name='raw-domain-blocklist-export'),
+    path('raw/url-blocklist/<str:export_format>/', views.BlocklistExportView.as_view(),
+         {'indicator_type': 'url'}, name='raw-url-blocklist-export'),
+    
+    # Change notifications for feed subscribers (no auth)
+    path('events/', EventsView.as_view(), name='events'),
+    path('events/stream/', EventStreamView.as_view(), name='events-stream'),
+    
+    # Replication role and lag (leaders and read-only followers)
+    path('replication/', ReplicationStatusView.as_view(), name='replication'),
 ]
@@ -3,14 +3,22 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
 from rest_framework.decorators import api_view, permission_classes
+from rest_framework.parsers import JSONParser, FormParser, MultiPartParser
 from rest_framework.permissions import IsAuthenticated
+from asgiref.sync import sync_to_async
 from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from django.conf import settings
 import os
-from datetime import datetime
+from itertools import chain, islice
 
-from .serializers import IndicatorSerializer, BlocklistItemSerializer, LogEntrySerializer
-from . import services
+from .serializers import IndicatorSerializer, BlockIndicatorSerializer, AllowlistSerializer, BlocklistItemSerializer, LogEntrySerializer
+from . import services, response_cache, exports, bloom, jobs, publish
+from .job_views import job_accepted_response
+from .async_views import AsyncAPIView
+from .renderers import StreamingJSONArrayResponse
+from .parsers import IndicatorLines, PlainTextLinesParser
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
 from .permissions import IsAuthenticatedOrHasApiKey, ApiKeyPermission, IsAdminUser
@@ -29,9 +37,12 @@ block_request_schema = openapi.Schema(
     type=openapi.TYPE_OBJECT,
     required=['indicator_type', 'indicators', 'reason'],
     properties={
-        'indicator_type': openapi.Schema(type=openapi.TYPE_STRING, description="Type of indicator (ip, domain, url)", enum=['ip', 'domain', 'url']),
+        'indicator_type': openapi.Schema(type=openapi.TYPE_STRING, description="Type of indicator (ip, domain, url), or auto to detect the type of each line", enum=['ip', 'domain', 'url', 'auto']),
         'indicators': openapi.Schema(type=openapi.TYPE_STRING, description="Indicators to block (one per line)"),
         'reason': openapi.Schema(type=openapi.TYPE_STRING, description="Reason for blocking"),
+        'expires_in': openapi.Schema(type=openapi.TYPE_INTEGER, description="Optional: unblock the added indicators after this many seconds"),
+        'expires_at': openapi.Schema(type=openapi.TYPE_STRING, format=openapi.FORMAT_DATETIME, description="Optional: unblock the added indicators at this time"),
+        'background': openapi.Schema(type=openapi.TYPE_BOOLEAN, description="Optional: run as a background job (automatic above JOB_INLINE_LIMIT indicators)"),
     }
 )
 
@@ -39,9 +50,10 @@ unblock_request_schema = openapi.Schema(
     type=openapi.TYPE_OBJECT,
     required=['indicator_type', 'indicators', 'reason'],
     properties={
-        'indicator_type': openapi.Schema(type=openapi.TYPE_STRING, description="Type of indicator (ip, domain, url)", enum=['ip', 'domain', 'url']),
+        'indicator_type': openapi.Schema(type=openapi.TYPE_STRING, description="Type of indicator (ip, domain, url), or auto to detect the type of each line", enum=['ip', 'domain', 'url', 'auto']),
         'indicators': openapi.Schema(type=openapi.TYPE_STRING, description="Indicators to unblock (one per line)"),
         'reason': openapi.Schema(type=openapi.TYPE_STRING, description="Reason for unblocking"),
+        'background': openapi.Schema(type=openapi.TYPE_BOOLEAN, description="Optional: run as a background job (automatic above JOB_INLINE_LIMIT indicators)"),
     }
 )
 
@@ -56,7 +68,8 @@ blocklist_response_schema = openapi.Schema(
                 properties={
                     'indicator': openapi.Schema(type=openapi.TYPE_STRING),
                     'added_by': openapi.Schema(type=openapi.TYPE_STRING),
-                    'added_at': openapi.Schema(type=openapi.TYPE_STRING, format=openapi.FORMAT_DATETIME),
+                    'added_at': openapi.Schema(type=openapi.TYPE_STRING, format=openapi.FORMAT_DATETIME, x_nullable=True,
+                                               description="Time of the latest block; null if the audit log has none"),
                     'reason': openapi.Schema(type=openapi.TYPE_STRING),
                 }
             )
@@ -88,9 +101,25 @@ block_response_schema = openapi.Schema(
     type=openapi.TYPE_OBJECT,
     properties={
         'message': openapi.Schema(type=openapi.TYPE_STRING),
+        'batch_id': openapi.Schema(type=openapi.TYPE_INTEGER, description="Audit batch of the change, for /api/logs/batches/<id>/revert/"),
         'blocked': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_STRING)),
         'existing': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_STRING)),
+        'expiry_updated': openapi.Schema(
+            type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_STRING),
+            description="Existing indicators that now expire at expires_at, or no longer expire "
+                        "when the request has no expiry"
+        ),
         'invalid': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_STRING)),
+        'allowlisted': openapi.Schema(
+            type=openapi.TYPE_ARRAY,
+            items=openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    'indicator': openapi.Schema(type=openapi.TYPE_STRING),
+                    'allowlist_entry': openapi.Schema(type=openapi.TYPE_STRING),
+                }
+            )
+        ),
     }
 )
 
@@ -98,15 +127,117 @@ unblock_response_schema = openapi.Schema(
     type=openapi.TYPE_OBJECT,
     properties={
         'message': openapi.Schema(type=openapi.TYPE_STRING),
+        'batch_id': openapi.Schema(type=openapi.TYPE_INTEGER, description="Audit batch of the change, for /api/logs/batches/<id>/revert/"),
         'unblocked': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_STRING)),
         'not_found': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_STRING)),
         'invalid': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_STRING)),
     }
 )
 
+allowlist_request_schema = openapi.Schema(
+    type=openapi.TYPE_OBJECT,
+    required=['entries'],
+    properties={
+        'entries': openapi.Schema(type=openapi.TYPE_STRING, description='IP addresses, CIDR networks or domains, one per line'),
+        'reason': openapi.Schema(type=openapi.TYPE_STRING),
+    }
+)
+
+allowlist_response_schema = openapi.Schema(
+    type=openapi.TYPE_OBJECT,
+    properties={
+        'message': openapi.Schema(type=openapi.TYPE_STRING),
+        'added': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_STRING)),
+        'existing': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_STRING)),
+        'invalid': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_OBJECT)),
+        'conflicts': openapi.Schema(
+            type=openapi.TYPE_ARRAY,
+            items=openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    'indicator_type': openapi.Schema(type=openapi.TYPE_STRING),
+                    'indicator': openapi.Schema(type=openapi.TYPE_STRING),
+                    'allowlist_entry': openapi.Schema(type=openapi.TYPE_STRING),
+                }
+            )
+        ),
+    }
+)
+
+allowlist_remove_response_schema = openapi.Schema(
+    type=openapi.TYPE_OBJECT,
+    properties={
+        'message': openapi.Schema(type=openapi.TYPE_STRING),
+        'removed': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_STRING)),
+        'not_found': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_STRING)),
+    }
+)
+
+async def cached_blocklist_response(request, indicator_type):
+    """Return one blocklist as a JSON array, from the response cache when possible"""
+    async def build():
+        content = await services.read_blocklist_content_async(indicator_type)
+        return content.splitlines()
+    
+    if not response_cache.can_use_cache(request):
+        return Response(await build())
+    
+    versions = {indicator_type: services.get_list_version(indicator_type)}
+    key = response_cache.make_key(f"{indicator_type}-blocklist", versions, request.query_params)
+    return await response_cache.aget_or_build(key, build)
+
+def read_indicator_request(request):
+    """Return (fields, lines) for a block or unblock request.
+    
+    JSON and form requests send indicators in the newline-separated
+    'indicators' field and lines is None. A text/plain body (with the other
+    fields in the query string) or a multipart upload named 'file' is returned
+    as an iterator that reads the indicators as they are consumed.
+    """
+    data = request.data
+    if isinstance(data, IndicatorLines):
+        return request.query_params, data
+    if 'file' in request.FILES:
+        fields = {key: value for key, value in request.data.items() if key != 'file'}
+        fields = {**request.query_params.dict(), **fields}
+        return fields, IndicatorLines(request.FILES['file'])
+    return data, None
+
+def mixed_type_response_data(result, done_key, renames, verb):
+    """Response body for an indicator_type=auto request.
+    
+    result is a services.add_auto_to_blocklist or remove_auto_from_blocklist
+    result; each type's buckets are returned under 'results', renamed to the
+    keys of the single-type response.
+    """
+    results = {
+        indicator_type: {renames.get(key, key): items for key, items in type_result.items() if items}
+        for indicator_type, type_result in result['by_type'].items()
+    }
+    done = {indicator_type: len(type_result.get(done_key, [])) for indicator_type, type_result in results.items()}
+    breakdown = ', '.join(f'{count} {indicator_type}' for indicator_type, count in done.items() if count)
+    response_data = {
+        'message': f'{verb} {sum(done.values())} indicators' + (f' ({breakdown})' if breakdown else ''),
+        'results': results
+    }
+    if result['invalid']:
+        response_data['invalid'] = result['invalid']
+        response_data['message'] += f", {len(result['invalid'])} indicators were not a valid ip, domain or url"
+    return response_data
+
+def split_inline(indicators):
+    """Read up to JOB_INLINE_LIMIT + 1 indicators; return them and the unread rest.
+    
+    More than JOB_INLINE_LIMIT indicators means the request is run as a job,
+    which spools the rest to disk without holding it all in memory.
+    """
+    indicators = iter(indicators)
+    return list(islice(indicators, settings.JOB_INLINE_LIMIT + 1)), indicators
+
 class BlockIndicatorView(APIView):
     # Allow authenticated users, but check API key permissions
     permission_classes = [IsAuthenticatedOrHasApiKey]
+    parser_classes = [JSONParser, FormParser, MultiPartParser, PlainTextLinesParser]
     
     def get_permission_required(self, method):
         # Use READ_WRITE permission for API keys
@@ -115,34 +246,67 @@ class BlockIndicatorView(APIView):
     @swagger_auto_schema(
         operation_description="Block indicators",
         request_body=block_request_schema,
-        responses={201: block_response_schema, 400: "Bad Request"}
+        responses={201: block_response_schema, 202: "Accepted as a background job", 400: "Bad Request"}
     )
     def post(self, request):
-        serializer = IndicatorSerializer(data=request.data)
+        fields, lines = read_indicator_request(request)
+        serializer = BlockIndicatorSerializer(data=fields, indicators_streamed=lines is not None)
         if serializer.is_valid():
             indicator_type = serializer.validated_data['indicator_type']
-            indicators_text = serializer.validated_data['indicators']
             reason = serializer.validated_data['reason']
+            expires_at = serializer.validated_data.get('expires_at')
             
             # Split the indicators by line
-            indicators = [line.strip() for line in indicators_text.split('\n') if line.strip()]
+            if lines is None:
+                indicators_text = serializer.validated_data['indicators']
+                lines = (line.strip() for line in indicators_text.split('\n') if line.strip())
+            indicators, rest = split_inline(lines)
+            
+            # Large requests run in the background rather than holding the request open
+            if serializer.validated_data['background'] or len(indicators) > settings.JOB_INLINE_LIMIT:
+                job = jobs.submit('block', {
+                    'indicator_type': indicator_type,
+                    'username': request.user.username,
+                    'reason': reason,
+                    'expires_at': expires_at.timestamp() if expires_at else None,
+                }, request.user, chain(indicators, rest))
+                return job_accepted_response(job)
+            
+            # Mixed submissions are classified line by line
+            if indicator_type == services.AUTO_TYPE:
+                result = services.add_auto_to_blocklist(
+                    indicators,
+                    request.user.username,
+                    reason,
+                    expires_at=expires_at.timestamp() if expires_at else None
+                )
+                response_data = mixed_type_response_data(result, 'blocked', {'added': 'blocked'}, 'Added')
+                if expires_at:
+                    response_data['expires_at'] = expires_at.isoformat()
+                return Response(response_data, status=status.HTTP_201_CREATED)
             
             # Add indicators to blocklist
             result = services.add_to_blocklist(
                 indicator_type, 
                 indicators, 
                 request.user.username, 
-                reason
+                reason,
+                expires_at=expires_at.timestamp() if expires_at else None
             )
             
             added_indicators = result['added']
             invalid_indicators = result['invalid']
             existing_indicators = result['existing']
+            allowlisted_indicators = result['allowlisted']
             
             response_data = {
                 'message': f'Added {len(added_indicators)} indicators to the {indicator_type} blocklist',
                 'blocked': added_indicators
             }
+            if result['batch_id'] is not None:
+                response_data['batch_id'] = result['batch_id']
+            if expires_at and (added_indicators or result['expiry_updated']):
+                response_data['expires_at'] = expires_at.isoformat()
             
             # Add invalid indicators to the response if any
             if invalid_indicators:
@@ -154,6 +318,19 @@ class BlockIndicatorView(APIView):
                 response_data['existing'] = existing_indicators
                 response_data['message'] += f', {len(existing_indicators)} indicators already exist in the blocklist'
             
+            # Add existing indicators whose expiry changed to the response if any
+            if result['expiry_updated']:
+                response_data['expiry_updated'] = result['expiry_updated']
+                if expires_at:
+                    response_data['message'] += f", {len(result['expiry_updated'])} existing indicators now expire at {expires_at.isoformat()}"
+                else:
+                    response_data['message'] += f", {len(result['expiry_updated'])} existing indicators no longer expire"
+            
+            # Add indicators refused by the allowlist to the response if any
+            if allowlisted_indicators:
+                response_data['allowlisted'] = allowlisted_indicators
+                response_data['message'] += f', {len(allowlisted_indicators)} indicators are allowlisted'
+            
             return Response(response_data, status=status.HTTP_201_CREATED)
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -161,6 +338,7 @@ class BlockIndicatorView(APIView):
 class UnblockIndicatorView(APIView):
     # Allow authenticated users, but check API key permissions
     permission_classes = [IsAuthenticatedOrHasApiKey]
+    parser_classes = [JSONParser, FormParser, MultiPartParser, PlainTextLinesParser]
     
     def get_permission_required(self, method):
         # Use READ_WRITE permission for API keys
@@ -169,17 +347,36 @@ class UnblockIndicatorView(APIView):
     @swagger_auto_schema(
         operation_description="Unblock indicators",
         request_body=unblock_request_schema,
-        responses={200: unblock_response_schema, 400: "Bad Request"}
+        responses={200: unblock_response_schema, 202: "Accepted as a background job", 400: "Bad Request"}
     )
     def post(self, request):
-        serializer = IndicatorSerializer(data=request.data)
+        fields, lines = read_indicator_request(request)
+        serializer = IndicatorSerializer(data=fields, indicators_streamed=lines is not None)
         if serializer.is_valid():
             indicator_type = serializer.validated_data['indicator_type']
-            indicators_text = serializer.validated_data['indicators']
             reason = serializer.validated_data['reason']
             
             # Split the indicators by line
-            indicators = [line.strip() for line in indicators_text.split('\n') if line.strip()]
+            if lines is None:
+                indicators_text = serializer.validated_data['indicators']
+                lines = (line.strip() for line in indicators_text.split('\n') if line.strip())
+            indicators, rest = split_inline(lines)
+            
+            # Large requests run in the background rather than holding the request open
+            if serializer.validated_data['background'] or len(indicators) > settings.JOB_INLINE_LIMIT:
+                job = jobs.submit('unblock', {
+                    'indicator_type': indicator_type,
+                    'username': request.user.username,
+                    'reason': reason,
+                }, request.user, chain(indicators, rest))
+                return job_accepted_response(job)
+            
+            # Mixed submissions are classified line by line
+            if indicator_type == services.AUTO_TYPE:
+                result = services.remove_auto_from_blocklist(indicators, request.user.username, reason)
+                return Response(mixed_type_response_data(
+                    result, 'unblocked', {'removed': 'unblocked', 'non_existent': 'not_found'}, 'Removed'
+                ))
             
             # Remove indicators from blocklist
             result = services.remove_from_blocklist(
@@ -196,6 +393,8 @@ class UnblockIndicatorView(APIView):
                 'message': f'Removed {len(removed_indicators)} indicators from the {indicator_type} blocklist',
                 'unblocked': removed_indicators
             }
+            if result['batch_id'] is not None:
+                response_data['batch_id'] = result['batch_id']
             
             # Add non-existent indicators to the response if any
             if non_existent_indicators:
@@ -206,8 +405,93 @@ class UnblockIndicatorView(APIView):
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+class AllowlistView(APIView):
+    permission_classes = [IsAuthenticatedOrHasApiKey]
+    
+    def get_permissions(self):
+        # Anyone who can read the blocklists can read the allowlist; only
+        # admins can change it
+        if self.request.method == 'POST':
+            return [IsAuthenticated(), IsAdminUser()]
+        return super().get_permissions()
+    
+    def get_permission_required(self, method):
+        return ApiKeyPermission.READ_ONLY if hasattr(self.request, 'api_key') else 'api.view_blocklist'
+    
+    @swagger_auto_schema(
+        operation_description="Get the allowlist of IPs, CIDR networks and domains that cannot be blocked",
+        responses={200: openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_STRING))}
+    )
+    def get(self, request):
+        return Response(services.read_allowlist())
+    
+    @swagger_auto_schema(
+        operation_description="Add entries to the allowlist (admin only). Blocked indicators the new "
+                              "entries cover are reported as conflicts and stay blocked.",
+        request_body=allowlist_request_schema,
+        responses={201: allowlist_response_schema, 400: "Bad Request", 403: "Forbidden"}
+    )
+    def post(self, request):
+        serializer = AllowlistSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        entries = [line.strip() for line in serializer.validated_data['entries'].split('\n') if line.strip()]
+        result = services.add_to_allowlist(
+            entries, request.user.username, serializer.validated_data.get('reason', '')
+        )
+        
+        response_data = {
+            'message': f"Added {len(result['added'])} entries to the allowlist",
+            'added': result['added']
+        }
+        if result['batch_id'] is not None:
+            response_data['batch_id'] = result['batch_id']
+        if result['invalid']:
+            response_data['invalid'] = result['invalid']
+            response_data['message'] += f", {len(result['invalid'])} entries were invalid"
+        if result['existing']:
+            response_data['existing'] = result['existing']
+            response_data['message'] += f", {len(result['existing'])} entries already exist in the allowlist"
+        if result['conflicts']:
+            response_data['conflicts'] = result['conflicts']
+            response_data['message'] += f", {len(result['conflicts'])} blocked indicators are covered by the new entries"
+        
+        return Response(response_data, status=status.HTTP_201_CREATED)
+
+class AllowlistRemoveView(APIView):
+    permission_classes = [IsAuthenticated, IsAdminUser]
+    
+    @swagger_auto_schema(
+        operation_description="Remove entries from the allowlist (admin only)",
+        request_body=allowlist_request_schema,
+        responses={200: allowlist_remove_response_schema, 400: "Bad Request", 403: "Forbidden"}
+    )
+    def post(self, request):
+        serializer = AllowlistSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        entries = [line.strip() for line in serializer.validated_data['entries'].split('\n') if line.strip()]
+        result = services.remove_from_allowlist(
+            entries, request.user.username, serializer.validated_data.get('reason', '')
+        )
+        
+        response_data = {
+            'message': f"Removed {len(result['removed'])} entries from the allowlist",
+            'removed': result['removed']
+        }
+        if result['batch_id'] is not None:
+            response_data['batch_id'] = result['batch_id']
+        if result['non_existent']:
+            response_data['not_found'] = result['non_existent']
+            response_data['message'] += f", {len(result['non_existent'])} entries were not found in the allowlist"
+        
+        return Response(response_data)
+
 class BlocklistView(APIView):
     permission_classes = [IsAuthenticatedOrHasApiKey]
+    throttle_scope = 'lists'
     
     def get_permission_required(self, method):
         return ApiKeyPermission.READ_ONLY if method == 'GET' else ApiKeyPermission.READ_WRITE
@@ -219,61 +503,65 @@ class BlocklistView(APIView):
     )
     def get(self, request):
         try:
-            # Get all blocklist items
-            blocklist_items = services.read_all_blocklists()
-            
-            # Filter by indicator type if provided
             indicator_type = request.query_params.get('indicator_type')
-            if indicator_type:
-                blocklist_items = [item for item in blocklist_items if item.get('type') == indicator_type]
-            
-            # Get log entries to enrich blocklist items with metadata
-            logs = services.read_logs()
-            
-            # Create a mapping of indicator to its latest log entry
-            indicator_logs = {}
-            for log in logs:
-                # Only consider BLOCK actions
-                if log.get('action') == 'BLOCK':
-                    # Create a key using indicator_type and indicator
-                    key = f"{log.get('indicator_type')}:{log.get('indicator')}"
-                    # Store the log entry or update if this is newer
-                    if key not in indicator_logs or log.get('timestamp', '') > indicator_logs[key].get('timestamp', ''):
-                        indicator_logs[key] = log
-            
-            # Enrich blocklist items with metadata from logs
-            formatted_items = []
-            for item in blocklist_items:
-                # Create a key to look up in the logs
-                key = f"{item.get('type')}:{item.get('indicator')}"
-                
-                # Start with default values
-                formatted_item = {
-                    'indicator': item.get('indicator', ''),
-                    'type': item.get('type', ''),
-                    'added_by': 'Unknown',
-                    'added_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    'reason': 'Unknown reason'
-                }
-                
-                # Update with actual values from logs if available
-                if key in indicator_logs:
-                    log = indicator_logs[key]
-                    formatted_item['added_by'] = log.get('username', 'Unknown')
-                    formatted_item['added_at'] = log.get('timestamp', formatted_item['added_at'])
-                    formatted_item['reason'] = log.get('reason', 'Unknown reason')
-                
-                formatted_items.append(formatted_item)
-            
-            # Sort by timestamp in descending order (newest first)
-            formatted_items.sort(key=lambda x: x.get('added_at', ''), reverse=True)
+            if not response_cache.can_use_cache(request):
+                return Response(self._build_items(indicator_type))
             
-            # Return the items directly
-            return Response(formatted_items)
+            # Entries depend on every list and on the audit log, which only
+            # changes together with a list, so all list versions form the key
+            key = response_cache.make_key('blocklist', services.get_list_versions(), request.query_params)
+            return response_cache.get_or_build(key, lambda: self._build_items(indicator_type))
         except Exception as e:
             import traceback
             traceback.print_exc()
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    def _build_items(self, indicator_type):
+        """Build the enriched blocklist entries, newest first"""
+        # Get all blocklist items
+        blocklist_items = services.read_all_blocklists()
+        
+        # Filter by indicator type if provided
+        if indicator_type:
+            blocklist_items = [item for item in blocklist_items if item.get('type') == indicator_type]
+        
+        # Create a mapping of indicator to the audit record of its latest
+        # block; records are read oldest first, so later ones replace earlier
+        indicator_logs = {}
+        for log, indicators in services.iter_log_batches():
+            # Only consider BLOCK actions
+            if log.get('action') == 'BLOCK':
+                for indicator in indicators:
+                    indicator_logs[f"{log.get('indicator_type')}:{indicator}"] = log
+        
+        # Enrich blocklist items with metadata from logs
+        formatted_items = []
+        for item in blocklist_items:
+            # Create a key to look up in the logs
+            key = f"{item.get('type')}:{item.get('indicator')}"
+            
+            # Start with default values
+            formatted_item = {
+                'indicator': item.get('indicator', ''),
+                'type': item.get('type', ''),
+                'added_by': 'Unknown',
+                # Unknown rather than "now", which the response cache would freeze
+                'added_at': None,
+                'reason': 'Unknown reason'
+            }
+            
+            # Update with actual values from logs if available
+            if key in indicator_logs:
+                log = indicator_logs[key]
+                formatted_item['added_by'] = log.get('username', 'Unknown')
+                formatted_item['added_at'] = log.get('timestamp', formatted_item['added_at'])
+                formatted_item['reason'] = log.get('reason', 'Unknown reason')
+            
+            formatted_items.append(formatted_item)
+        
+        # Sort by timestamp in descending order (newest first)
+        formatted_items.sort(key=lambda x: x.get('added_at') or '', reverse=True)
+        return formatted_items
 
 class LogsView(APIView):
     permission_classes = [IsAuthenticatedOrHasApiKey]
@@ -299,6 +587,10 @@ class LogsView(APIView):
             # Ensure we're returning a valid JSON array
             if not isinstance(logs, list):
                 logs = []
+            
+            # Stream large histories so the first bytes go out immediately
+            if len(logs) >= settings.STREAMING_JSON_MIN_ITEMS and request.accepted_renderer.format == 'json':
+                return StreamingJSONArrayResponse(logs)
                 
             # Return logs directly as an array, not nested in an 'entries' field
             return Response(logs, status=status.HTTP_200_OK)
@@ -307,9 +599,68 @@ class LogsView(APIView):
             traceback.print_exc()
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-class IPBlocklistView(APIView):
+log_batch_response_schema = openapi.Schema(
+    type=openapi.TYPE_OBJECT,
+    properties={
+        'batch_id': openapi.Schema(type=openapi.TYPE_INTEGER),
+        'timestamp': openapi.Schema(type=openapi.TYPE_STRING, format=openapi.FORMAT_DATETIME),
+        'username': openapi.Schema(type=openapi.TYPE_STRING),
+        'action': openapi.Schema(type=openapi.TYPE_STRING),
+        'indicator_type': openapi.Schema(type=openapi.TYPE_STRING),
+        'reason': openapi.Schema(type=openapi.TYPE_STRING),
+        'indicators': openapi.Schema(type=openapi.TYPE_ARRAY, items=openapi.Schema(type=openapi.TYPE_STRING)),
+    }
+)
+
+class LogBatchView(APIView):
     permission_classes = [IsAuthenticatedOrHasApiKey]
     
+    def get_permission_required(self, method):
+        return ApiKeyPermission.READ_ONLY
+    
+    @swagger_auto_schema(
+        operation_description="Get one audit batch: the shared fields of a block, unblock or allowlist change and its indicators",
+        responses={200: log_batch_response_schema, 404: "Not Found"}
+    )
+    def get(self, request, batch_id):
+        record = services.read_log_batch(batch_id)
+        if record is None:
+            return Response({'error': 'Audit batch not found'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(record)
+
+class LogBatchRevertView(APIView):
+    permission_classes = [IsAuthenticated, IsAdminUser]
+    
+    @swagger_auto_schema(
+        operation_description="Undo an audit batch with one reverse change (admin only): blocked indicators are "
+                              "unblocked, unblocked ones blocked again, allowlist changes reversed. "
+                              "The revert is itself logged as a new batch.",
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={'reason': openapi.Schema(type=openapi.TYPE_STRING)}
+        ),
+        responses={200: "Result of the reverse change", 404: "Not Found"}
+    )
+    def post(self, request, batch_id):
+        reverted = services.revert_batch(batch_id, request.user.username, request.data.get('reason', ''))
+        if reverted is None:
+            return Response({'error': 'Audit batch not found'}, status=status.HTTP_404_NOT_FOUND)
+        
+        batch = reverted['batch']
+        result = reverted['result']
+        done = result.get('removed', result.get('added', []))
+        response_data = {
+            'message': f"Reverted batch {batch_id} ({batch['action']} of {batch['count']} "
+                       f"{batch['indicator_type']} indicators): {reverted['action']} of {len(done)} indicators",
+            'action': reverted['action'],
+            'result': result
+        }
+        return Response(response_data)
+
+class IPBlocklistView(AsyncAPIView):
+    permission_classes = [IsAuthenticatedOrHasApiKey]
+    throttle_scope = 'lists'
+    
     def get_permission_required(self, method):
         return 'api.view_blocklist'
     
@@ -317,17 +668,16 @@ class IPBlocklistView(APIView):
         operation_description="Get IP blocklist",
         responses={200: "List of IP addresses"}
     )
-    def get(self, request, format=None):
+    async def get(self, request, format=None):
         # Read the IP blocklist file
         try:
-            with open(settings.IP_BLOCKLIST_FILE, 'r') as f:
-                content = f.read()
-            return Response(content.splitlines())
+            return await cached_blocklist_response(request, 'ip')
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-class DomainBlocklistView(APIView):
+class DomainBlocklistView(AsyncAPIView):
     permission_classes = [IsAuthenticatedOrHasApiKey]
+    throttle_scope = 'lists'
     
     def get_permission_required(self, method):
         return 'api.view_blocklist'
@@ -336,17 +686,16 @@ class DomainBlocklistView(APIView):
         operation_description="Get domain blocklist",
         responses={200: "List of domains"}
     )
-    def get(self, request, format=None):
+    async def get(self, request, format=None):
         # Read the domain blocklist file
         try:
-            with open(settings.DOMAIN_BLOCKLIST_FILE, 'r') as f:
-                content = f.read()
-            return Response(content.splitlines())
+            return await cached_blocklist_response(request, 'domain')
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-class URLBlocklistView(APIView):
+class URLBlocklistView(AsyncAPIView):
     permission_classes = [IsAuthenticatedOrHasApiKey]
+    throttle_scope = 'lists'
     
     def get_permission_required(self, method):
         return 'api.view_blocklist'
@@ -355,64 +704,291 @@ class URLBlocklistView(APIView):
         operation_description="Get URL blocklist",
         responses={200: "List of URLs"}
     )
-    def get(self, request, format=None):
+    async def get(self, request, format=None):
         # Read the URL blocklist file
         try:
-            with open(settings.URL_BLOCKLIST_FILE, 'r') as f:
-                content = f.read()
-            return Response(content.splitlines())
+            return await cached_blocklist_response(request, 'url')
+        except Exception as e:
+            return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+lookup_indicator_param = openapi.Parameter(
+    'indicator',
+    openapi.IN_QUERY,
+    description="Indicator to check; repeat the parameter to check several at once",
+    type=openapi.TYPE_STRING,
+    required=True
+)
+
+lookup_response_schema = openapi.Schema(
+    type=openapi.TYPE_OBJECT,
+    properties={
+        'indicator_type': openapi.Schema(type=openapi.TYPE_STRING),
+        'results': openapi.Schema(
+            type=openapi.TYPE_ARRAY,
+            items=openapi.Schema(
+                type=openapi.TYPE_OBJECT,
+                properties={
+                    'indicator': openapi.Schema(type=openapi.TYPE_STRING),
+                    'blocked': openapi.Schema(type=openapi.TYPE_BOOLEAN),
+                }
+            )
+        )
+    }
+)
+
+class LookupView(AsyncAPIView):
+    permission_classes = [IsAuthenticatedOrHasApiKey]
+    
+    def get_permission_required(self, method):
+        return 'api.view_blocklist'
+    
+    @swagger_auto_schema(
+        operation_description="Check whether indicators are on a blocklist",
+        manual_parameters=[indicator_type_param, lookup_indicator_param],
+        responses={200: lookup_response_schema, 400: "Bad Request"}
+    )
+    async def get(self, request, format=None):
+        indicator_type = request.query_params.get('indicator_type')
+        indicators = request.query_params.getlist('indicator')
+        if indicator_type not in services.INDICATOR_TYPES:
+            return Response({'error': 'indicator_type must be one of ip, domain, url'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        if not indicators:
+            return Response({'error': 'At least one indicator is required'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            results = await sync_to_async(services.lookup_indicators, thread_sensitive=False)(
+                indicator_type, indicators
+            )
+            return Response({'indicator_type': indicator_type, 'results': results})
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 # Raw file download views (no authentication required for direct integration with other systems)
-class RawIPBlocklistView(APIView):
+async def raw_blocklist_response(request, indicator_type):
+    """Serve a raw list from its published copy when that is current, else from a copy in the exports.
+    
+    Both are written for one list version and never change, so every part of
+    a resumed download comes from the same file.
+    """
+    published = await sync_to_async(publish.current_file, thread_sensitive=False)(indicator_type)
+    path, version = published or await sync_to_async(exports.get_raw, thread_sensitive=False)(indicator_type)
+    return versioned_file_response(request, path, f'"{indicator_type}-{version}"', 'text/plain',
+                                   f"{indicator_type}-blocklist.txt")
+
+class RawIPBlocklistView(AsyncAPIView):
     permission_classes = []
+    throttle_scope = 'feeds'
     
     @swagger_auto_schema(
-        operation_description="Get raw IP blocklist (no authentication required)",
-        responses={200: "Raw text file with one IP per line"}
+        operation_description="Get raw IP blocklist (no authentication required). "
+                              "Supports If-None-Match and resumable downloads with Range / If-Range.",
+        responses={200: "Raw text file with one IP per line", 206: "Partial Content", 304: "Not Modified",
+                   416: "Range Not Satisfiable"}
     )
-    def get(self, request, format=None):
+    async def get(self, request, format=None):
         # Serve the raw IP blocklist file
         try:
-            with open(settings.IP_BLOCKLIST_FILE, 'r') as f:
-                content = f.read()
-            return HttpResponse(content, content_type='text/plain')
+            return await raw_blocklist_response(request, 'ip')
         except Exception as e:
             return HttpResponse(str(e), status=500, content_type='text/plain')
 
-class RawDomainBlocklistView(APIView):
+class RawDomainBlocklistView(AsyncAPIView):
     permission_classes = []
+    throttle_scope = 'feeds'
     
     @swagger_auto_schema(
-        operation_description="Get raw domain blocklist (no authentication required)",
-        responses={200: "Raw text file with one domain per line"}
+        operation_description="Get raw domain blocklist (no authentication required). "
+                              "Supports If-None-Match and resumable downloads with Range / If-Range.",
+        responses={200: "Raw text file with one domain per line", 206: "Partial Content", 304: "Not Modified",
+                   416: "Range Not Satisfiable"}
     )
-    def get(self, request, format=None):
+    async def get(self, request, format=None):
         # Serve the raw domain blocklist file
         try:
-            with open(settings.DOMAIN_BLOCKLIST_FILE, 'r') as f:
-                content = f.read()
-            return HttpResponse(content, content_type='text/plain')
+            return await raw_blocklist_response(request, 'domain')
         except Exception as e:
             return HttpResponse(str(e), status=500, content_type='text/plain')
 
-class RawURLBlocklistView(APIView):
+class RawURLBlocklistView(AsyncAPIView):
     permission_classes = []
+    throttle_scope = 'feeds'
     
     @swagger_auto_schema(
-        operation_description="Get raw URL blocklist (no authentication required)",
-        responses={200: "Raw text file with one URL per line"}
+        operation_description="Get raw URL blocklist (no authentication required). "
+                              "Supports If-None-Match and resumable downloads with Range / If-Range.",
+        responses={200: "Raw text file with one URL per line", 206: "Partial Content", 304: "Not Modified",
+                   416: "Range Not Satisfiable"}
     )
-    def get(self, request, format=None):
+    async def get(self, request, format=None):
         # Serve the raw URL blocklist file
         try:
-            with open(settings.URL_BLOCKLIST_FILE, 'r') as f:
-                content = f.read()
-            return HttpResponse(content, content_type='text/plain')
+            return await raw_blocklist_response(request, 'url')
         except Exception as e:
             return HttpResponse(str(e), status=500, content_type='text/plain')
 
+def parse_byte_range(header, size):
+    """(first, last) byte positions of a single-range Range header, or None to send the whole file.
+    
+    first is at least size when the range starts past the end (416).
+    """
+    units, _, spec = header.partition('=')
+    if units.strip().lower() != 'bytes' or ',' in spec:
+        # Multiple ranges are answered with the whole file, which RFC 9110 allows
+        return None
+    first, _, last = spec.strip().partition('-')
+    try:
+        if not first:
+            # Suffix range: the last N bytes
+            return max(0, size - int(last)), size - 1
+        first = int(first)
+        last = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if first >= size:
+        return first, first
+    if last < first:
+        return None
+    return first, min(last, size - 1)
+
+def versioned_file_response(request, path, etag, content_type, filename=None):
+    """Serve a file rendered for one list version, answering conditional GETs with 304.
+    
+    Range requests get 206 Partial Content. With If-Range, the range is only
+    sent while the ETag (and so the list version) still matches; otherwise the
+    client gets the whole current file and restarts its download.
+    """
+    last_modified = int(os.path.getmtime(path))
+    not_modified = get_conditional_response(request._request, etag=etag, last_modified=last_modified)
+    if not_modified is not None:
+        return not_modified
+    
+    byte_range = None
+    range_header = request.META.get('HTTP_RANGE')
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if range_header and (if_range is None or if_range.strip() in (etag, http_date(last_modified))):
+        size = os.path.getsize(path)
+        byte_range = parse_byte_range(range_header, size)
+        if byte_range is not None and byte_range[0] >= size:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f"bytes */{size}"
+            response['ETag'] = etag
+            return response
+    
+    response = exports.file_response(request._request, path, content_type, filename, byte_range)
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    response['Accept-Ranges'] = 'bytes'
+    return response
+
+class BlocklistExportView(AsyncAPIView):
+    """Blocklist converted for firewalls, DNS servers and proxies (no authentication, like the raw feeds)"""
+    permission_classes = []
+    throttle_scope = 'feeds'
+    
+    content_types = {
+        'rpz': 'text/dns',
+    }
+    
+    @swagger_auto_schema(
+        operation_description="Get a blocklist in a firewall, DNS or proxy format (no authentication required). "
+                              "Formats: ipset and nftables (ip), rpz (domain), squid (domain, url), "
+                              "edl - Palo Alto External Dynamic List (ip, domain, url). "
+                              "Supports If-None-Match / If-Modified-Since and Range / If-Range.",
+        responses={200: "Text file in the requested format", 206: "Partial Content", 304: "Not Modified",
+                   404: "Unknown format", 416: "Range Not Satisfiable"}
+    )
+    async def get(self, request, indicator_type, export_format, format=None):
+        if export_format not in exports.formats_for(indicator_type):
+            available = ', '.join(exports.formats_for(indicator_type))
+            return HttpResponse(f"Unknown format for the {indicator_type} blocklist; available: {available}",
+                                status=404, content_type='text/plain')
+        
+        try:
+            # The published copy is the same file, so only render it if that is stale
+            found = await sync_to_async(publish.current_file, thread_sensitive=False)(
+                indicator_type, publish.export_name(export_format)
+            )
+            path, version = found or await sync_to_async(exports.get_export, thread_sensitive=False)(
+                indicator_type, export_format
+            )
+        except Exception as e:
+            return HttpResponse(str(e), status=500, content_type='text/plain')
+        
+        content_type = self.content_types.get(export_format, 'text/plain')
+        return versioned_file_response(
+            request, path, f'"{indicator_type}-{export_format}-r{exports.REVISION}-{version}"',
+            f"{content_type}; charset=utf-8",
+            f"{indicator_type}-{export_format}-{version}.txt"
+        )
+
+class ChecksumsView(AsyncAPIView):
+    """SHA-256 checksums of the published feed files of a list (no authentication, like the raw feeds)"""
+    permission_classes = []
+    throttle_scope = 'feeds'
+    
+    @swagger_auto_schema(
+        operation_description="Get `sha256sum -c` checksums of a blocklist's raw feed, its export formats "
+                              "and their .gz copies, as published for static file servers "
+                              "(no authentication required). Supports If-None-Match / If-Modified-Since and Range.",
+        responses={200: "SHA256SUMS text file", 304: "Not Modified", 404: "Publishing is disabled"}
+    )
+    async def get(self, request, indicator_type, format=None):
+        if not settings.PUBLISH_ENABLED:
+            return HttpResponse("Publishing is disabled", status=404, content_type='text/plain')
+        
+        try:
+            path, version = await sync_to_async(publish.get_file, thread_sensitive=False)(
+                indicator_type, publish.CHECKSUMS_NAME
+            )
+        except Exception as e:
+            return HttpResponse(str(e), status=500, content_type='text/plain')
+        
+        return versioned_file_response(
+            request, path, f'"{indicator_type}-sha256sums-r{exports.REVISION}-{version}"', 'text/plain; charset=utf-8'
+        )
+
+fp_rate_param = openapi.Parameter(
+    'fp_rate',
+    openapi.IN_QUERY,
+    description=f"False-positive rate, one of {', '.join(map(str, settings.BLOOM_FALSE_POSITIVE_RATES))} "
+                f"(default {settings.BLOOM_DEFAULT_FALSE_POSITIVE_RATE})",
+    type=openapi.TYPE_NUMBER
+)
+
+class BloomFilterView(AsyncAPIView):
+    """Bloom filter of a blocklist for "maybe blocked" checks (no authentication, like the raw feeds)"""
+    permission_classes = []
+    throttle_scope = 'feeds'
+    
+    @swagger_auto_schema(
+        operation_description="Get a Bloom filter of a blocklist (no authentication required). The binary "
+                              "format is documented in api/bloom.py; clients/bloom_client.py queries it. "
+                              "Supports If-None-Match / If-Modified-Since and Range / If-Range.",
+        manual_parameters=[fp_rate_param],
+        responses={200: "Binary Bloom filter", 304: "Not Modified", 400: "Unsupported false-positive rate"}
+    )
+    async def get(self, request, indicator_type, format=None):
+        try:
+            fp_rate = float(request.query_params.get('fp_rate', settings.BLOOM_DEFAULT_FALSE_POSITIVE_RATE))
+        except ValueError:
+            fp_rate = None
+        if fp_rate not in settings.BLOOM_FALSE_POSITIVE_RATES:
+            rates = ', '.join(map(str, settings.BLOOM_FALSE_POSITIVE_RATES))
+            return HttpResponse(f"fp_rate must be one of {rates}", status=400, content_type='text/plain')
+        
+        try:
+            path, version = await sync_to_async(bloom.get_filter, thread_sensitive=False)(
+                indicator_type, fp_rate
+            )
+        except Exception as e:
+            return HttpResponse(str(e), status=500, content_type='text/plain')
+        
+        return versioned_file_response(
+            request, path, f'"{indicator_type}-bloom{bloom.FORMAT}-{fp_rate:g}-{version}"', 'application/octet-stream'
+        )
+
 from django.contrib.auth import authenticate
 from rest_framework.views import APIView
 from rest_framework.response import Response
@@ -423,6 +999,7 @@ logger = logging.getLogger('django')
 
 class LoginView(APIView):
     permission_classes = []
+    throttle_scope = 'login'
     
     def post(self, request):
         username = request.data.get('username')
@@ -38,6 +38,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'api.middleware.APICallLoggingMiddleware',  # Add our custom middleware
+    'api.middleware.ReadOnlyReplicaMiddleware',  # Only active on replication followers
 ]
 
 ROOT_URLCONF = 'blocklist_project.urls'
@@ -59,6 +60,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'blocklist_project.wsgi.application'
+ASGI_APPLICATION = 'blocklist_project.asgi.application'
 
 # Database
 DATABASES = {
@@ -106,8 +108,26 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
+    # FastJSONRenderer uses orjson when installed; swap back to
+    # 'rest_framework.renderers.JSONRenderer' to use the stdlib encoder
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    # Token-bucket rate limits, configured by RATE_LIMITS below
+    'DEFAULT_THROTTLE_CLASSES': [
+        'api.throttling.TokenBucketThrottle',
+    ],
+    # Proxies in front of the app; anonymous callers are told apart by the
+    # X-Forwarded-For address this many hops back (None: use REMOTE_ADDR)
+    'NUM_PROXIES': int(os.environ['NUM_PROXIES']) if os.environ.get('NUM_PROXIES') else None,
 }
 
+# List responses with at least this many items are streamed as a JSON array
+# in chunks instead of being rendered in one piece
+STREAMING_JSON_MIN_ITEMS = 10000
+STREAMING_JSON_CHUNK_SIZE = 1000
+
 # JWT Settings
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(hours=1),
@@ -147,8 +167,15 @@ SWAGGER_SETTINGS = {
         }
     },
     'USE_SESSION_AUTH': False,
+    'DEFAULT_INFO': 'blocklist_project.urls.api_info',
 }
 
+# OpenAPI schema stored by manage.py openapi_schema (api/schema.py). When
+# precomputed, the stored files are served; otherwise each process generates
+# the schema on first use, so view changes show up after a reload
+OPENAPI_SCHEMA_DIR = os.path.join(BASE_DIR, 'openapi')
+OPENAPI_SCHEMA_PRECOMPUTED = os.environ.get('OPENAPI_SCHEMA_PRECOMPUTED', str(not DEBUG)).lower() in ('1', 'true', 'yes')
+
 # Logging configuration
 LOGGING = {
     'version': 1,
@@ -195,8 +222,117 @@ LOGGING = {
 }
 
 # Blocklist data files paths
-DATA_DIR = os.path.join(BASE_DIR, 'data')
+DATA_DIR = os.environ.get('DATA_DIR', os.path.join(BASE_DIR, 'data'))
 IP_BLOCKLIST_FILE = os.path.join(DATA_DIR, 'ip-address-blocklist.txt')
 DOMAIN_BLOCKLIST_FILE = os.path.join(DATA_DIR, 'domain-blocklist.txt')
 URL_BLOCKLIST_FILE = os.path.join(DATA_DIR, 'url-blocklist.txt')
 LOG_FILE = os.path.join(DATA_DIR, 'blocklist-log.txt')
+EVENTS_FILE = os.path.join(DATA_DIR, 'blocklist-events.jsonl')
+LOCK_FILE = os.path.join(DATA_DIR, '.blocklist.lock')
+VERSIONS_FILE = os.path.join(DATA_DIR, 'list-versions.json')
+IP_SNAPSHOT_FILE = os.path.join(DATA_DIR, 'ip-address-blocklist.bin')
+INDEX_CACHE_DIR = os.path.join(DATA_DIR, 'index')
+EXPORTS_DIR = os.path.join(DATA_DIR, 'exports')
+BLOOM_FILTER_DIR = os.path.join(DATA_DIR, 'filters')
+EXPIRY_FILE = os.path.join(DATA_DIR, 'blocklist-expiry.jsonl')
+ALLOWLIST_FILE = os.path.join(DATA_DIR, 'allowlist.txt')
+JOBS_DIR = os.path.join(DATA_DIR, 'jobs')
+RATE_LIMIT_FILE = os.path.join(DATA_DIR, '.rate-limits')
+SNAPSHOT_DIR = os.path.join(DATA_DIR, 'snapshots')
+REPLICATION_STATE_FILE = os.path.join(DATA_DIR, 'replication.json')
+HIT_SKETCH_FILE = os.path.join(DATA_DIR, 'hits.sketch')
+STATS_FILE = os.path.join(DATA_DIR, 'stats.json')
+
+# Static copies of the raw feeds and exports (api.publish), rewritten after
+# every change so a front web server can serve /api/raw/ from them directly
+PUBLISH_DIR = os.environ.get('PUBLISH_DIR', os.path.join(DATA_DIR, 'public'))
+PUBLISH_ENABLED = os.environ.get('PUBLISH_ENABLED', 'true').lower() not in ('0', 'false', 'no')
+
+# Seconds between expiry sweeps (manage.py expire_indicators); indicators
+# are unblocked up to this long after they expire
+EXPIRY_SWEEP_INTERVAL = float(os.environ.get('EXPIRY_SWEEP_INTERVAL', '10'))
+
+# Replication (api.replication). A follower is a read-only node whose lists
+# follow the leader's through `manage.py replicate`; REPLICATION_API_KEY is
+# sent to the leader if set (e.g. so its rate limits apply per key)
+REPLICATION_ROLE = os.environ.get('REPLICATION_ROLE', 'leader')
+REPLICATION_LEADER_URL = os.environ.get('REPLICATION_LEADER_URL', '')
+REPLICATION_API_KEY = os.environ.get('REPLICATION_API_KEY', '')
+REPLICATION_POLL_TIMEOUT = 25  # Seconds per long-poll of the leader's /api/events/
+REPLICATION_RETRY_INTERVAL = 5  # Seconds between attempts while the leader is unreachable
+
+# Hit counts reported by enforcement points (api.hits): a count-min sketch
+# of HIT_SKETCH_DEPTH rows of HIT_SKETCH_WIDTH counters, 6 bytes per counter
+# (24 MB by default). Estimates stay close while the number of distinct
+# indicators hit is well below the width. Changing either resets the counts
+HIT_SKETCH_WIDTH = int(os.environ.get('HIT_SKETCH_WIDTH', str(1 << 20)))
+HIT_SKETCH_DEPTH = 4
+HIT_FLUSH_INTERVAL = 60  # Seconds between writes of the sketch file to disk
+HIT_REPORT_MAX_HITS = 10000  # Hits per /api/hits/ request
+
+# Days of daily action counts kept for /api/stats/ (api.stats); all-time
+# counts are kept regardless
+STATS_HISTORY_DAYS = 400
+
+# Average number of entries per snapshot chunk (api.snapshots); a power of
+# two. Chunks already stored keep their boundaries when it changes
+SNAPSHOT_CHUNK_ENTRIES = 4096
+
+# Background jobs (api.jobs): block/unblock requests with more indicators
+# than JOB_INLINE_LIMIT run as jobs, JOB_CHUNK_SIZE indicators at a time, on
+# JOB_WORKERS threads per server process
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '2'))
+JOB_CHUNK_SIZE = 5000
+JOB_INLINE_LIMIT = int(os.environ.get('JOB_INLINE_LIMIT', '10000'))
+JOB_RESULT_SAMPLE_SIZE = 100  # Invalid/existing/... items kept per bucket in job results
+
+# Rate limits (api.throttling), per caller (API key, user or client address)
+# and endpoint class (a view's throttle_scope). A limit is '<count>/<s|min|
+# hour|day>' or a (rate, burst) pair where burst is the bucket size; the
+# burst defaults to ten seconds' worth. None disables a scope's limit.
+# API keys can have their own overall limit (APIKey.rate_limit, requests per
+# minute), and RATE_LIMIT_USERS gives named users an overall limit.
+RATE_LIMITS_ENABLED = os.environ.get('RATE_LIMITS_ENABLED', 'true').lower() not in ('0', 'false', 'no')
+RATE_LIMITS = {
+    'default': ('600/min', 100),
+    'lists': ('60/min', 10),    # Whole-list JSON responses
+    'feeds': ('120/min', 20),   # Raw feeds, exports and Bloom filters
+    'events': ('60/min', 10),   # Long-poll and SSE connections
+    'login': ('10/min', 5),
+}
+RATE_LIMIT_USERS = {
+    # 'siem-integration': '1200/min',
+}
+RATE_LIMIT_SLOTS = 65536  # Buckets kept at once; idle buckets free their slot
+
+# Bloom filter feed: false-positive rates clients may request; each one is
+# built and cached separately
+BLOOM_FALSE_POSITIVE_RATES = (0.01, 0.001, 0.0001)
+BLOOM_DEFAULT_FALSE_POSITIVE_RATE = 0.001
+
+# Change notification (SSE / long-poll) settings, durations in seconds
+EVENTS_POLL_INTERVAL = float(os.environ.get('EVENTS_POLL_INTERVAL', '0.5'))
+EVENTS_LONG_POLL_TIMEOUT = 30
+EVENTS_STREAM_MAX_DURATION = 300
+EVENTS_HEARTBEAT_INTERVAL = 15
+EVENTS_BUFFER_SIZE = 1000
+
+# Caches. The 'responses' cache holds pre-serialized JSON list responses keyed
+# by list version. The file-based default is shared by all workers on a host;
+# point it at Redis (or a Redis-compatible server such as KeyDB/Valkey) with
+# RESPONSE_CACHE_BACKEND=django.core.cache.backends.redis.RedisCache and
+# RESPONSE_CACHE_LOCATION=redis://127.0.0.1:6379/1
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'responses': {
+        'BACKEND': os.environ.get('RESPONSE_CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.environ.get('RESPONSE_CACHE_LOCATION', os.path.join(DATA_DIR, 'cache', 'responses')),
+        'TIMEOUT': 3600,
+        'OPTIONS': {
+            'MAX_ENTRIES': 1000,
+        },
+    },
+}
+RESPONSE_CACHE_ALIAS = 'responses'
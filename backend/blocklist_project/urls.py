@@ -6,20 +6,28 @@ from drf_yasg import openapi
 from api.token_views import CustomTokenObtainPairView
 from rest_framework_simplejwt.views import TokenRefreshView
 from api.root_views import api_root, terms_of_service, license_view
+from api.schema import PrecomputedSchemaMixin
+
+# Also SWAGGER_SETTINGS['DEFAULT_INFO'], used by manage.py openapi_schema
+api_info = openapi.Info(
+   title="Blocklist API",
+   default_version='v1',
+   description="API for managing blocklists of IPs, domains, and URLs. A security tool for legitimate cybersecurity operations.",
+   terms_of_service="/terms-of-service",
+   contact=openapi.Contact(email="alwaleedabosaq@gmail.com"),
+   license=openapi.License(name="BSD 4-Clause License"),
+)
 
 schema_view = get_schema_view(
-   openapi.Info(
-      title="Blocklist API",
-      default_version='v1',
-      description="API for managing blocklists of IPs, domains, and URLs. A security tool for legitimate cybersecurity operations.",
-      terms_of_service="/terms-of-service",
-      contact=openapi.Contact(email="alwaleedabosaq@gmail.com"),
-      license=openapi.License(name="BSD 4-Clause License"),
-   ),
+   api_info,
    public=True,
    permission_classes=[permissions.AllowAny],
 )
 
+# Serves the schema stored by manage.py openapi_schema (see api/schema.py)
+class PrecomputedSchemaView(PrecomputedSchemaMixin, schema_view):
+   pass
+
 urlpatterns = [
     path('', api_root, name='api-root'),  # Root endpoint
     path('terms-of-service', terms_of_service, name='terms-of-service'),
@@ -30,9 +38,9 @@ urlpatterns = [
     path('api/token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     
     # Swagger documentation URLs
-    path('swagger<format>/', schema_view.without_ui(cache_timeout=0), name='schema-json'),
-    path('swagger/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
+    path('swagger<format>/', PrecomputedSchemaView.without_ui(cache_timeout=0), name='schema-json'),
+    path('swagger/', PrecomputedSchemaView.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
+    path('redoc/', PrecomputedSchemaView.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
 ]
 
 # Custom error handlers